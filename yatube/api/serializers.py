@@ -0,0 +1,99 @@
+"""Сериализация ответов API без создания экземпляров моделей.
+
+Поля ресурса описываются словарём «имя в API: путь для values()»:
+выборка сразу отдаёт словари, которые остаётся переименовать. Клиент
+может запросить только нужные поля параметром ``?fields=id,text``.
+"""
+from django.core.files.storage import default_storage
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def image_url(name):
+    return default_storage.url(name) if name else None
+
+
+def zero_if_missing(value):
+    # Счётчики пользователя без записи статистики приходят как NULL
+    return value or 0
+
+
+class Serializer:
+    def __init__(self, fields, converters=None):
+        self.fields = fields
+        self.converters = converters or {}
+
+    def select(self, requested):
+        """Имена полей из параметра ``fields``; по умолчанию все."""
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',')]
+        names = [name for name in names if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise FieldsError(
+                'Неизвестные поля: {}. Доступные поля: {}.'.format(
+                    ', '.join(unknown), ', '.join(self.fields)
+                )
+            )
+        return names
+
+    def lookups(self, names, *required):
+        """Аргументы для values(): выбранные поля и нужные пагинатору."""
+        lookups = [self.fields[name] for name in names]
+        return [*lookups, *(key for key in required if key not in lookups)]
+
+    def row(self, values, names):
+        result = {}
+        for name in names:
+            value = values[self.fields[name]]
+            converter = self.converters.get(name)
+            result[name] = converter(value) if converter else value
+        return result
+
+
+posts = Serializer(
+    {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    converters={'image': image_url},
+)
+
+comments = Serializer({
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+})
+
+groups = Serializer({
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+})
+
+profiles = Serializer(
+    {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'posts_count': 'stats__posts_count',
+        'followers_count': 'stats__followers_count',
+        'following_count': 'stats__following_count',
+    },
+    converters={
+        'posts_count': zero_if_missing,
+        'followers_count': zero_if_missing,
+        'following_count': zero_if_missing,
+    },
+)
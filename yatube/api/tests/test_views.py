@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='group-slug',
+            description='group-description'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            text='Комментарий', author=cls.reader, post=cls.posts[0]
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get(self, name, params=None, **kwargs):
+        return self.guest_client.get(
+            reverse(f'api:{name}', kwargs=kwargs), params
+        )
+
+    def test_cursor_pagination(self):
+        """Лента постов листается курсором до конца."""
+        newest_first = [post.pk for post in reversed(self.posts)]
+        first = self.get('posts', {'limit': 3}).json()
+        self.assertEqual(
+            [item['id'] for item in first['results']], newest_first[:3]
+        )
+        self.assertIsNone(first['previous'])
+        second = self.guest_client.get(first['next']).json()
+        self.assertEqual(
+            [item['id'] for item in second['results']], newest_first[3:]
+        )
+        self.assertIsNone(second['next'])
+
+    def test_fields_selection(self):
+        """Параметр fields оставляет только запрошенные поля."""
+        response = self.get('posts', {'fields': 'id,author,group'})
+        self.assertEqual(
+            response.json()['results'][0],
+            {
+                'id': self.posts[-1].pk,
+                'author': 'author',
+                'group': 'group-slug',
+            }
+        )
+        response = self.get('posts', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_resources(self):
+        """Пост, комментарии, сообщество и профиль отдаются JSON."""
+        post = self.posts[0]
+        self.assertEqual(
+            self.get('post', post_id=post.pk).json()['comments_count'], 1
+        )
+        comments = self.get('post_comments', post_id=post.pk).json()
+        self.assertEqual(comments['results'][0]['text'], 'Комментарий')
+        self.assertEqual(
+            self.get('groups').json()['results'][0]['slug'], 'group-slug'
+        )
+        self.assertEqual(
+            len(self.get('group_posts', slug='group-slug').json()['results']),
+            5
+        )
+        profile = self.get('profile', username='author').json()
+        self.assertEqual(profile['posts_count'], 5)
+        self.assertEqual(profile['followers_count'], 1)
+        self.assertEqual(self.get('post', post_id=0).status_code, 404)
+
+    def test_follow_feed(self):
+        """Лента подписок доступна только авторизованному пользователю."""
+        self.assertEqual(self.get('follow').status_code, 401)
+        self.guest_client.force_login(self.reader)
+        results = self.get('follow').json()['results']
+        self.assertEqual(len(results), 5)
+        # Посты «звезды» подмешиваются при чтении, без повторов
+        with self.settings(FEED_FANOUT_FOLLOWERS_LIMIT=0):
+            merged = self.get('follow').json()['results']
+        self.assertEqual(merged, results)
+
+    def test_cache_invalidated_by_writes(self):
+        """Закешированный ответ сбрасывается при изменении поста."""
+        self.get('profile_posts', username='author')
+        Post.objects.filter(pk=self.posts[-1].pk).update(text='Тихо')
+        response = self.get('profile_posts', username='author').json()
+        self.assertEqual(response['results'][0]['text'], 'Пост 4')
+        post = Post.objects.get(pk=self.posts[-1].pk)
+        post.text = 'Громко'
+        post.save()
+        response = self.get('profile_posts', username='author').json()
+        self.assertEqual(response['results'][0]['text'], 'Громко')
@@ -0,0 +1,227 @@
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
+
+from posts import caching
+from posts.feed import follow_feed
+from posts.models import Comment, Group, Post
+from posts.paginators import KeysetPaginator
+
+from . import serializers
+
+User = get_user_model()
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Время жизни кеша ответов по эндпоинтам; 0 - не кешировать.
+# Ответы с тегами сбрасываются при записи, поэтому живут долго
+CACHE_TIMEOUTS = {
+    'posts': 3600,
+    'post': 3600,
+    'post_comments': 3600,
+    'groups': 300,
+    'group': 300,
+    'group_posts': 3600,
+    # Счётчики подписок меняются без сброса тегов
+    'profile': 0,
+    'profile_posts': 3600,
+    # Лента своя у каждого пользователя, кешировать невыгодно
+    'follow': 0,
+}
+
+
+class ApiError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def api_view(view):
+    """Отдаёт результат view как JSON, ошибки - как {"detail": ...}."""
+    @wraps(view)
+    @require_GET
+    def wrapper(request, *args, **kwargs):
+        try:
+            payload = view(request, *args, **kwargs)
+        except Http404:
+            payload, status = {'detail': 'Не найдено.'}, 404
+        except serializers.FieldsError as error:
+            payload, status = {'detail': str(error)}, 400
+        except ApiError as error:
+            payload, status = {'detail': error.detail}, error.status
+        else:
+            status = 200
+        return JsonResponse(
+            payload, status=status, json_dumps_params={'ensure_ascii': False}
+        )
+    return wrapper
+
+
+def cached(request, endpoint, tags, build):
+    """Ответ эндпоинта из кеша или построенный функцией ``build``."""
+    timeout = CACHE_TIMEOUTS[endpoint]
+    if not timeout:
+        return build()
+    return caching.get_or_render(
+        f'api:{endpoint}', tags, [request.get_full_path()], timeout, build
+    )
+
+
+def page_size(request):
+    limit = request.GET.get('limit')
+    if limit is None:
+        return PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(f'limit должен быть от 1 до {MAX_PAGE_SIZE}.')
+    return limit
+
+
+def page_link(request, **cursor):
+    """Относительная ссылка на соседнюю страницу или None."""
+    name, value = cursor.popitem()
+    if value is None:
+        return None
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params[name] = value
+    return f'{request.path}?{params.urlencode()}'
+
+
+def paginate(request, queryset, serializer, date_field='pub_date',
+             descending=True):
+    """Страница выборки по курсору в виде словарей."""
+    names = serializer.select(request.GET.get('fields'))
+    paginator = KeysetPaginator(
+        queryset.values(*serializer.lookups(names, 'id', date_field)),
+        page_size(request),
+        date_field,
+        descending=descending,
+    )
+    page = paginator.get_page(
+        after=request.GET.get('after'), before=request.GET.get('before')
+    )
+    return {
+        'results': [serializer.row(row, names) for row in page],
+        'next': page_link(request, after=page.next_cursor),
+        'previous': page_link(request, before=page.previous_cursor),
+    }
+
+
+def detail(request, queryset, serializer):
+    names = serializer.select(request.GET.get('fields'))
+    row = queryset.values(*serializer.lookups(names)).first()
+    if row is None:
+        raise Http404
+    return serializer.row(row, names)
+
+
+def group_id(slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    if pk is None:
+        raise Http404
+    return pk
+
+
+def author_id(username):
+    pk = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if pk is None:
+        raise Http404
+    return pk
+
+
+@api_view
+def posts_list(request):
+    return cached(request, 'posts', [caching.FEED_TAG], lambda: paginate(
+        request, Post.objects.all(), serializers.posts
+    ))
+
+
+@api_view
+def post_detail(request, post_id):
+    return cached(request, 'post', [caching.post_tag(post_id)], lambda: detail(
+        request, Post.objects.filter(pk=post_id), serializers.posts
+    ))
+
+
+@api_view
+def post_comments(request, post_id):
+    def build():
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404
+        return paginate(
+            request,
+            Comment.objects.filter(post_id=post_id).order_by('created', 'id'),
+            serializers.comments,
+            date_field='created',
+            descending=False,
+        )
+    return cached(
+        request, 'post_comments', [caching.post_tag(post_id)], build
+    )
+
+
+@api_view
+def groups_list(request):
+    def build():
+        names = serializers.groups.select(request.GET.get('fields'))
+        rows = Group.objects.order_by('title').values(
+            *serializers.groups.lookups(names)
+        )
+        return {
+            'results': [serializers.groups.row(row, names) for row in rows]
+        }
+    return cached(request, 'groups', [], build)
+
+
+@api_view
+def group_detail(request, slug):
+    return cached(request, 'group', [], lambda: detail(
+        request, Group.objects.filter(slug=slug), serializers.groups
+    ))
+
+
+@api_view
+def group_posts(request, slug):
+    pk = group_id(slug)
+    return cached(
+        request, 'group_posts', [caching.group_tag(pk)], lambda: paginate(
+            request, Post.objects.filter(group_id=pk), serializers.posts
+        )
+    )
+
+
+@api_view
+def profile_detail(request, username):
+    return cached(request, 'profile', [], lambda: detail(
+        request, User.objects.filter(username=username), serializers.profiles
+    ))
+
+
+@api_view
+def profile_posts(request, username):
+    pk = author_id(username)
+    return cached(
+        request, 'profile_posts', [caching.author_tag(pk)], lambda: paginate(
+            request, Post.objects.filter(author_id=pk), serializers.posts
+        )
+    )
+
+
+@api_view
+def follow(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация.', status=401)
+    return cached(request, 'follow', [], lambda: paginate(
+        request, follow_feed(request.user), serializers.posts,
+        date_field='feed_date',
+    ))
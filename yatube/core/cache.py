@@ -0,0 +1,500 @@
+"""Двухуровневый кеш: память процесса перед общим хранилищем.
+
+``TieredCache`` складывает два кеша из ``CACHES``: маленький локальный
+(``OPTIONS['LOCAL']``, LRU в памяти процесса) и общий для всех процессов
+(``OPTIONS['SHARED']``). Чтение сначала смотрит в локальный, промах
+читается из общего и запоминается локально; запись идёт в оба.
+
+Локальная копия живёт не дольше ``LOCAL_TIMEOUT`` секунд и согласована
+между процессами, только если ключ меняется вместе со значением - как
+ключи фрагментов, в которые входят версии тегов (см. ``posts.caching``).
+Изменяемые на месте ключи, например сами версии тегов, перечисляются в
+``SHARED_ONLY_PREFIXES`` и читаются только из общего кеша; остальные
+ключи другие процессы могут видеть устаревшими до ``LOCAL_TIMEOUT``.
+С ``OPTIONS['CODEC']`` значение кодируется один раз (см. ``core.codecs``)
+и оба уровня хранят готовые байты.
+
+``MemoryCache`` - кеш в памяти процесса с бюджетом в байтах, политикой
+вытеснения LRU или LFU и счётчиками по префиксам ключей. Он служит
+локальным уровнем, а в тестах и общим.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .codecs import Codec, CodecError
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.local_alias = options.get('LOCAL', 'local')
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.shared_only = tuple(options.get('SHARED_ONLY_PREFIXES', ()))
+        codec = options.get('CODEC')
+        self.codec = Codec(**codec) if codec is not None else None
+
+    @property
+    def local(self):
+        return caches[self.local_alias]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def is_local(self, key):
+        return not str(key).startswith(self.shared_only)
+
+    def dump(self, value):
+        return value if self.codec is None else self.codec.encode(value)
+
+    def load(self, data):
+        """Значение из байтов кеша; нечитаемые байты - промах."""
+        if self.codec is None or data is _MISSING:
+            return data
+        try:
+            return self.codec.decode(data)
+        except CodecError:
+            return _MISSING
+
+    def local_timeout_for(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def remember(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self.is_local(key):
+            return
+        local_timeout = self.local_timeout_for(timeout)
+        if local_timeout > 0:
+            self.local.set(key, value, local_timeout, version)
+        else:
+            self.local.delete(key, version)
+
+    def get(self, key, default=None, version=None):
+        if self.is_local(key):
+            value = self.load(self.local.get(key, _MISSING, version))
+            if value is not _MISSING:
+                return value
+        data = self.shared.get(key, _MISSING, version)
+        value = self.load(data)
+        if value is _MISSING:
+            return default
+        self.remember(key, data, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        local_keys = [key for key in keys if self.is_local(key)]
+        if local_keys:
+            found.update(self.local.get_many(local_keys, version))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing, version)
+            for key, data in shared.items():
+                self.remember(key, data, version=version)
+            found.update(shared)
+        values = {key: self.load(data) for key, data in found.items()}
+        return {
+            key: value for key, value in values.items()
+            if value is not _MISSING
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        data = self.dump(value)
+        self.shared.set(key, data, self.timeout(timeout), version)
+        self.remember(key, data, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        data = {key: self.dump(value) for key, value in data.items()}
+        failed = self.shared.set_many(data, self.timeout(timeout), version)
+        for key, value in data.items():
+            if key in failed:
+                self.local.delete(key, version)
+            else:
+                self.remember(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.dump(value)
+        added = self.shared.add(key, value, self.timeout(timeout), version)
+        if added:
+            self.remember(key, value, timeout, version)
+        else:
+            # В общем кеше уже другое значение
+            self.local.delete(key, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self.timeout(timeout), version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version)
+        self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.local.delete_many(keys, version)
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        if self.is_local(key) and self.local.has_key(key, version):
+            return True
+        return self.shared.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version)
+        if self.codec is None:
+            return self.shared.incr(key, delta, version)
+        # Число в общем кеше закодировано, прибавить к нему сам кеш не может
+        value = self.load(self.shared.get(key, _MISSING, version))
+        if value is _MISSING:
+            raise ValueError(f"Key '{key}' not found")
+        value += delta
+        self.shared.set(key, self.dump(value), version=version)
+        return value
+
+    def clear(self):
+        # Локальные копии других процессов доживут до LOCAL_TIMEOUT
+        self.local.clear()
+        self.shared.clear()
+
+    def timeout(self, timeout):
+        # Время жизни по умолчанию - этого кеша, а не общего
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+
+# Служебные байты записи сверх ключа и значения: объекты словарей и
+# политики вытеснения
+ENTRY_OVERHEAD = 200
+# Части ключа после первого хеша или числа в префикс не входят
+_KEY_SEGMENTS = re.compile(r'[.:]')
+_VARIABLE_SEGMENT = re.compile(r'[0-9a-f]{16,}|\d+')
+MAX_PREFIX_SEGMENTS = 4
+
+
+def key_prefix(key):
+    """Префикс для статистики: ``template.cache.index_page``, ``cache-tag``.
+
+    Берутся начальные части ключа до первой похожей на хеш или id.
+    """
+    prefix = []
+    for segment in _KEY_SEGMENTS.split(str(key))[:MAX_PREFIX_SEGMENTS]:
+        if _VARIABLE_SEGMENT.fullmatch(segment):
+            break
+        prefix.append(segment)
+    return '.'.join(prefix) or str(key)
+
+
+class LRUPolicy:
+    """Вытесняется ключ, к которому дольше всех не обращались."""
+
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def insert(self, key):
+        self.order[key] = None
+        self.order.move_to_end(key)
+
+    def access(self, key):
+        self.order.move_to_end(key)
+
+    def remove(self, key):
+        self.order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self.order))
+
+
+class LFUPolicy:
+    """Вытесняется самый редко читаемый ключ, при равенстве - давний.
+
+    Ключи лежат в корзинах по числу обращений, поэтому все операции
+    O(1). Когда обращений набирается ``DECAY_PERIOD`` на ключ, счётчики
+    делятся пополам: иначе ключи, популярные в прошлом, - например
+    фрагменты со сброшенной версией тега, - не вытеснялись бы никогда.
+    """
+
+    DECAY_PERIOD = 10
+
+    def __init__(self):
+        self.counts = {}
+        self.buckets = {}
+        self.min_count = 1
+        self.accesses = 0
+
+    def place(self, key, count):
+        self.counts[key] = count
+        self.buckets.setdefault(count, OrderedDict())[key] = None
+        self.min_count = min(self.min_count, count)
+
+    def unplace(self, key):
+        count = self.counts.pop(key, None)
+        if count is None:
+            return None
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+        return count
+
+    def insert(self, key):
+        count = self.unplace(key)
+        self.place(key, count or 1)
+
+    def access(self, key):
+        count = self.unplace(key)
+        if count == self.min_count and count not in self.buckets:
+            self.min_count = count + 1
+        self.place(key, count + 1)
+        self.accesses += 1
+        if self.accesses > self.DECAY_PERIOD * len(self.counts):
+            self.decay()
+
+    def remove(self, key):
+        self.unplace(key)
+
+    def victim(self):
+        if self.min_count not in self.buckets:
+            self.min_count = min(self.buckets)
+        return next(iter(self.buckets[self.min_count]))
+
+    def decay(self):
+        buckets, self.buckets, self.counts = self.buckets, {}, {}
+        self.min_count = 1
+        self.accesses = 0
+        for count in sorted(buckets):
+            for key in buckets[count]:
+                self.place(key, max(1, count // 2))
+
+
+POLICIES = {'lru': LRUPolicy, 'lfu': LFUPolicy}
+STAT_FIELDS = ('hits', 'misses', 'sets', 'evictions', 'expired')
+
+
+class MemoryStore:
+    """Данные и счётчики одного ``MemoryCache``, общие для всех потоков."""
+
+    def __init__(self, max_bytes, policy):
+        self.max_bytes = max_bytes
+        self.policy_name = policy
+        self.lock = threading.Lock()
+        self.prefixes = {}
+        self.clear()
+
+    def clear(self):
+        """Удаляет данные; счётчики обращений сохраняются."""
+        # Ключ: (закодированное значение, размер, срок, префикс)
+        self.entries = {}
+        self.policy = POLICIES[self.policy_name]()
+        self.bytes = 0
+        for counters in self.prefixes.values():
+            counters['entries'] = counters['bytes'] = 0
+
+    def reset_stats(self):
+        for counters in self.prefixes.values():
+            counters.update(dict.fromkeys(STAT_FIELDS, 0))
+
+    def counters(self, prefix):
+        counters = self.prefixes.get(prefix)
+        if counters is None:
+            counters = self.prefixes[prefix] = dict.fromkeys(
+                (*STAT_FIELDS, 'entries', 'bytes'), 0
+            )
+        return counters
+
+    def lookup(self, key, prefix):
+        """Запись ключа или None; счётчики не трогает."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires = entry[2]
+        if expires is not None and expires <= time.time():
+            self.discard(key)
+            self.counters(prefix)['expired'] += 1
+            return None
+        return entry
+
+    def get(self, key, prefix):
+        entry = self.lookup(key, prefix)
+        counters = self.counters(prefix)
+        if entry is None:
+            counters['misses'] += 1
+            return None
+        counters['hits'] += 1
+        self.policy.access(key)
+        return entry[0]
+
+    def put(self, key, prefix, data, expires):
+        size = len(key) + len(data) + ENTRY_OVERHEAD
+        self.discard(key)
+        if size > self.max_bytes:
+            # Значение больше всего бюджета не вытесняет весь кеш
+            return False
+        while self.bytes + size > self.max_bytes:
+            victim = self.policy.victim()
+            self.counters(self.entries[victim][3])['evictions'] += 1
+            self.discard(victim)
+        self.entries[key] = (data, size, expires, prefix)
+        self.policy.insert(key)
+        self.bytes += size
+        counters = self.counters(prefix)
+        counters['sets'] += 1
+        counters['entries'] += 1
+        counters['bytes'] += size
+        return True
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.policy.remove(key)
+        self.bytes -= entry[1]
+        counters = self.counters(entry[3])
+        counters['entries'] -= 1
+        counters['bytes'] -= entry[1]
+        return True
+
+    def stats(self):
+        with self.lock:
+            prefixes = {
+                prefix: dict(counters)
+                for prefix, counters in self.prefixes.items()
+            }
+            totals = {'entries': len(self.entries), 'bytes': self.bytes}
+        for counters in prefixes.values():
+            reads = counters['hits'] + counters['misses']
+            counters['hit_rate'] = counters['hits'] / reads if reads else None
+        return {
+            'policy': self.policy_name,
+            'max_bytes': self.max_bytes,
+            **totals,
+            'prefixes': prefixes,
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class MemoryCache(BaseCache):
+    """Кеш в памяти процесса с бюджетом ``OPTIONS['MAX_BYTES']``.
+
+    ``OPTIONS['POLICY']`` - ``lru`` (по умолчанию) или ``lfu``.
+    ``OPTIONS['CODEC']`` - параметры ``core.codecs.Codec``, по умолчанию
+    без сжатия. Как и в LocMemCache, значения хранятся сериализованными,
+    а экземпляры бэкенда разных потоков с одним ``LOCATION`` делят данные.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        policy = options.get('POLICY', 'lru')
+        if policy not in POLICIES:
+            raise ValueError(f'Неизвестная политика вытеснения {policy!r}')
+        self.codec = Codec(**options.get('CODEC', {'compression': 'none'}))
+        with _stores_lock:
+            self.store = _stores.setdefault(location, MemoryStore(
+                options.get('MAX_BYTES', 64 * 1024 * 1024), policy
+            ))
+
+    def key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        prefix = key_prefix(key)
+        key = self.key(key, version)
+        with self.store.lock:
+            data = self.store.get(key, prefix)
+        if data is None:
+            return default
+        try:
+            return self.codec.decode(data)
+        except CodecError:
+            return default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        prefix = key_prefix(key)
+        key = self.key(key, version)
+        data = self.codec.encode(value)
+        expires = self.get_backend_timeout(timeout)
+        with self.store.lock:
+            self.store.put(key, prefix, data, expires)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        prefix = key_prefix(key)
+        key = self.key(key, version)
+        data = self.codec.encode(value)
+        expires = self.get_backend_timeout(timeout)
+        with self.store.lock:
+            if self.store.lookup(key, prefix) is not None:
+                return False
+            return self.store.put(key, prefix, data, expires)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        prefix = key_prefix(key)
+        key = self.key(key, version)
+        with self.store.lock:
+            entry = self.store.lookup(key, prefix)
+            if entry is None:
+                return False
+            data, size, _, prefix = entry
+            self.store.entries[key] = (
+                data, size, self.get_backend_timeout(timeout), prefix
+            )
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        prefix = key_prefix(key)
+        key = self.key(key, version)
+        with self.store.lock:
+            entry = self.store.lookup(key, prefix)
+            if entry is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self.codec.decode(entry[0]) + delta
+            self.store.put(key, prefix, self.codec.encode(value), entry[2])
+        return value
+
+    def has_key(self, key, version=None):
+        prefix = key_prefix(key)
+        key = self.key(key, version)
+        with self.store.lock:
+            return self.store.lookup(key, prefix) is not None
+
+    def delete(self, key, version=None):
+        key = self.key(key, version)
+        with self.store.lock:
+            self.store.discard(key)
+
+    def clear(self):
+        with self.store.lock:
+            self.store.clear()
+
+    def stats(self):
+        return self.store.stats()
+
+    def reset_stats(self):
+        with self.store.lock:
+            self.store.reset_stats()
+
+
+def memory_cache_stats():
+    """Статистика всех кешей ``MemoryCache`` из ``CACHES`` этого процесса."""
+    return {
+        alias: caches[alias].stats()
+        for alias, params in settings.CACHES.items()
+        if params['BACKEND'] == f'{__name__}.MemoryCache'
+    }
@@ -0,0 +1,219 @@
+"""Сериализация значений кеша.
+
+``Codec`` превращает значение в байты с заголовком из одного байта:
+старшие четыре бита - сжатие, младшие - формат. Форматы:
+
+- строка - UTF-8 без pickle: так хранятся фрагменты HTML;
+- байты - как есть;
+- строки таблицы - список кортежей одинаковой длины из чисел, строк,
+  дат и ``Decimal``, как у ``values_list``: хранится по столбцам через
+  ``marshal``, что короче pickle и лучше сжимается;
+- запись - кортеж из значения одного из форматов выше и нескольких
+  чисел или None, как записи ``core.singleflight`` (значение, срок,
+  время вычисления): числа хранятся ``marshal``, значение - своим
+  форматом;
+- всё остальное - pickle.
+
+Значения длиннее ``threshold`` байт сжимаются zlib или, если установлен
+пакет ``lz4``, по выбору им: он быстрее, но сжимает слабее. Заголовок
+хранит способ сжатия, поэтому процесс с любыми настройками прочитает
+записи остальных; данные lz4 без установленного ``lz4`` считаются
+промахом.
+"""
+import marshal
+import pickle
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+NONE, ZLIB, LZ4 = 0, 1, 2
+PICKLE, TEXT, ROWS, RAW, ENTRY = 0, 1, 2, 3, 4
+COMPRESSIONS = {'none': NONE, 'zlib': ZLIB, 'lz4': LZ4}
+
+EPOCH = datetime(1970, 1, 1)
+UTC_EPOCH = EPOCH.replace(tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def naive_to_int(value):
+    return (value - EPOCH) // MICROSECOND
+
+
+def naive_from_int(value):
+    return EPOCH + value * MICROSECOND
+
+
+def utc_to_int(value):
+    return (value - UTC_EPOCH) // MICROSECOND
+
+
+def utc_from_int(value):
+    return UTC_EPOCH + value * MICROSECOND
+
+
+# Типы столбцов формата строк таблицы; None допустим в любом. Даты и
+# время хранятся числами: короче строк и сжимаются лучше
+PLAIN_TYPES = (int, float, str, bytes, bool)
+COLUMN_TYPES = (
+    # Метка, тип значений, в marshal, из marshal
+    ('t', datetime, naive_to_int, naive_from_int),
+    ('u', datetime, utc_to_int, utc_from_int),
+    ('d', date, date.toordinal, date.fromordinal),
+    ('n', Decimal, str, Decimal),
+)
+MAX_COLUMNS = 64
+# Сколько чисел может идти в записи за значением
+MAX_ENTRY_FIELDS = 8
+
+
+class CodecError(ValueError):
+    """Байты нельзя прочитать: повреждены или нужен недоступный lz4."""
+
+
+def column_type(values):
+    """Метка и преобразование столбца или None, если формат не подходит."""
+    kinds = {type(value) for value in values if value is not None}
+    if kinds <= set(PLAIN_TYPES):
+        return 'v', None
+    if kinds == {datetime}:
+        offsets = {value.utcoffset() for value in values if value is not None}
+        if offsets == {None}:
+            return 't', naive_to_int
+        # Время в UTC читается обратно с timezone.utc вместо pytz.utc;
+        # другие пояса сохранит только pickle
+        if offsets == {timedelta(0)}:
+            return 'u', utc_to_int
+        return None
+    for tag, kind, dump, _ in COLUMN_TYPES:
+        if kind is not datetime and kinds == {kind}:
+            return tag, dump
+    return None
+
+
+def encode_rows(rows):
+    """Строки таблицы по столбцам или None, если формат не подходит."""
+    if not isinstance(rows, list) or not rows:
+        return None
+    width = len(rows[0]) if type(rows[0]) is tuple else 0
+    if not 0 < width <= MAX_COLUMNS:
+        return None
+    if any(type(row) is not tuple or len(row) != width for row in rows):
+        return None
+    tags, columns = [], []
+    for values in zip(*rows):
+        kind = column_type(values)
+        if kind is None:
+            return None
+        tag, dump = kind
+        if dump is not None:
+            values = tuple(
+                None if value is None else dump(value) for value in values
+            )
+        tags.append(tag)
+        columns.append(values)
+    return marshal.dumps((''.join(tags), tuple(columns)))
+
+
+def decode_rows(data):
+    tags, columns = marshal.loads(data)
+    loads = {tag: load for tag, _, _, load in COLUMN_TYPES}
+    columns = [
+        values if tag == 'v' else tuple(
+            None if value is None else loads[tag](value) for value in values
+        )
+        for tag, values in zip(tags, columns)
+    ]
+    return list(zip(*columns))
+
+
+def entry_fields(value):
+    """Числа записи после значения или None, если это не запись."""
+    if type(value) is not tuple or not 2 <= len(value) <= MAX_ENTRY_FIELDS:
+        return None
+    fields = value[1:]
+    if any(
+        field is not None and type(field) not in (int, float)
+        for field in fields
+    ):
+        return None
+    return fields
+
+
+class Codec:
+    def __init__(self, compression='zlib', threshold=1024, level=1):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Неизвестное сжатие {compression!r}')
+        if compression == 'lz4' and lz4 is None:
+            # Без пакета lz4 сжимаем тем, что есть всегда
+            compression = 'zlib'
+        self.compression = COMPRESSIONS[compression]
+        self.threshold = threshold
+        self.level = level
+
+    def encode(self, value):
+        kind, data = self.serialize(value)
+        compression = NONE
+        if self.compression != NONE and len(data) > self.threshold:
+            if self.compression == ZLIB:
+                packed = zlib.compress(data, self.level)
+            else:
+                packed = lz4.block.compress(data)
+            # Несжимаемые данные, например картинки, храним как есть
+            if len(packed) < len(data):
+                compression, data = self.compression, packed
+        return bytes((compression << 4 | kind,)) + data
+
+    def serialize(self, value, entry=True):
+        """Формат и байты значения без сжатия."""
+        if type(value) is str:
+            return TEXT, value.encode()
+        if type(value) is bytes:
+            return RAW, value
+        data = encode_rows(value)
+        if data is not None:
+            return ROWS, data
+        fields = entry_fields(value) if entry else None
+        if fields is not None:
+            kind, data = self.serialize(value[0], entry=False)
+            # Запись с pickle внутри дешевле целиком отдать pickle
+            if kind != PICKLE:
+                meta = marshal.dumps(fields)
+                return ENTRY, bytes((kind, len(meta))) + meta + data
+        return PICKLE, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        if not data:
+            raise CodecError('Пустое значение')
+        compression, kind = data[0] >> 4, data[0] & 0x0f
+        data = data[1:]
+        try:
+            if compression == ZLIB:
+                data = zlib.decompress(data)
+            elif compression == LZ4:
+                if lz4 is None:
+                    raise CodecError('Значение сжато lz4, а он не установлен')
+                data = lz4.block.decompress(data)
+            return self.deserialize(kind, data)
+        except (
+            zlib.error, pickle.UnpicklingError, ValueError, TypeError,
+            EOFError, IndexError,
+        ) as error:
+            raise CodecError(str(error)) from error
+
+    def deserialize(self, kind, data):
+        if kind == TEXT:
+            return data.decode()
+        if kind == RAW:
+            return data
+        if kind == ROWS:
+            return decode_rows(data)
+        if kind == ENTRY:
+            inner_kind, size = data[0], data[1]
+            fields = marshal.loads(data[2:2 + size])
+            return (self.deserialize(inner_kind, data[2 + size:]), *fields)
+        return pickle.loads(data)
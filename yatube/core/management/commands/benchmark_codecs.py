@@ -0,0 +1,130 @@
+import pickle
+import zlib
+from statistics import median
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import codecs
+from core.cache import key_prefix
+from posts.models import Post
+
+# Отдельный кеш в памяти: рабочий кеш с версиями тегов не очищается,
+# а записи, сделанные при рендеринге страниц, можно перебрать
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.MemoryCache',
+        'LOCATION': 'benchmark-codecs',
+        'OPTIONS': {'MAX_BYTES': 256 * 1024 * 1024},
+    },
+}
+# Служебные записи: версии тегов и блокировки
+SKIPPED_PREFIXES = ('cache-tag',)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер и время кодирования значений кеша: pickle и '
+        'core.codecs с разным сжатием на записях, которые сайт кладёт '
+        'в кеш при рендеринге настоящих страниц.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Сколько раз повторять каждый замер',
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        payloads = self.payloads()
+        if not payloads:
+            self.stderr.write('В базе нет постов для замеров.')
+            return
+        codecs_to_compare = [
+            ('pickle', pickle.dumps, pickle.loads),
+            # Тот же zlib поверх pickle: выигрыш формата строк таблицы
+            (
+                'pickle+z1',
+                lambda value: zlib.compress(pickle.dumps(value), 1),
+                lambda data: pickle.loads(zlib.decompress(data)),
+            ),
+        ]
+        for name, params in self.codec_params():
+            codec = codecs.Codec(**params)
+            codecs_to_compare.append((name, codec.encode, codec.decode))
+        self.stdout.write(
+            f'{"запись":<32}{"кодек":<12}{"байт":>10}{"доля":>8}'
+            f'{"кодирование":>15}{"чтение":>12}'
+        )
+        for payload_name, value in payloads:
+            baseline = len(pickle.dumps(value))
+            for codec_name, encode, decode in codecs_to_compare:
+                data = encode(value)
+                encode_time = self.timed(lambda: encode(value))
+                decode_time = self.timed(lambda: decode(data))
+                self.stdout.write(
+                    f'{payload_name:<32}{codec_name:<12}{len(data):>10}'
+                    f'{len(data) / baseline:>8.2f}'
+                    f'{encode_time:>12.1f} мкс{decode_time:>8.1f} мкс'
+                )
+
+    @staticmethod
+    def codec_params():
+        yield 'none', {'compression': 'none'}
+        yield 'zlib-1', {'compression': 'zlib', 'level': 1}
+        yield 'zlib-6', {'compression': 'zlib', 'level': 6}
+        if codecs.lz4 is not None:
+            yield 'lz4', {'compression': 'lz4'}
+
+    def payloads(self):
+        """Самые большие записи каждого префикса ключей после рендеринга
+        страниц сайта.
+
+        Это записи ``core.singleflight`` в том виде, в каком их получает
+        кодек: (значение, срок, время вычисления).
+        """
+        if not Post.objects.exists():
+            return []
+        post = Post.objects.order_by('-pub_date').first()
+        # Адрес не из INTERNAL_IPS: иначе в страницу попала бы панель
+        # django-debug-toolbar
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=(post.author.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+            reverse('posts:feed_latest'),
+            reverse('api:posts'),
+            reverse('api:post', args=(post.pk,)),
+        ]
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            cache.clear()
+            for url in urls:
+                client.get(url)
+            payloads = {}
+            for key, entry in list(cache.store.entries.items()):
+                prefix = key_prefix(key.split(':', 2)[-1])
+                if prefix.startswith(SKIPPED_PREFIXES):
+                    continue
+                value = cache.codec.decode(entry[0])
+                if prefix not in payloads or (
+                    entry[1] > payloads[prefix][0]
+                ):
+                    payloads[prefix] = (entry[1], value)
+            cache.clear()
+        return [
+            (prefix, value)
+            for prefix, (_, value) in sorted(payloads.items())
+        ]
+
+    def timed(self, call):
+        timings = []
+        for _ in range(self.repeat):
+            start = perf_counter()
+            call()
+            timings.append(perf_counter() - start)
+        return median(timings) * 1e6
@@ -0,0 +1,91 @@
+import glob
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ORDERS = {
+    'total': lambda stats: stats['total'],
+    'max': lambda stats: stats['max'],
+    'count': lambda stats: stats['count'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных запросов по отпечаткам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='сколько отпечатков показать',
+        )
+        parser.add_argument(
+            '--sort', choices=sorted(ORDERS), default='total',
+            help='по суммарному, худшему времени или числу запросов',
+        )
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG,
+            help='журнал; ротированные файлы рядом читаются тоже',
+        )
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(f'{glob.escape(options["log"])}*'))
+        if not paths:
+            raise CommandError(f'Журнал {options["log"]} не найден.')
+        fingerprints = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0, 'views': set(),
+            'origins': set(), 'plan': None, 'sql': None, 'normalized': None,
+        })
+        for path in paths:
+            with open(path, encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.add(fingerprints[entry['fingerprint']], entry)
+        worst = sorted(
+            fingerprints.items(), key=lambda item: ORDERS[options['sort']](
+                item[1]
+            ), reverse=True,
+        )[:options['top']]
+        for key, stats in worst:
+            self.report(key, stats)
+        self.stdout.write(self.style.SUCCESS(
+            f'Отпечатков: {len(fingerprints)}, запросов: '
+            f'{sum(stats["count"] for stats in fingerprints.values())}'
+        ))
+
+    @staticmethod
+    def add(stats, entry):
+        stats['count'] += 1
+        stats['total'] += entry['duration']
+        if entry['duration'] >= stats['max']:
+            stats['max'] = entry['duration']
+            # Пример - самый медленный запрос отпечатка
+            stats['sql'] = entry['sql']
+            stats['params'] = entry.get('params')
+        stats['normalized'] = entry['normalized']
+        if entry.get('view'):
+            stats['views'].add(entry['view'])
+        if entry.get('origin'):
+            stats['origins'].add(entry['origin'])
+        if entry.get('plan'):
+            stats['plan'] = entry['plan']
+
+    def report(self, key, stats):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{key}: {stats["count"]} раз, всего {stats["total"]:.3f} с, '
+            f'в среднем {stats["total"] / stats["count"]:.3f} с, '
+            f'худший {stats["max"]:.3f} с'
+        ))
+        self.stdout.write(f'  {stats["normalized"]}')
+        if stats['views']:
+            self.stdout.write(f'  view: {", ".join(sorted(stats["views"]))}')
+        for origin in sorted(stats['origins']):
+            self.stdout.write(f'  из {origin}')
+        if stats.get('params'):
+            self.stdout.write(f'  параметры худшего: {stats["params"]}')
+        for step in stats['plan'] or ():
+            self.stdout.write(f'  план: {step}')
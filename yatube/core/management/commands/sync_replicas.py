@@ -0,0 +1,52 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SQLITE = 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из DATABASE_REPLICAS '
+        'для локальной проверки чтения с реплик.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='реплики для обновления; по умолчанию все',
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError(
+                'Реплики не настроены: задайте DATABASE_REPLICAS.'
+            )
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        if primary['ENGINE'] != SQLITE:
+            raise CommandError(
+                'Копировать можно только базу SQLite; реплики других СУБД '
+                'обновляет их собственная репликация.'
+            )
+        for alias in aliases:
+            if alias not in settings.DATABASE_REPLICAS:
+                raise CommandError(f'{alias} - не реплика.')
+            replica = connections[alias].settings_dict
+            if replica['ENGINE'] != SQLITE:
+                raise CommandError(f'Реплика {alias} - не SQLite.')
+            # Соединение Django с репликой держало бы старый снимок файла
+            connections[alias].close()
+            source = sqlite3.connect(primary['NAME'])
+            target = sqlite3.connect(replica['NAME'])
+            try:
+                # Онлайн-копия: согласованный снимок без остановки записи
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self.stdout.write(self.style.SUCCESS(
+                f'{alias}: {replica["NAME"]} обновлена'
+            ))
@@ -0,0 +1,292 @@
+"""Метрики запросов в формате Prometheus.
+
+``MetricsMiddleware`` собирает по каждому запросу время ответа, число
+и время SQL-запросов, время рендеринга шаблонов, попадания в кеш и
+размер ответа и складывает их в реестр процесса с меткой ``view`` -
+именем сработавшего маршрута (``posts:index``, ``api:posts``).
+
+Реестр - словарь счётчиков в памяти процесса. Раз в
+``settings.METRICS_FLUSH_INTERVAL`` секунд процесс записывает его целиком
+в свой файл ``<pid>.json`` в ``settings.METRICS_DIR``, а страница метрик
+складывает файлы всех процессов. Без ``METRICS_DIR`` видны метрики
+только текущего процесса.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.template.backends.django import (
+    DjangoTemplates as BaseDjangoTemplates, Template as BaseTemplate, reraise
+)
+from django.template.exceptions import TemplateDoesNotExist
+
+PREFIX = 'yatube_'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Имя: (тип, описание, границы корзин для гистограмм)
+METRICS = {
+    'requests_total': ('counter', 'Число запросов.', None),
+    'request_duration_seconds': (
+        'histogram', 'Время ответа, секунды.', LATENCY_BUCKETS
+    ),
+    'db_queries_total': ('counter', 'Число SQL-запросов.', None),
+    'db_query_duration_seconds_total': (
+        'counter', 'Суммарное время SQL-запросов, секунды.', None
+    ),
+    'template_render_seconds_total': (
+        'counter',
+        'Суммарное время рендеринга шаблонов вместе с запросами из них, '
+        'секунды.',
+        None,
+    ),
+    'cache_requests_total': (
+        'counter', 'Обращения к кешу страниц по результату.', None
+    ),
+    'response_size_bytes': (
+        'histogram', 'Размер тела ответа, байты.', SIZE_BUCKETS
+    ),
+}
+
+
+class Registry:
+    """Значения метрик процесса.
+
+    Ключ - JSON-строка ``[имя, {метки}]``: так реестр без преобразований
+    пишется в файл и складывается с реестрами других процессов. Значение
+    счётчика - список из одного числа, гистограммы - счётчики корзин,
+    сумма и общее число наблюдений.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed = time.monotonic()
+
+    @staticmethod
+    def key(name, labels):
+        return json.dumps([name, labels], sort_keys=True, ensure_ascii=False)
+
+    def inc(self, name, labels, amount=1):
+        key = self.key(name, labels)
+        with self.lock:
+            values = self.values.setdefault(key, [0])
+            values[0] += amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = self.key(name, labels)
+        # Наблюдение попадает в первую корзину, граница которой не меньше
+        # значения; накопленные суммы считаются при выводе
+        index = bisect_left(buckets, value)
+        with self.lock:
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [0] * (len(buckets) + 3)
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {key: list(values) for key, values in self.values.items()}
+
+    def flush(self, force=False):
+        """Пишет реестр в файл процесса, если пора или ``force``."""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return
+        # Отдельная блокировка: пока файл пишется, запросы других потоков
+        # продолжают считать в реестр
+        with self.flush_lock:
+            now = time.monotonic()
+            interval = settings.METRICS_FLUSH_INTERVAL
+            if not force and now - self.flushed < interval:
+                return
+            self.flushed = now
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{os.getpid()}.json')
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as output:
+                json.dump(self.snapshot(), output, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+registry = Registry()
+
+
+def collect():
+    """Метрики всех процессов, сложенные вместе."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return registry.snapshot()
+    registry.flush(force=True)
+    total = {}
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                values = json.load(f)
+        except (OSError, ValueError):
+            # Файл процесса пишется через os.replace и битым не бывает;
+            # пропадает он, только если его удалили между listdir и open
+            continue
+        for key, numbers in values.items():
+            current = total.get(key)
+            if current is None:
+                total[key] = numbers
+            else:
+                total[key] = [a + b for a, b in zip(current, numbers)]
+    return total
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        f'{name}="{escape(value)}"' for name, value in sorted(labels.items())
+    )
+    return f'{{{pairs}}}'
+
+
+def format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value)
+
+
+def exposition(values):
+    """Текст метрик в формате Prometheus 0.0.4."""
+    series = {}
+    for key, numbers in values.items():
+        name, labels = json.loads(key)
+        series.setdefault(name, []).append((labels, numbers))
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if name not in series:
+            continue
+        full_name = f'{PREFIX}{name}'
+        lines.append(f'# HELP {full_name} {help_text}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        for labels, numbers in sorted(
+            series[name], key=lambda item: sorted(item[0].items())
+        ):
+            if kind == 'counter':
+                lines.append(
+                    f'{full_name}{format_labels(labels)} '
+                    f'{format_number(numbers[0])}'
+                )
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), numbers):
+                cumulative += count
+                bucket_labels = format_labels({**labels, 'le': bound})
+                lines.append(
+                    f'{full_name}_bucket{bucket_labels} {cumulative}'
+                )
+            lines.append(
+                f'{full_name}_sum{format_labels(labels)} '
+                f'{format_number(numbers[-2])}'
+            )
+            lines.append(
+                f'{full_name}_count{format_labels(labels)} '
+                f'{format_number(numbers[-1])}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """Счётчики одного запроса, которые дополняют хуки по ходу работы."""
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - started
+            self.queries += 1
+
+
+_local = threading.local()
+
+
+def current():
+    """Счётчики запроса, который обрабатывает поток, или None."""
+    return getattr(_local, 'request', None)
+
+
+def start_request():
+    _local.request = RequestMetrics()
+    return _local.request
+
+
+def finish_request():
+    _local.request = None
+
+
+def cache_hit():
+    state = current()
+    if state is not None:
+        state.cache_hits += 1
+
+
+def cache_miss():
+    state = current()
+    if state is not None:
+        state.cache_misses += 1
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        state = current()
+        if state is None:
+            return super().render(context, request)
+        # Шаблон, отрендеренный изнутри другого, уже посчитан во внешнем
+        state.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            state.template_depth -= 1
+            if not state.template_depth:
+                state.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """Шаблонизатор Django, замеряющий время рендеринга для метрик."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,99 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics, replicas
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса; должен стоять первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(state.execute_wrapper)
+                    )
+                response = self.get_response(request)
+            try:
+                self.record(request, response, state, started)
+            except Exception:
+                # Сбой метрик не должен ломать ответ
+                logger.exception('Не удалось записать метрики запроса')
+        finally:
+            metrics.finish_request()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Имя view нужно журналу медленных запросов ещё до ответа
+        state = metrics.current()
+        if state is not None:
+            state.view = request.resolver_match.view_name
+
+    @staticmethod
+    def record(request, response, state, started):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        labels = {'view': view}
+        registry = metrics.registry
+        registry.inc('requests_total', {
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+        })
+        registry.observe(
+            'request_duration_seconds', labels, time.perf_counter() - started
+        )
+        if state.queries:
+            registry.inc('db_queries_total', labels, state.queries)
+            registry.inc(
+                'db_query_duration_seconds_total', labels, state.query_time
+            )
+        if state.template_time:
+            registry.inc(
+                'template_render_seconds_total', labels, state.template_time
+            )
+        for result, count in (
+            ('hit', state.cache_hits), ('miss', state.cache_misses)
+        ):
+            if count:
+                registry.inc(
+                    'cache_requests_total', {**labels, 'result': result},
+                    count,
+                )
+        # Размер потокового ответа заранее неизвестен
+        if not response.streaming:
+            registry.observe(
+                'response_size_bytes', labels, len(response.content)
+            )
+        registry.flush()
+
+
+class ReplicaMiddleware:
+    """Оставляет записавшего пользователя на основной базе.
+
+    Стоит после SessionMiddleware: отметка хранится в сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = replicas.finish_request()
+        if wrote and hasattr(request, 'session'):
+            replicas.pin(request)
+        return response
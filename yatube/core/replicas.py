@@ -0,0 +1,137 @@
+"""Чтение с реплик базы.
+
+Реплики перечислены в ``settings.DATABASE_REPLICAS``. View с
+декоратором ``read_replica`` читают с одной из них, выбранной на весь
+запрос; остальной код, все записи и чтения сессий идут в основную базу.
+
+Реплика отстаёт от основной базы, поэтому пользователь, который что-то
+записал, ``settings.REPLICA_STICKY_SECONDS`` секунд читает только из
+основной: срок хранится в его сессии (read-your-writes). Записи
+замечает роутер, отметку в сессию ставит ``ReplicaMiddleware``.
+
+Чужие записи сессия не отмечает: view может передать ``read_replica``
+условие ``primary_if``, которое до первого чтения данных страницы решает,
+не читать ли её из основной базы (см. ``posts.conditional``).
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_SESSION_KEY = '_primary_until'
+SAFE_METHODS = ('GET', 'HEAD')
+# Приложения, которые всегда читаются из основной базы
+PRIMARY_APPS = {'sessions'}
+
+_local = threading.local()
+
+
+def start_request():
+    _local.in_request = True
+    _local.wrote = False
+
+
+def finish_request():
+    """Завершает запрос; True, если в нём была запись."""
+    wrote = getattr(_local, 'wrote', False)
+    _local.in_request = False
+    _local.wrote = False
+    return wrote
+
+
+def pin(request):
+    """Оставляет пользователя на основной базе на время отставания."""
+    request.session[STICKY_SESSION_KEY] = (
+        time.time() + settings.REPLICA_STICKY_SECONDS
+    )
+
+
+def is_pinned(request):
+    session = getattr(request, 'session', None)
+    return bool(session) and session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+@contextmanager
+def use_replica(alias=None):
+    """Чтения внутри блока идут на реплику ``alias`` или случайную."""
+    previous = getattr(_local, 'replica', None)
+    if not getattr(_local, 'in_request', False):
+        # Вне запроса блок сам отвечает за свои записи
+        _local.wrote = False
+    replicas = settings.DATABASE_REPLICAS
+    _local.replica = alias or (random.choice(replicas) if replicas else None)
+    try:
+        yield _local.replica
+    finally:
+        _local.replica = previous
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут в основную базу."""
+    previous = getattr(_local, 'replica', None)
+    _local.replica = None
+    try:
+        yield
+    finally:
+        _local.replica = previous
+
+
+def read_replica(view=None, *, primary_if=None):
+    """Декоратор view только для чтения: GET и HEAD читают с реплики.
+
+    Ставится внешним, чтобы на реплику шли и проверки условного GET.
+    ``primary_if(request, *args, **kwargs)`` вызывается на реплике
+    до view; если оно истинно, весь view читает из основной базы.
+    """
+    if view is None:
+        return partial(read_replica, primary_if=primary_if)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method not in SAFE_METHODS
+            or is_pinned(request)
+        ):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            if primary_if is None or not primary_if(
+                request, *args, **kwargs
+            ):
+                return view(request, *args, **kwargs)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(_local, 'replica', None)
+        if (
+            replica is None
+            or getattr(_local, 'wrote', False)
+            or model._meta.app_label in PRIMARY_APPS
+        ):
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # После записи запрос дочитывает данные из основной базы
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приходит вместе с данными из основной базы
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,156 @@
+"""Защита кеша от лавины пересчётов.
+
+Когда запись популярного ключа истекает, все одновременные запросы
+видят промах и пересчитывают одно и то же. ``fetch`` пересчитывает
+значение в одном запросе на ключ: он берёт блокировку ``cache.add``,
+общую для всех процессов, а остальные на это время получают прежнее
+значение или, если его нет, ждут до ``SINGLE_FLIGHT_WAIT`` секунд.
+
+Прежнее значение доступно, потому что запись хранится в кеше на
+``SINGLE_FLIGHT_GRACE`` секунд дольше своего срока. Горячие ключи
+обновляются ещё до истечения вероятностно (XFetch): чем ближе срок и
+чем дольше пересчёт, тем вероятнее, что очередной запрос возьмётся за
+него сам, пока остальные получают свежее значение.
+
+``single_flight_page`` - то же для целых ответов view.
+"""
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import metrics
+
+LOCK_SUFFIX = ':lock'
+PAGE_KEY_PREFIX = 'single-flight-page:'
+FIRST_POLL_INTERVAL = 0.01
+MAX_POLL_INTERVAL = 0.1
+
+
+def should_refresh(expires, delta, beta):
+    """Пора ли пересчитать значение со сроком ``expires`` (XFetch).
+
+    ``delta`` - сколько секунд заняло прошлое вычисление.
+    """
+    # 1 - random() лежит в (0, 1]: логарифм определён
+    early = -delta * beta * math.log(1.0 - random.random())
+    return time.time() + early >= expires
+
+
+def unpack(entry):
+    """Значение, срок и время вычисления записи или None."""
+    # Записи, сделанные не через fetch, считаются промахом
+    if isinstance(entry, tuple) and len(entry) == 3:
+        return entry
+    return None
+
+
+def store(key, compute, timeout):
+    started = time.perf_counter()
+    value = compute()
+    delta = time.perf_counter() - started
+    if timeout is None:
+        expires = cache_timeout = None
+    else:
+        expires = time.time() + timeout
+        cache_timeout = timeout + settings.SINGLE_FLIGHT_GRACE
+    cache.set(key, (value, expires, delta), cache_timeout)
+    return value
+
+
+def wait(key):
+    """Ждёт, пока значение посчитает другой запрос; None, если не дождался."""
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+    interval = FIRST_POLL_INTERVAL
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        entry = unpack(cache.get(key))
+        if entry is not None:
+            return entry
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+    return None
+
+
+def fetch(key, compute, timeout, beta=None):
+    """Значение ключа и True, если его посчитал этот вызов.
+
+    ``compute`` вызывается без аргументов; ``timeout`` - срок значения
+    в секундах или None для бессрочного.
+    """
+    if beta is None:
+        beta = settings.SINGLE_FLIGHT_BETA
+    entry = unpack(cache.get(key))
+    if entry is not None:
+        value, expires, delta = entry
+        if expires is None or not should_refresh(expires, delta, beta):
+            return value, False
+    lock_key = key + LOCK_SUFFIX
+    if cache.add(lock_key, True, settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+        try:
+            return store(key, compute, timeout), True
+        finally:
+            cache.delete(lock_key)
+    if entry is None:
+        entry = wait(key)
+    if entry is not None:
+        # Пересчитывает другой запрос; пока отдаём то, что есть
+        return entry[0], False
+    # Вычисление в другом запросе затянулось или упало
+    return store(key, compute, timeout), True
+
+
+def is_shareable(request, response):
+    """Можно ли отдать ответ другим запросам с тем же ключом."""
+    messages = getattr(request, '_messages', None)
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # В странице CSRF-токен или сообщения этого пользователя
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not getattr(messages, 'used', False)
+    )
+
+
+def single_flight_page(timeout, key_func):
+    """Декоратор view: общий для запросов ответ, считаемый одним из них.
+
+    ``key_func`` получает аргументы view и возвращает ключ ответа или
+    None, если ответ нужно построить для этого запроса отдельно. В ключ
+    должно входить всё, от чего зависит ответ. Сохраняются только тело
+    и Content-Type ответов 200 без данных пользователя; если ответ не
+    такой, до истечения ``timeout`` каждый запрос строит свой.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = key_func(request, *args, **kwargs)
+            if key is None:
+                return view(request, *args, **kwargs)
+            own = []
+
+            def render():
+                response = view(request, *args, **kwargs)
+                if not is_shareable(request, response):
+                    # None в кеше: ждать чужого ответа по ключу незачем
+                    own.append(response)
+                    return None
+                return response.content, response['Content-Type']
+
+            page, computed = fetch(PAGE_KEY_PREFIX + key, render, timeout)
+            if own:
+                return own[0]
+            if page is None:
+                return view(request, *args, **kwargs)
+            if computed:
+                metrics.cache_miss()
+            else:
+                metrics.cache_hit()
+            content, content_type = page
+            return HttpResponse(content, content_type=content_type)
+        return wrapper
+    return decorator
@@ -0,0 +1,181 @@
+"""Журнал медленных SQL-запросов.
+
+Обёртка ``execute_wrapper`` ставится на каждое подключение к базе при
+его создании и записывает запросы дольше
+``settings.SLOW_QUERY_THRESHOLD`` секунд: текст, параметры, view, из
+которого пришёл запрос, место в коде проекта и план выполнения.
+
+Записи - строки JSON в ``settings.SLOW_QUERY_LOG`` с ротацией по
+размеру. Запросы, отличающиеся только значениями, имеют общий отпечаток
+(``fingerprint``); план снимается для отпечатка один раз за время жизни
+процесса, чтобы повторяющийся медленный запрос не удваивал нагрузку.
+Сводку по журналу печатает команда ``slow_queries``.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from . import metrics
+
+logger = logging.getLogger('yatube.slow_queries')
+# Логгер пишет только в свой файл, а не в общий вывод
+logger.propagate = False
+errors = logging.getLogger(__name__)
+
+MAX_PARAM_LENGTH = 200
+MAX_PLANNED_FINGERPRINTS = 10000
+EXPLAINABLE = ('SELECT', 'WITH')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+_local = threading.local()
+_planned = set()
+_planned_lock = threading.Lock()
+_handler_path = None
+
+
+def normalize(sql):
+    """Текст запроса без значений: литералы и списки IN заменены на ?."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:16]
+
+
+def short(value):
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) > MAX_PARAM_LENGTH:
+        text = f'{text[:MAX_PARAM_LENGTH]}...'
+    return text
+
+
+def origin():
+    """Ближайший к запросу кадр стека из кода проекта."""
+    for frame in reversed(traceback.extract_stack()):
+        path = frame.filename
+        if (
+            path.startswith(settings.BASE_DIR)
+            and 'site-packages' not in path
+            and path != __file__
+        ):
+            relative = os.path.relpath(path, settings.BASE_DIR)
+            return f'{relative}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def explain(connection, sql, params):
+    """План выполнения запроса или None, если снять его нельзя."""
+    if not sql.lstrip()[:6].upper().startswith(EXPLAINABLE):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else (
+        'EXPLAIN'
+    )
+    _local.explaining = True
+    try:
+        # Точка сохранения: неудачный EXPLAIN не ломает транзакцию
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                rows = cursor.fetchall()
+    except DatabaseError as error:
+        return [f'EXPLAIN не удался: {error}']
+    finally:
+        _local.explaining = False
+    if connection.vendor == 'sqlite':
+        # id, parent, notused, detail
+        return [row[-1] for row in rows]
+    return [' '.join(map(str, row)) for row in rows]
+
+
+def needs_plan(key):
+    with _planned_lock:
+        if key in _planned:
+            return False
+        if len(_planned) >= MAX_PLANNED_FINGERPRINTS:
+            _planned.clear()
+        _planned.add(key)
+        return True
+
+
+def get_logger():
+    """Логгер с файлом из текущих настроек."""
+    global _handler_path
+    path = settings.SLOW_QUERY_LOG
+    if _handler_path != path:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+            encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        _handler_path = path
+    return logger
+
+
+def record(connection, sql, params, many, duration):
+    key = fingerprint(sql)
+    state = metrics.current()
+    entry = {
+        'time': time.time(),
+        'duration': round(duration, 6),
+        'fingerprint': key,
+        'database': connection.alias,
+        'view': state.view if state else None,
+        'origin': origin(),
+        'sql': sql,
+        'params': None if many else [short(param) for param in params or ()],
+        'normalized': normalize(sql),
+    }
+    if not many and needs_plan(key):
+        entry['plan'] = explain(connection, sql, params)
+    get_logger().info(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if threshold is None or getattr(_local, 'explaining', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    if duration >= threshold:
+        try:
+            record(context['connection'], sql, params, many, duration)
+        except Exception:
+            # Журнал не должен ломать запрос, который он описывает
+            errors.exception('Не удалось записать медленный запрос')
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик ``connection_created``: ставит обёртку на подключение."""
+    if execute_wrapper not in connection.execute_wrappers:
+        # В начало списка: подключение может открыться внутри
+        # ``with connection.execute_wrapper(...)``, который при выходе
+        # снимает последнюю обёртку
+        connection.execute_wrappers.insert(0, execute_wrapper)
@@ -0,0 +1,182 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import ENTRY_OVERHEAD, key_prefix
+
+User = get_user_model()
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+MEMORY = 'core.cache.MemoryCache'
+# Бюджет на четыре записи по килобайту
+BUDGET = 4 * (1024 + 100 + ENTRY_OVERHEAD)
+
+
+def tiered(local, local_timeout=5):
+    return {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'LOCAL': local,
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': local_timeout,
+            'SHARED_ONLY_PREFIXES': ['tag:'],
+        },
+    }
+
+
+# Два процесса с общим кешем: у каждого свой локальный уровень
+@override_settings(CACHES={
+    'default': {'BACKEND': LOCMEM},
+    'first': tiered('first-local'),
+    'second': tiered('second-local'),
+    'short': tiered('short-local', local_timeout=0.05),
+    'first-local': {'BACKEND': LOCMEM, 'LOCATION': 'first-local'},
+    'second-local': {'BACKEND': LOCMEM, 'LOCATION': 'second-local'},
+    'short-local': {'BACKEND': LOCMEM, 'LOCATION': 'short-local'},
+    'shared': {'BACKEND': LOCMEM, 'LOCATION': 'shared'},
+})
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        for alias in ('first', 'second', 'short'):
+            caches[alias].clear()
+        self.first = caches['first']
+        self.second = caches['second']
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Прочитанное из общего кеша дальше отдаётся из памяти процесса."""
+        self.first.set('fragment', 'html')
+        self.assertEqual(self.second.get('fragment'), 'html')
+        caches['shared'].delete('fragment')
+        self.assertEqual(self.second.get('fragment'), 'html')
+        self.assertEqual(
+            self.second.get_many(['fragment', 'absent']), {'fragment': 'html'}
+        )
+
+    def test_shared_only_keys_coherent(self):
+        """Версии тегов, изменённые другим процессом, видны сразу."""
+        self.first.set('tag:feed', 1)
+        self.assertEqual(self.second.get('tag:feed'), 1)
+        self.first.set('tag:feed', 2)
+        self.assertEqual(self.second.get('tag:feed'), 2)
+        self.assertEqual(self.second.get_many(['tag:feed']), {'tag:feed': 2})
+        self.assertIsNone(caches['second-local'].get('tag:feed'))
+
+    def test_writes_update_own_local_tier(self):
+        """Запись, удаление и incr сразу видны процессу, который их сделал."""
+        self.first.set('counter', 1)
+        self.assertEqual(self.first.incr('counter'), 2)
+        self.assertEqual(self.first.get('counter'), 2)
+        self.first.delete('counter')
+        self.assertIsNone(self.first.get('counter'))
+        self.assertTrue(self.first.add('taken', 'first'))
+        self.assertFalse(self.second.add('taken', 'second'))
+        self.assertEqual(self.second.get('taken'), 'first')
+
+    def test_local_copy_expires(self):
+        """Локальная копия живёт не дольше LOCAL_TIMEOUT."""
+        short = caches['short']
+        short.set('fragment', 'old')
+        caches['shared'].set('fragment', 'new')
+        self.assertEqual(short.get('fragment'), 'old')
+        time.sleep(0.1)
+        self.assertEqual(short.get('fragment'), 'new')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': LOCMEM},
+    'lru': {
+        'BACKEND': MEMORY, 'LOCATION': 'test-lru',
+        'OPTIONS': {'MAX_BYTES': BUDGET},
+    },
+    'lfu': {
+        'BACKEND': MEMORY, 'LOCATION': 'test-lfu',
+        'OPTIONS': {'MAX_BYTES': BUDGET, 'POLICY': 'lfu'},
+    },
+})
+class MemoryCacheTest(SimpleTestCase):
+    def setUp(self):
+        for alias in ('lru', 'lfu'):
+            caches[alias].clear()
+            caches[alias].reset_stats()
+
+    def fill(self, cache, *names):
+        for name in names:
+            cache.set(f'page:{name}', 'x' * 1024)
+
+    def stored(self, cache, *names):
+        return [
+            name for name in names if cache.has_key(f'page:{name}')
+        ]
+
+    def test_byte_budget_lru(self):
+        """Сверх бюджета вытесняется давно не читанная запись."""
+        cache = caches['lru']
+        self.fill(cache, '1', '2', '3', '4')
+        cache.get('page:1')
+        self.fill(cache, '5')
+        self.assertEqual(
+            self.stored(cache, '1', '2', '3', '4', '5'), ['1', '3', '4', '5']
+        )
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], stats['max_bytes'])
+        self.assertEqual(stats['prefixes']['page']['evictions'], 1)
+        # Значение больше бюджета не вытесняет остальные
+        cache.set('huge', 'x' * BUDGET)
+        self.assertIsNone(cache.get('huge'))
+        self.assertEqual(len(self.stored(cache, '1', '3', '4', '5')), 4)
+
+    def test_lfu_keeps_popular_entries(self):
+        """LFU вытесняет редко читаемое, даже если его читали недавно."""
+        cache = caches['lfu']
+        self.fill(cache, '1', '2', '3', '4')
+        for _ in range(3):
+            for name in ('1', '3', '4'):
+                cache.get(f'page:{name}')
+        cache.get('page:2')
+        self.fill(cache, '5')
+        self.assertEqual(
+            self.stored(cache, '1', '2', '3', '4', '5'), ['1', '3', '4', '5']
+        )
+
+    def test_stats_by_prefix(self):
+        """Попадания и промахи считаются по префиксу ключа."""
+        cache = caches['lru']
+        key = make_template_fragment_key('index_page', ['feed', 1.5])
+        self.assertEqual(key_prefix(key), 'template.cache.index_page')
+        self.assertEqual(key_prefix('cache-tag:group:12'), 'cache-tag.group')
+        cache.get(key)
+        cache.set(key, 'html')
+        cache.get(key)
+        counters = cache.stats()['prefixes']['template.cache.index_page']
+        self.assertEqual(
+            (counters['hits'], counters['misses'], counters['entries']),
+            (1, 1, 1)
+        )
+        self.assertEqual(counters['hit_rate'], 0.5)
+
+
+class CacheStatsPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_stats_page(self):
+        """Страница статистики доступна только персоналу."""
+        caches['default'].set('template.cache.index_page.0', 'html')
+        caches['default'].set('cache-tag:group:1', 1)
+        url = reverse('cache_stats')
+        client = Client()
+        client.force_login(self.user)
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(self.admin)
+        response = client.get(url)
+        self.assertContains(response, 'template.cache.index_page')
+        # Версии тегов хранит только общий уровень
+        self.assertContains(response, 'shared: LFU')
+        self.assertContains(response, 'cache-tag')
+        self.assertRedirects(client.post(url), url)
@@ -0,0 +1,145 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import codecs
+from posts.models import Post
+
+User = get_user_model()
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+HTML = '<article class="post"><p>Текст поста</p></article>\n' * 200
+
+
+class CodecTest(SimpleTestCase):
+    def setUp(self):
+        self.codec = codecs.Codec(threshold=1024)
+
+    def test_round_trip(self):
+        """Значения любых форматов читаются такими же, какими записаны."""
+        moscow = timezone(timedelta(hours=3))
+        values = [
+            HTML,
+            'коротко',
+            b'\x89PNG' * 10,
+            1.5,
+            None,
+            (b'<rss/>', 'application/rss+xml'),
+            [
+                (1, 'текст', datetime(2022, 1, 2, 3, 4, 5, 6), None),
+                (2, None, None, Decimal('1.50')),
+            ],
+            [(1, datetime(2022, 1, 2, tzinfo=timezone.utc), date(2022, 1, 2))],
+            [(1, datetime(2022, 1, 2, tzinfo=moscow))],
+            [(1, 'mixed'), (2, b'mixed')],
+            [(1, 2), (3,)],
+            (HTML, 1.5, 0.01),
+            ('коротко', None, 0.2),
+            ({'results': []}, 1.5, 0.01),
+            (1, 2),
+        ]
+        for value in values:
+            with self.subTest(value=repr(value)[:40]):
+                self.assertEqual(
+                    self.codec.decode(self.codec.encode(value)), value
+                )
+
+    def test_formats(self):
+        """Строки и таблицы хранятся без pickle, большие значения сжаты."""
+        data = self.codec.encode(HTML)
+        self.assertEqual(data[0], codecs.ZLIB << 4 | codecs.TEXT)
+        self.assertLess(len(data), len(HTML.encode()) / 5)
+        self.assertEqual(
+            self.codec.encode('коротко')[0], codecs.NONE << 4 | codecs.TEXT
+        )
+        rows = [(pk, datetime(2022, 1, 1) + timedelta(pk)) for pk in range(9)]
+        self.assertEqual(
+            self.codec.encode(rows)[0] & 0x0f, codecs.ROWS
+        )
+        # Запись singleflight: значение хранится своим форматом
+        entry = self.codec.encode((HTML, 1.5, 0.01))
+        self.assertEqual(entry[0], codecs.ZLIB << 4 | codecs.ENTRY)
+        self.assertLess(len(entry), len(HTML.encode()) / 5)
+        self.assertEqual(
+            self.codec.encode(({'results': []}, 1.5, 0.01))[0] & 0x0f,
+            codecs.PICKLE
+        )
+        # Несжимаемые байты хранятся как есть
+        noise = os.urandom(4096)
+        self.assertEqual(
+            codecs.Codec(threshold=0).encode(noise)[0] & 0xf0,
+            codecs.NONE << 4
+        )
+
+    def test_corrupt_data(self):
+        """Испорченные байты дают CodecError."""
+        data = self.codec.encode(HTML)
+        for broken in (b'', data[:20], bytes((0x42,)) + data[1:]):
+            with self.subTest(broken=broken[:4]):
+                with self.assertRaises(codecs.CodecError):
+                    self.codec.decode(broken)
+
+    @skipUnless(codecs.lz4, 'lz4 не установлен')
+    def test_lz4(self):
+        """Значения, сжатые lz4, читает кодек с любыми настройками."""
+        data = codecs.Codec(compression='lz4').encode(HTML)
+        self.assertEqual(data[0] >> 4, codecs.LZ4)
+        self.assertEqual(codecs.Codec().decode(data), HTML)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': LOCMEM},
+    'tiered': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'LOCAL': 'codec-local', 'SHARED': 'codec-shared',
+            'CODEC': {'compression': 'zlib'},
+        },
+    },
+    'codec-local': {
+        'BACKEND': 'core.cache.MemoryCache', 'LOCATION': 'codec-local',
+    },
+    'codec-shared': {'BACKEND': LOCMEM, 'LOCATION': 'codec-shared'},
+})
+class CodecCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['tiered']
+        self.cache.clear()
+
+    def test_tiers_store_encoded_bytes(self):
+        """Оба уровня хранят сжатые байты, читается исходное значение."""
+        self.cache.set('fragment', HTML)
+        for alias in ('codec-local', 'codec-shared'):
+            stored = caches[alias].get('fragment')
+            self.assertIsInstance(stored, bytes)
+            self.assertLess(len(stored), len(HTML.encode()) / 5)
+        self.assertEqual(self.cache.get('fragment'), HTML)
+        caches['codec-local'].clear()
+        self.assertEqual(self.cache.get_many(['fragment']), {'fragment': HTML})
+
+    def test_incr_and_unreadable_values(self):
+        """incr работает с закодированным числом, мусор считается промахом."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(self.cache.get('counter'), 3)
+        caches['codec-shared'].set('broken', b'\x42broken')
+        self.assertEqual(self.cache.get('broken', 'default'), 'default')
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_benchmark_keeps_cache(self):
+        """Замеры идут на записях singleflight в отдельном кеше."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+        cache.set('cache-tag:feed', 1.0)
+        out = StringIO()
+        call_command('benchmark_codecs', '--repeat', '1', stdout=out)
+        self.assertIn('template.cache.index_page', out.getvalue())
+        self.assertEqual(cache.get('cache-tag:feed'), 1.0)
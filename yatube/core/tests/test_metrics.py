@@ -0,0 +1,151 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+User = get_user_model()
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.guest_client = Client()
+
+    def value(self, name, **labels):
+        key = metrics.registry.key(name, labels)
+        return metrics.registry.snapshot().get(key)
+
+    def test_request_recorded_by_view_name(self):
+        """Запрос записывается под именем маршрута со всеми замерами."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.guest_client.get(url)
+        self.assertEqual(
+            self.value(
+                'requests_total', view='posts:index', method='GET',
+                status=200
+            ),
+            [2]
+        )
+        self.assertEqual(
+            self.value('request_duration_seconds', view='posts:index')[-1], 2
+        )
+        self.assertGreater(
+            self.value('db_queries_total', view='posts:index')[0], 0
+        )
+        self.assertGreater(
+            self.value('template_render_seconds_total', view='posts:index')[0],
+            0
+        )
+        # Вторая страница взята из кеша фрагментов
+        self.assertEqual(
+            self.value(
+                'cache_requests_total', view='posts:index', result='hit'
+            ),
+            [1]
+        )
+        sizes = self.value('response_size_bytes', view='posts:index')
+        self.assertGreater(sizes[-2], 0)
+
+    def test_exposition(self):
+        """Корзины гистограмм накопленные, кавычки в метках экранированы."""
+        metrics.registry.observe(
+            'request_duration_seconds', {'view': 'a"b'}, 0.02
+        )
+        metrics.registry.observe(
+            'request_duration_seconds', {'view': 'a"b'}, 100
+        )
+        text = metrics.exposition(metrics.registry.snapshot())
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram', text
+        )
+        name = 'yatube_request_duration_seconds'
+        for line in (
+            f'{name}_bucket{{le="0.01",view="a\\"b"}} 0',
+            f'{name}_bucket{{le="0.025",view="a\\"b"}} 1',
+            f'{name}_bucket{{le="+Inf",view="a\\"b"}} 2',
+            f'{name}_count{{view="a\\"b"}} 2',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text.splitlines())
+
+    def test_processes_aggregated(self):
+        """Страница метрик складывает файлы всех процессов."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        key = metrics.registry.key('db_queries_total', {'view': 'x'})
+        with open(os.path.join(directory, '1.json'), 'w') as other:
+            json.dump({key: [5]}, other)
+        metrics.registry.inc('db_queries_total', {'view': 'x'}, 2)
+        with override_settings(METRICS_DIR=directory, METRICS_TOKEN='secret'):
+            self.assertEqual(metrics.collect()[key], [7])
+            response = self.guest_client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+            )
+        self.assertIn(
+            'yatube_db_queries_total{view="x"} 7', response.content.decode()
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_is_internal(self):
+        """Метрики видны сборщику с токеном и персоналу, но не по адресу."""
+        url = reverse('metrics')
+        local = Client(REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(local.get(url).status_code, 404)
+        for header in ('Bearer wrong', 'Basic secret'):
+            with self.subTest(header=header):
+                self.assertEqual(
+                    local.get(url, HTTP_AUTHORIZATION=header).status_code,
+                    404
+                )
+        response = local.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(
+                local.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 404
+            )
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        local.force_login(staff)
+        self.assertEqual(local.get(url).status_code, 200)
+
+    def test_concurrent_flush(self):
+        """Потоки, сбрасывающие реестр разом, не мешают друг другу."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        metrics.registry.inc('db_queries_total', {'view': 'x'}, 3)
+        errors = []
+
+        def flush():
+            try:
+                for _ in range(20):
+                    metrics.registry.flush(force=True)
+            except Exception as error:
+                errors.append(error)
+
+        with override_settings(METRICS_DIR=directory):
+            threads = [threading.Thread(target=flush) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(directory), [f'{os.getpid()}.json'])
+
+    def test_flush_error_does_not_break_response(self):
+        """Сбой записи метрик не превращает ответ в ошибку."""
+        with mock.patch.object(
+            metrics.registry, 'flush', side_effect=OSError('диск занят')
+        ), self.assertLogs('core.middleware', 'ERROR'):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
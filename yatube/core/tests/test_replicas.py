@@ -0,0 +1,104 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import router
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import replicas
+from posts import caching
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+@replicas.read_replica
+def routed_view(request):
+    """Отвечает именем базы, с которой читались бы посты."""
+    return HttpResponse(Post.objects.all().db)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def route(self, method='get', session=None):
+        request = getattr(self.factory, method)('/')
+        request.session = session or SessionStore()
+        return routed_view(request).content.decode()
+
+    def test_read_only_views_use_replica(self):
+        """GET читает с реплики, POST и код вне view - из основной базы."""
+        self.assertEqual(self.route(), 'replica1')
+        self.assertEqual(self.route('post'), 'default')
+        self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_write_pins_session_to_primary(self):
+        """После записи сессия читает из основной базы, пока не истечёт."""
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        session = self.authorized_client.session
+        self.assertGreater(
+            session[replicas.STICKY_SESSION_KEY], time.time()
+        )
+        self.assertEqual(self.route(session=session), 'default')
+        session[replicas.STICKY_SESSION_KEY] = time.time() - 1
+        self.assertEqual(self.route(session=session), 'replica1')
+
+    def test_reads_after_write_use_primary(self):
+        """Запись посреди запроса переводит его чтения на основную базу."""
+        replicas.start_request()
+        try:
+            with replicas.use_replica():
+                self.assertEqual(Post.objects.all().db, 'replica1')
+                Post.objects.create(author=self.user, text='Пост')
+                self.assertEqual(Post.objects.all().db, 'default')
+        finally:
+            self.assertTrue(replicas.finish_request())
+
+    def post_query_aliases(self, url):
+        """Базы, из которых view читал бы посты по адресу ``url``."""
+        aliases = []
+        db_for_read = replicas.ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            if model is Post:
+                aliases.append(db_for_read(router, model, **hints))
+            # В тестах реплики нет: запрос выполняет основная база
+            return None
+
+        with mock.patch.object(replicas.ReplicaRouter, 'db_for_read', spy):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return {alias or 'default' for alias in aliases}
+
+    def test_recently_changed_page_read_from_primary(self):
+        """Страница с недавно сброшенным тегом целиком читается из
+        основной базы, остальные - с реплики."""
+        group = Group.objects.create(title='Кошки', slug='cats')
+        Post.objects.create(author=self.user, group=group, text='Мяу')
+        url = reverse('posts:group_list', args=[group.slug])
+        tag_key = caching.TAG_KEY_PREFIX + caching.group_tag(group.pk)
+
+        cache.set(tag_key, time.time() - 60)
+        self.assertEqual(self.post_query_aliases(url), {'replica1'})
+        caching.invalidate(caching.group_tag(group.pk))
+        self.assertEqual(self.post_query_aliases(url), {'default'})
+
+    def test_migrations_skip_replicas(self):
+        """Миграции не применяются к репликам."""
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
@@ -0,0 +1,108 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import singleflight
+from posts import caching
+
+
+def page_key(request):
+    return request.GET.get('key')
+
+
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='value', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_concurrent_misses_render_once(self):
+        """Одновременные промахи по фрагменту строят его один раз."""
+        results = []
+        render = self.compute('html', delay=0.2)
+
+        def request():
+            results.append(caching.get_or_render(
+                'hot', ['feed'], [], 20, render
+            ))
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['html'] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_while_recomputing(self):
+        """Пока другой запрос пересчитывает, отдаётся прежнее значение."""
+        cache.set('key', ('old', time.time() - 1, 0.1), 60)
+        cache.add('key' + singleflight.LOCK_SUFFIX, True)
+        self.assertEqual(
+            singleflight.fetch('key', self.compute(), 20), ('old', False)
+        )
+        self.assertEqual(self.calls, 0)
+        cache.delete('key' + singleflight.LOCK_SUFFIX)
+        self.assertEqual(
+            singleflight.fetch('key', self.compute(), 20), ('value', True)
+        )
+        self.assertEqual(cache.get('key')[0], 'value')
+
+    def test_early_refresh(self):
+        """Значение пересчитывается до срока с вероятностью по XFetch."""
+        # Срок через 5 с, прошлое вычисление заняло 1 с
+        cache.set('key', ('old', time.time() + 5, 1.0), 60)
+        with mock.patch.object(singleflight.random, 'random') as random:
+            # -ln(1 - 0.5) = 0.69 с раньше срока: рано
+            random.return_value = 0.5
+            self.assertEqual(
+                singleflight.fetch('key', self.compute(), 20), ('old', False)
+            )
+            # -ln(1 - 0.999) = 6.9 с раньше срока: пора
+            random.return_value = 0.999
+            self.assertEqual(
+                singleflight.fetch('key', self.compute(), 20),
+                ('value', True)
+            )
+
+    @override_settings(SINGLE_FLIGHT_WAIT=0.05)
+    def test_waiter_gives_up(self):
+        """Не дождавшись чужого вычисления, запрос считает сам."""
+        cache.add('key' + singleflight.LOCK_SUFFIX, True)
+        started = time.monotonic()
+        self.assertEqual(
+            singleflight.fetch('key', self.compute(), 20), ('value', True)
+        )
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_page_decorator(self):
+        """Общий ответ строится один раз, ответ с CSRF-токеном - каждый раз."""
+        @singleflight.single_flight_page(20, page_key)
+        def view(request):
+            self.calls += 1
+            if request.GET.get('csrf'):
+                get_token(request)
+            return HttpResponse(f'page {self.calls}')
+
+        factory = RequestFactory()
+        for query, content, calls in (
+            ({'key': 'shared'}, b'page 1', 1),
+            ({'key': 'shared'}, b'page 1', 1),
+            ({}, b'page 2', 2),
+            ({'key': 'private', 'csrf': 1}, b'page 3', 3),
+            ({'key': 'private', 'csrf': 1}, b'page 4', 4),
+        ):
+            with self.subTest(query=query):
+                response = view(factory.get('/', query))
+                self.assertEqual(response.content, content)
+                self.assertEqual(self.calls, calls)
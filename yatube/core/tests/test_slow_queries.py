@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import slow_queries
+from posts.models import Post
+
+User = get_user_model()
+TEMP_LOG_DIR = tempfile.mkdtemp()
+TEMP_LOG = os.path.join(TEMP_LOG_DIR, 'slow.log')
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=TEMP_LOG)
+class SlowQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        slow_queries._planned.clear()
+        if os.path.exists(TEMP_LOG):
+            open(TEMP_LOG, 'w').close()
+
+    def entries(self):
+        with open(TEMP_LOG, encoding='utf-8') as log:
+            return [json.loads(line) for line in log]
+
+    def test_request_queries_logged(self):
+        """Запрос страницы пишется с view, местом в коде и планом."""
+        Client().get(reverse('posts:profile', args=(self.user.username,)))
+        entries = [
+            entry for entry in self.entries()
+            if entry['view'] == 'posts:profile'
+            and 'posts_post' in entry['sql']
+        ]
+        self.assertTrue(entries)
+        entry = entries[0]
+        self.assertEqual(entry['database'], 'default')
+        self.assertIsNotNone(entry['origin'])
+        self.assertIsInstance(entry['params'], list)
+        self.assertTrue(entry['plan'])
+
+    def test_plan_captured_once_per_fingerprint(self):
+        """План снимается один раз для запросов с общим отпечатком."""
+        Post.objects.filter(pk=1).exists()
+        Post.objects.filter(pk=2).exists()
+        entries = [
+            entry for entry in self.entries()
+            if entry['normalized'].startswith('SELECT (?) AS "a"')
+        ]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(
+            entries[0]['fingerprint'], entries[1]['fingerprint']
+        )
+        self.assertIn('plan', entries[0])
+        self.assertNotIn('plan', entries[1])
+
+    def test_normalize(self):
+        """Литералы и списки IN сворачиваются в одинаковый текст."""
+        self.assertEqual(
+            slow_queries.normalize(
+                "SELECT * FROM t WHERE a IN (%s, %s, %s) AND b = 'x''y'"
+                " AND c = 42"
+            ),
+            slow_queries.normalize(
+                'SELECT *  FROM t WHERE a IN (%s) AND b = %s AND c = 7'
+            ),
+        )
+
+    def test_wrapper_outlives_metrics_wrapper(self):
+        """Обёртка журнала остаётся на подключении после запроса страницы."""
+        Client().get(reverse('posts:index'))
+        self.assertEqual(
+            connection.execute_wrappers, [slow_queries.execute_wrapper]
+        )
+
+    def test_summary_command(self):
+        """Команда сводит записи по отпечаткам и печатает план."""
+        Post.objects.filter(pk=1).exists()
+        Post.objects.filter(pk=2).exists()
+        out = StringIO()
+        call_command('slow_queries', '--sort', 'count', stdout=out)
+        output = out.getvalue()
+        self.assertIn('2 раз', output)
+        self.assertIn('SELECT (?) AS "a"', output)
+        self.assertIn('план:', output)
@@ -1,4 +1,14 @@
-from django.shortcuts import render
+import hmac
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect, render
+
+from . import metrics as core_metrics
+from .cache import memory_cache_stats
 
 
 def page_not_found(request, exception):
@@ -19,3 +29,51 @@ def permission_denied(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def has_metrics_token(request):
+    """Передан ли заголовок ``Authorization: Bearer <METRICS_TOKEN>``."""
+    token = settings.METRICS_TOKEN
+    if not token:
+        return False
+    scheme, _, value = request.META.get('HTTP_AUTHORIZATION', '').partition(
+        ' '
+    )
+    return scheme.lower() == 'bearer' and hmac.compare_digest(
+        value.strip().encode(), token.encode()
+    )
+
+
+def metrics(request):
+    """Метрики в формате Prometheus для сборщика с токеном и персонала."""
+    # REMOTE_ADDR за прокси у всех клиентов один, доступ по адресу
+    # открыл бы страницу всем
+    if not (has_metrics_token(request) or request.user.is_staff):
+        raise Http404
+    return HttpResponse(
+        core_metrics.exposition(core_metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def cache_stats(request):
+    """Статистика кешей в памяти процесса для админки; POST сбрасывает её."""
+    stats = memory_cache_stats()
+    if request.method == 'POST':
+        for alias in stats:
+            caches[alias].reset_stats()
+        return redirect('cache_stats')
+    for cache_stats in stats.values():
+        cache_stats['fill'] = cache_stats['bytes'] / cache_stats['max_bytes']
+        # Самые тяжёлые префиксы - первыми: по ним и подбирается бюджет
+        cache_stats['prefixes'] = sorted(
+            cache_stats['prefixes'].items(),
+            key=lambda item: (-item[1]['bytes'], item[0]),
+        )
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Статистика кешей',
+        'caches': stats,
+    }
+    return render(request, 'core/cache_stats.html', context)
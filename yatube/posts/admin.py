@@ -1,8 +1,24 @@
 from django.contrib import admin
 
+from . import search
+from .export import FORMATS, streaming_response
 from .models import Group, Post, Follow, Comment
 
 
+def export_actions(kind):
+    """Действия админки, выгружающие выбранные строки в каждом формате.
+
+    Выборка приходит уже с фильтрами списка, так что они остаются в SQL.
+    """
+    def make_action(fmt):
+        def action(modeladmin, request, queryset):
+            return streaming_response(kind, queryset, fmt)
+        action.__name__ = f'export_{fmt}'
+        action.short_description = f'Выгрузить выбранные в {fmt.upper()}'
+        return action
+    return [make_action(fmt) for fmt in FORMATS]
+
+
 class PostAdmin(admin.ModelAdmin):
     # Перечисляем поля, которые должны отображаться в админке
     list_display = (
@@ -20,6 +36,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     # Это свойство сработает для всех колонок: где пусто — будет эта строка
     empty_value_display = '-пусто-'
+    actions = export_actions('posts')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идёт по полнотекстовому индексу, а не через LIKE '%...%'
+        return search.filter_queryset(queryset, search_term), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -42,6 +63,7 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('author',)
     empty_value_display = '-пусто-'
+    actions = export_actions('comments')
 
 
 class FollowAdmin(admin.ModelAdmin):
@@ -52,6 +74,7 @@ class FollowAdmin(admin.ModelAdmin):
     search_fields = ('user',)
     search_fields = ('author',)
     empty_value_display = '-пусто-'
+    actions = export_actions('follows')
 
 
 # При регистрации модели Post источником конфигурации для неё назначаем
@@ -0,0 +1,132 @@
+"""Кеш фрагментов с тегами и сбросом при записи.
+
+Каждый закешированный фрагмент помечается тегами: общая лента
+(``feed``), сообщество (``group:<id>``), автор (``author:<id>``), пост
+(``post:<id>``), подписки пользователя (``follow:<id>``). У каждого тега
+в кеше хранится версия - метка времени последнего изменения. Версии
+входят в ключ фрагмента, поэтому сброс тега делает недоступными все
+фрагменты с ним, и время жизни записей можно держать большим. Те же
+версии служат валидаторами условного GET.
+
+Страницу, тег которой сброшен недавно, view читает из основной базы
+(``recently_changed``): с отстающей реплики под новой версией тега
+закешировались бы старые данные.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+from core import metrics, singleflight
+
+TAG_KEY_PREFIX = 'cache-tag:'
+FEED_TAG = 'feed'
+
+
+def group_tag(group_id):
+    return f'group:{group_id}'
+
+
+def author_tag(author_id):
+    return f'author:{author_id}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def follow_tag(user_id):
+    return f'follow:{user_id}'
+
+
+def posts_changed_tag(tag):
+    """Тег, который сбрасывается только записью постов в области ``tag``.
+
+    Обычные теги ленты, автора и сообщества сбрасываются и счётчиками
+    комментариев; ленты RSS/Atom от них не зависят.
+    """
+    return f'{tag}:posts'
+
+
+def _tag_key(tag):
+    return TAG_KEY_PREFIX + tag
+
+
+def tag_versions(tags):
+    """Версии тегов в порядке ``tags``; отсутствующие создаются."""
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Вытесненный тег получает новую версию: старые фрагменты
+            # с ним становятся недоступны, устаревшие данные не отдаются
+            cache.add(key, time.time(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(tags):
+    now = time.time()
+    cache.set_many({_tag_key(tag): now for tag in tags}, None)
+
+
+def recently_changed(tags):
+    """True, если тег сброшен позже, чем реплики могли его догнать."""
+    recent = time.time() - settings.REPLICA_STICKY_SECONDS
+    return max(tag_versions(tags), default=0) > recent
+
+
+def invalidate(*tags):
+    """Сбрасывает все фрагменты, помеченные любым из ``tags``.
+
+    Теги сбрасываются сразу и ещё раз после фиксации транзакции: иначе
+    параллельный запрос мог бы закешировать данные до фиксации под уже
+    новой версией тега.
+    """
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return
+    _bump(tags)
+    transaction.on_commit(lambda: _bump(tags))
+
+
+def fragment_key(fragment_name, tags, vary_on=(), versions=None):
+    # Имена тегов входят в ключ наравне с версиями: версии разных тегов
+    # могут совпасть
+    if versions is None:
+        versions = tag_versions(tags)
+    return make_template_fragment_key(
+        fragment_name, [*vary_on, *tags, *versions]
+    )
+
+
+def get_or_render(fragment_name, tags, vary_on, timeout, render):
+    """Возвращает фрагмент из кеша или строит его функцией ``render``.
+
+    Одновременные промахи по фрагменту строят его один раз (см.
+    ``core.singleflight``).
+    """
+    versions = tag_versions(tags)
+    key = fragment_key(fragment_name, tags, vary_on, versions)
+
+    value, computed = singleflight.fetch(key, render, timeout)
+    if computed:
+        metrics.cache_miss()
+    else:
+        metrics.cache_hit()
+    return value
+
+
+def etag(tags, *extra):
+    """ETag страницы по версиям её тегов и прочим различиям ответа."""
+    raw = '|'.join(map(str, [*tags, *tag_versions(tags), *extra]))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def last_modified(tags):
+    """Время последнего изменения любого из тегов."""
+    return datetime.fromtimestamp(max(tag_versions(tags)), tz=timezone.utc)
@@ -0,0 +1,123 @@
+"""Условный GET для публичных страниц.
+
+ETag и Last-Modified страницы считаются по версиям её тегов кеша
+(см. ``posts.caching``), которые обновляются при каждой записи. Проверка
+стоит одного чтения из кеша и, для страниц сообщества, профиля и поста,
+загрузки самого объекта, которую view потом не повторяет. Ответ 304
+отдаётся до выборки постов и рендеринга шаблона.
+"""
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from . import caching
+from .models import Group, Post
+
+User = get_user_model()
+
+
+def page_tags(request, tags_func, *args, **kwargs):
+    """Теги страницы; считаются один раз за запрос."""
+    if not hasattr(request, '_page_tags'):
+        request._page_tags = tags_func(request, *args, **kwargs)
+    return request._page_tags
+
+
+def page_validators(tags_func, per_user=True):
+    """Декоратор view: условный GET по тегам из ``tags_func``.
+
+    ``tags_func`` получает аргументы view и возвращает теги страницы
+    или None, если объекта нет: тогда проверка пропускается и view
+    отвечает как обычно. ``per_user=False`` - для ответов, одинаковых
+    для всех пользователей.
+    """
+    def etag(request, *args, **kwargs):
+        tags = page_tags(request, tags_func, *args, **kwargs)
+        if tags is None:
+            return None
+        if not per_user:
+            return caching.etag(tags)
+        # Шапка и кнопки зависят от пользователя: у каждого свой ETag
+        return caching.etag(tags, request.user.pk or 'anonymous')
+
+    def last_modified(request, *args, **kwargs):
+        tags = page_tags(request, tags_func, *args, **kwargs)
+        if tags is None:
+            return None
+        return caching.last_modified(tags)
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view)
+        if per_user:
+            conditional_view = vary_on_cookie(conditional_view)
+        return wraps(view)(conditional_view)
+    return decorator
+
+
+def primary_if_changed(tags_func):
+    """Условие ``read_replica``: недавно изменённая страница читается из
+    основной базы.
+
+    Решение принимается до выборки постов, поэтому и строки страницы,
+    и ETag с Last-Modified соответствуют новой версии тегов.
+    """
+    def primary_if(request, *args, **kwargs):
+        tags = page_tags(request, tags_func, *args, **kwargs)
+        if tags is None or not caching.recently_changed(tags):
+            return False
+        # Объект страницы прочитан с реплики: view загрузит его заново
+        del request._page_tags
+        request._page_object = None
+        return True
+    return primary_if
+
+
+def page_object(request, queryset, **lookup):
+    """Объект страницы, загруженный при проверке условного GET, или 404."""
+    obj = getattr(request, '_page_object', None)
+    if obj is None:
+        obj = get_object_or_404(queryset, **lookup)
+    return obj
+
+
+def load_page_object(request, queryset, **lookup):
+    """Загружает объект страницы для view; None, если его нет."""
+    request._page_object = queryset.filter(**lookup).first()
+    return request._page_object
+
+
+# Выборки совпадают с выборками view: объект загружается один раз
+GROUPS = Group.objects.all()
+PROFILES = User.objects.select_related('stats')
+POSTS = Post.objects.select_related('author__stats', 'group')
+
+
+def index_tags(request):
+    return [caching.FEED_TAG]
+
+
+def group_tags(request, slug):
+    group = load_page_object(request, GROUPS, slug=slug)
+    if group is None:
+        return None
+    return [caching.group_tag(group.pk)]
+
+
+def profile_tags(request, username):
+    author = load_page_object(request, PROFILES, username=username)
+    if author is None:
+        return None
+    return [caching.author_tag(author.pk), caching.follow_tag(author.pk)]
+
+
+def post_tags(request, post_id):
+    post = load_page_object(request, POSTS, pk=post_id)
+    if post is None:
+        return None
+    # На странице поста виден и счётчик постов автора
+    return [caching.post_tag(post.pk), caching.author_tag(post.author_id)]
@@ -0,0 +1,156 @@
+"""Потоковая выгрузка постов, комментариев и подписок в NDJSON и CSV.
+
+Строки читаются из базы пачками через ``QuerySet.iterator`` (на
+PostgreSQL - серверным курсором) кортежами ``values_list()`` и сразу
+превращаются в текст, так что память не зависит от размера выгрузки.
+Фильтры по датам, автору и сообществу становятся условиями WHERE.
+"""
+import csv
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .models import Comment, Follow, Post
+
+CHUNK_SIZE = 2000
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class Export:
+    """Описание выгрузки одной модели.
+
+    ``columns`` - пары «имя колонки - поле для values()»; ``date``,
+    ``author`` и ``group`` - поля, по которым фильтруется выборка,
+    None - фильтр для этой модели не поддерживается.
+    """
+
+    def __init__(self, model, columns, date=None, author=None, group=None):
+        self.model = model
+        self.columns = columns
+        self.date = date
+        self.author = author
+        self.group = group
+
+    @property
+    def header(self):
+        return [name for name, lookup in self.columns]
+
+    def filter(self, queryset, since=None, until=None, author=None,
+               group=None):
+        """Накладывает фильтры; неподдерживаемый фильтр - ValueError."""
+        conditions = {}
+        for value, field, lookup, label in (
+            (since, self.date, 'gte', 'дате'),
+            (until, self.date, 'lt', 'дате'),
+            (author, self.author, 'username', 'автору'),
+            (group, self.group, 'slug', 'сообществу'),
+        ):
+            if value is None:
+                continue
+            if field is None:
+                raise ValueError(
+                    f'Выгрузку {self.model._meta.label_lower} нельзя '
+                    f'фильтровать по {label}.'
+                )
+            conditions[f'{field}__{lookup}'] = value
+        return queryset.filter(**conditions)
+
+    def rows(self, queryset):
+        """Словари строк выборки, прочитанные из базы пачками."""
+        lookups = [lookup for name, lookup in self.columns]
+        values = queryset.order_by('pk').values_list(*lookups)
+        for row in values.iterator(chunk_size=CHUNK_SIZE):
+            yield dict(zip(self.header, row))
+
+    def lines(self, queryset, fmt):
+        """Строки выгрузки в формате ``fmt`` одна за другой."""
+        if fmt == 'ndjson':
+            return ndjson_lines(self.rows(queryset))
+        if fmt == 'csv':
+            return csv_lines(self.header, self.rows(queryset))
+        raise ValueError(f'Неизвестный формат {fmt}.')
+
+
+EXPORTS = {
+    'posts': Export(
+        Post,
+        [
+            ('id', 'pk'),
+            ('text', 'text'),
+            ('pub_date', 'pub_date'),
+            ('author', 'author__username'),
+            ('group', 'group__slug'),
+            ('image', 'image'),
+            ('comments_count', 'comments_count'),
+        ],
+        date='pub_date',
+        author='author',
+        group='group',
+    ),
+    'comments': Export(
+        Comment,
+        [
+            ('id', 'pk'),
+            ('post', 'post_id'),
+            ('author', 'author__username'),
+            ('text', 'text'),
+            ('created', 'created'),
+        ],
+        date='created',
+        author='author',
+        group='post__group',
+    ),
+    'follows': Export(
+        Follow,
+        [
+            ('id', 'pk'),
+            ('user', 'user__username'),
+            ('author', 'author__username'),
+        ],
+        author='author',
+    ),
+}
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        line = json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False)
+        yield f'{line}\n'
+
+
+class Echo:
+    """Файл для csv.writer, который не пишет, а возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([csv_value(value) for value in row.values()])
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        # Как в NDJSON: ISO 8601, UTC с суффиксом Z
+        return DjangoJSONEncoder().default(value)
+    return value
+
+
+def streaming_response(kind, queryset, fmt):
+    """Ответ, который отдаёт выгрузку по мере чтения из базы."""
+    response = StreamingHttpResponse(
+        EXPORTS[kind].lines(queryset, fmt), content_type=CONTENT_TYPES[fmt]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
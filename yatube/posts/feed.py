@@ -0,0 +1,265 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается по лентам подписчиков в момент публикации
+(fan-out on write). Посты «звёзд» - авторов, у которых подписчиков больше
+``settings.FEED_FANOUT_FOLLOWERS_LIMIT``, - не раскладываются, а
+подмешиваются в ленту при чтении.
+
+Прямо в запросе пост раскладывается, только если подписчиков не больше
+``FEED_SYNC_FANOUT_LIMIT``; раскладка для авторов с большим числом
+подписчиков и перенос постов бывшей «звезды» в ленты идут в пуле из
+``FEED_WORKERS`` потоков после фиксации транзакции.
+"""
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+
+from .models import FeedItem, Follow, Post, UserStats
+from .stats import followers_count
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def is_celebrity(author_id):
+    return (
+        followers_count(author_id) > settings.FEED_FANOUT_FOLLOWERS_LIMIT
+    )
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_WORKERS, thread_name_prefix='feed',
+        )
+    return _executor
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Не удалось обновить ленты подписок')
+    finally:
+        # Поток пула держит своё подключение к базе
+        close_old_connections()
+
+
+def defer(func, *args):
+    """Выполняет ``func(*args)`` в пуле после фиксации транзакции.
+
+    При ``FEED_WORKERS = 0`` - сразу после фиксации в текущем потоке.
+    """
+    if not settings.FEED_WORKERS:
+        transaction.on_commit(lambda: func(*args))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, func, *args))
+
+
+def _insert_from_follows(conditions, params):
+    """Записи ленты для пар «подписка - пост автора» одним INSERT ... SELECT.
+
+    ``conditions`` - условия на подписку ``f`` и пост ``p``; посты «звёзд»
+    отбрасываются всегда. Строки создаются в базе, без объектов модели.
+    """
+    def table(model):
+        return connection.ops.quote_name(model._meta.db_table)
+
+    def column(alias, model, name):
+        field = model._meta.get_field(name)
+        return f'{alias}.{connection.ops.quote_name(field.column)}'
+
+    where = ' AND '.join([
+        *(condition.format(
+            follow_user=column('f', Follow, 'user'),
+            follow_author=column('f', Follow, 'author'),
+            post_id=column('p', Post, 'id'),
+        ) for condition in conditions),
+        f'NOT EXISTS (SELECT 1 FROM {table(UserStats)} s '
+        f'WHERE {column("s", UserStats, "user")} = '
+        f'{column("f", Follow, "author")} '
+        f'AND {column("s", UserStats, "followers_count")} > %s)',
+    ])
+    insert = connection.ops.insert_statement(ignore_conflicts=True)
+    suffix = connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    feed_columns = ', '.join(
+        connection.ops.quote_name(FeedItem._meta.get_field(name).column)
+        for name in ('user', 'post', 'author', 'pub_date')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {table(FeedItem)} ({feed_columns}) '
+            f'SELECT {column("f", Follow, "user")}, '
+            f'{column("p", Post, "id")}, {column("p", Post, "author")}, '
+            f'{column("p", Post, "pub_date")} '
+            f'FROM {table(Follow)} f JOIN {table(Post)} p '
+            f'ON {column("p", Post, "author")} = '
+            f'{column("f", Follow, "author")} '
+            f'WHERE {where} {suffix}',
+            [*params, settings.FEED_FANOUT_FOLLOWERS_LIMIT],
+        )
+
+
+def _fan_out(post_id):
+    # Пост, удалённый до отложенной раскладки, просто не найдётся
+    _insert_from_follows(['{post_id} = %s'], [post_id])
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    followers = followers_count(post.author_id)
+    if followers > settings.FEED_FANOUT_FOLLOWERS_LIMIT:
+        return
+    if followers > settings.FEED_SYNC_FANOUT_LIMIT:
+        defer(_fan_out, post.pk)
+    else:
+        _fan_out(post.pk)
+
+
+def add_author(user_id, author_id):
+    """Переносит посты автора в ленту нового подписчика."""
+    backfill(user_id=user_id, author_id=author_id)
+
+
+def remove_author(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+    # Автор только что перестал быть «звездой»: его посты больше не
+    # подмешиваются при чтении, их нужно разложить по лентам всех
+    # подписчиков - это долго, поэтому в фоне
+    if followers_count(author_id) == settings.FEED_FANOUT_FOLLOWERS_LIMIT:
+        defer(_backfill_author, author_id)
+
+
+def _backfill_author(author_id):
+    backfill(author_id=author_id)
+
+
+def backfill(user_id=None, author_id=None):
+    """Заново строит ленты по таблице подписок; возвращает число подписок.
+
+    Разбор подписок по одной стоил бы запроса на каждую и объекта модели
+    на каждую запись ленты; после массовой загрузки это часы. Счётчики
+    подписчиков в ``UserStats`` должны быть уже пересчитаны.
+    """
+    follows = Follow.objects.all()
+    conditions, params = [], []
+    if user_id is not None:
+        follows = follows.filter(user_id=user_id)
+        conditions.append('{follow_user} = %s')
+        params.append(user_id)
+    if author_id is not None:
+        follows = follows.filter(author_id=author_id)
+        conditions.append('{follow_author} = %s')
+        params.append(author_id)
+    _insert_from_follows(conditions, params)
+    return follows.count()
+
+
+def celebrities_followed_by(user):
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gt=(
+                settings.FEED_FANOUT_FOLLOWERS_LIMIT
+            ),
+        ).values_list('author_id', flat=True)
+    )
+
+
+class MergedFeed:
+    """Слияние нескольких выборок постов для ``KeysetPaginator``.
+
+    Поддерживает ровно те операции, что нужны пагинатору и API:
+    ``filter``, ``order_by``, ``values`` и срез. Каждая выборка читается
+    не дальше конца среза, результаты сливаются в Python без повторов.
+    """
+
+    def __init__(self, *querysets, ordering=()):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(
+            *(qs.filter(*args, **kwargs) for qs in self.querysets),
+            ordering=self.ordering,
+        )
+
+    def values(self, *fields):
+        return MergedFeed(
+            *(qs.values(*fields) for qs in self.querysets),
+            ordering=self.ordering,
+        )
+
+    def order_by(self, *fields):
+        return MergedFeed(
+            *(qs.order_by(*fields) for qs in self.querysets),
+            ordering=fields,
+        )
+
+    def count(self):
+        """Верхняя оценка длины ленты: повторы не вычитаются."""
+        return sum(qs.count() for qs in self.querysets)
+
+    def _sort_key(self, post):
+        if isinstance(post, dict):
+            return tuple(post[field.lstrip('-')] for field in self.ordering)
+        return tuple(
+            getattr(post, field.lstrip('-')) for field in self.ordering
+        )
+
+    def _merged(self, stop):
+        """Первые ``stop`` постов слияния без повторов."""
+        reverse = bool(self.ordering) and self.ordering[0].startswith('-')
+        limit = stop
+        while True:
+            streams = [list(qs[:limit]) for qs in self.querysets]
+            exhausted = all(len(stream) < limit for stream in streams)
+            merged = heapq.merge(
+                *streams, key=self._sort_key, reverse=reverse
+            )
+            if not exhausted:
+                # Точны только первые limit постов слияния: дальше могут
+                # идти посты, не прочитанные из обрезанной выборки
+                merged = islice(merged, limit)
+            posts, seen = [], set()
+            for post in merged:
+                pk = post['id'] if isinstance(post, dict) else post.pk
+                if pk not in seen:
+                    seen.add(pk)
+                    posts.append(post)
+            if len(posts) >= stop or exhausted:
+                return posts[:stop]
+            # Повторы съели часть страницы: читаем выборки дальше
+            limit += stop - len(posts)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.stop is None:
+            raise TypeError('MergedFeed поддерживает только срезы с концом.')
+        return self._merged(item.stop)[item.start:item.stop]
+
+
+def follow_feed(user):
+    """Посты авторов, на которых подписан пользователь."""
+    # Дата берётся из записи ленты: так сортировка идёт по индексу
+    # (user, pub_date) таблицы ленты
+    related = Post.objects.select_related('author', 'group')
+    posts = related.filter(feed_items__user=user).annotate(
+        feed_date=F('feed_items__pub_date')
+    )
+    celebrities = celebrities_followed_by(user)
+    if not celebrities:
+        return posts
+    return MergedFeed(
+        posts,
+        related.filter(author__in=celebrities).annotate(
+            feed_date=F('pub_date')
+        ),
+    )
@@ -0,0 +1,410 @@
+"""Синтетические данные для замеров на объёмах продакшена.
+
+Распределения перекошены, как в живых соцсетях:
+
+- подписки и активность авторов подчиняются закону Ципфа: на немногих
+  подписано большинство, и немногие пишут большую часть постов и
+  комментариев, но это разные авторы - самые читаемые не самые
+  плодовитые (см. ``Popularity``);
+- число подписок и комментариев у пользователя и поста - с тяжёлым
+  хвостом (распределение Парето);
+- посты идут сериями: автор пишет несколько постов подряд с
+  интервалом в минуты, а между сериями проходят дни.
+
+Всё делится на пачки по ``CHUNK_SIZE`` объектов. Генератор случайных
+чисел каждой пачки заводится от общего зерна, вида данных и номера
+пачки, поэтому результат не зависит от числа процессов и повторяется
+от запуска к запуску. Строки строят дочерние процессы, а вставляет
+основной процесс через ``executemany``, минуя сигналы и создание
+объектов моделей; счётчики, ленты и поисковый индекс потом строятся
+один раз (см. ``posts.importer.rebuild_derived``).
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from io import BytesIO
+from itertools import accumulate
+from math import gcd
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CHUNK_SIZE = 10000
+# Крутизна распределения Ципфа: подписчики у авторов распределены
+# круче, чем посты и комментарии
+FOLLOW_EXPONENT = 1.1
+POSTING_EXPONENT = 0.8
+# Размер словарей имён, которые берутся из Faker
+POOL_SIZE = 500
+# Тексты - отрезки заранее перемешанного потока слов: выбирать каждое
+# слово отдельно в несколько раз дороже
+CORPUS_SIZE = 200000
+# Доля постов вне сообществ
+NO_GROUP_SHARE = 0.3
+POST_WORDS = (5, 120)
+SESSION_MEAN = 3
+SESSION_GAP = 10 * 60
+COMMENT_DELAY = 3 * 60 * 60
+PASSWORD = 'yatube'
+# Даты считаются в UTC без часового пояса: так их ждут адаптеры СУБД
+DEFAULT_END = datetime(2023, 1, 1)
+IMAGE_SIZE = (960, 540)
+
+USER_COLUMNS = (
+    'id', 'username', 'password', 'first_name', 'last_name', 'email',
+    'is_staff', 'is_active', 'is_superuser', 'date_joined',
+)
+GROUP_COLUMNS = ('id', 'title', 'slug', 'description')
+FOLLOW_COLUMNS = ('user_id', 'author_id')
+POST_COLUMNS = (
+    'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+    'comments_count',
+)
+COMMENT_COLUMNS = ('post_id', 'author_id', 'text', 'created')
+
+
+class Plan:
+    """Что и сколько генерировать; передаётся в дочерние процессы."""
+
+    def __init__(self, seed=0, users=1000, groups=20, posts=10000,
+                 comments=2.0, follows=20.0, images=0.0, image_pool=50,
+                 days=365, end=DEFAULT_END):
+        self.seed = seed
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        # Среднее число комментариев на пост и подписок на пользователя
+        self.comments = comments
+        self.follows = follows
+        # Доля постов с картинкой и число разных картинок
+        self.images = images
+        self.image_pool = image_pool if images else 0
+        self.end = end
+        self.start = end - timedelta(days=days)
+        self.user_base = self.group_base = self.post_base = 0
+
+    def rng(self, kind, index=0):
+        return random.Random(f'{self.seed}:{kind}:{index}')
+
+    def chunks(self, total):
+        return range((total + CHUNK_SIZE - 1) // CHUNK_SIZE)
+
+    def bounds(self, total, index):
+        return index * CHUNK_SIZE, min((index + 1) * CHUNK_SIZE, total)
+
+    def image_name(self, index):
+        return f'posts/generated/{self.seed}-{index}.jpg'
+
+
+class Popularity:
+    """Выбор объектов по закону Ципфа.
+
+    Ранги раскладываются по первичным ключам умножением на число,
+    взаимно простое с числом объектов, чтобы популярные не шли подряд
+    с самыми старыми. Разные ``spread`` дают разные раскладки: самые
+    читаемые авторы не обязаны быть самыми плодовитыми, иначе лента
+    подписок растёт как произведение подписчиков на посты.
+    """
+
+    def __init__(self, size, base, exponent, spread=0.618):
+        self.size = size
+        self.base = base
+        self.cum_weights = zipf_weights(size, exponent)
+        step = int(size * spread) | 1
+        while gcd(step, size) != 1:
+            step += 2
+        self.step = step
+        self.ranks = range(size)
+
+    def pk(self, rank):
+        return self.base + 1 + rank * self.step % self.size
+
+    def choose(self, rng, k=1):
+        return [
+            self.pk(rank) for rank in
+            rng.choices(self.ranks, cum_weights=self.cum_weights, k=k)
+        ]
+
+
+@lru_cache(maxsize=4)
+def zipf_weights(size, exponent):
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+@lru_cache(maxsize=4)
+def pools(seed):
+    """Имена и слова из Faker: сам Faker слишком медленный на миллионах."""
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    return {
+        'first_names': [fake.first_name() for _ in range(POOL_SIZE)],
+        'last_names': [fake.last_name() for _ in range(POOL_SIZE)],
+        'user_names': [fake.user_name() for _ in range(POOL_SIZE)],
+        'words': list(dict.fromkeys(fake.words(nb=POOL_SIZE * 4))),
+    }
+
+
+@lru_cache(maxsize=4)
+def corpus(seed):
+    words = pools(seed)['words']
+    rng = random.Random(f'{seed}:corpus')
+    return rng.choices(words, k=CORPUS_SIZE)
+
+
+@lru_cache(maxsize=4)
+def password_hash(seed):
+    # Соль постоянная: хеш считается раз на процесс и не зависит от запуска
+    return make_password(PASSWORD, salt=f'generated{seed}')
+
+
+def db_datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def moment(rng, plan):
+    span = (plan.end - plan.start).total_seconds()
+    return plan.start + timedelta(seconds=rng.uniform(0, span))
+
+
+def heavy_tail(rng, mean):
+    """Целое с тяжёлым хвостом и средним около ``mean``."""
+    # Среднее распределения Парето с показателем 2 равно 2
+    return int(mean * rng.paretovariate(2) / 2 + rng.random())
+
+
+def sentence(rng, words, count):
+    start = rng.randrange(len(words) - count)
+    text = ' '.join(words[start:start + count])
+    return f'{text[:1].upper()}{text[1:]}.'
+
+
+def user_rows(plan, index):
+    rng = plan.rng('users', index)
+    names = pools(plan.seed)
+    password = password_hash(plan.seed)
+    first, last = plan.bounds(plan.users, index)
+    rows = []
+    for number in range(first, last):
+        pk = plan.user_base + number + 1
+        username = f'{rng.choice(names["user_names"])}{pk}'
+        rows.append((
+            pk, username, password,
+            rng.choice(names['first_names']),
+            rng.choice(names['last_names']),
+            f'{username}@example.com',
+            False, True, False,
+            db_datetime(moment(rng, plan)),
+        ))
+    return rows
+
+
+def group_rows(plan):
+    rng = plan.rng('groups')
+    words = corpus(plan.seed)
+    rows = []
+    for number in range(plan.groups):
+        pk = plan.group_base + number + 1
+        rows.append((
+            pk,
+            sentence(rng, words, rng.randint(1, 3))[:-1],
+            f'group-{pk}',
+            sentence(rng, words, rng.randint(5, 20)),
+        ))
+    return rows
+
+
+def follow_rows(plan, index):
+    """Подписки пользователей пачки.
+
+    Число подписок - с тяжёлым хвостом, авторы выбираются по популярности.
+    """
+    rng = plan.rng('follows', index)
+    authors = Popularity(plan.users, plan.user_base, FOLLOW_EXPONENT)
+    first, last = plan.bounds(plan.users, index)
+    rows = []
+    for number in range(first, last):
+        user_id = plan.user_base + number + 1
+        wanted = min(heavy_tail(rng, plan.follows), plan.users - 1)
+        chosen = set()
+        # Популярные авторы выпадают часто: выбираем с запасом
+        for _ in range(3):
+            if len(chosen) >= wanted:
+                break
+            chosen.update(authors.choose(rng, wanted - len(chosen)))
+            chosen.discard(user_id)
+        rows.extend((user_id, author_id) for author_id in sorted(chosen))
+    return rows
+
+
+def post_rows(plan, index):
+    """Посты пачки сериями и комментарии к ним."""
+    rng = plan.rng('posts', index)
+    words = corpus(plan.seed)
+    authors = Popularity(
+        plan.users, plan.user_base, POSTING_EXPONENT, spread=0.382
+    )
+    groups = plan.groups and Popularity(
+        plan.groups, plan.group_base, FOLLOW_EXPONENT
+    )
+    first, last = plan.bounds(plan.posts, index)
+    posts, comments = [], []
+    number = first
+    while number < last:
+        (author_id,) = authors.choose(rng)
+        group_id = None
+        if groups and rng.random() >= NO_GROUP_SHARE:
+            (group_id,) = groups.choose(rng)
+        pub_date = moment(rng, plan)
+        session = 1 + int(rng.expovariate(1 / SESSION_MEAN))
+        for _ in range(min(session, last - number)):
+            pk = plan.post_base + number + 1
+            count = heavy_tail(rng, plan.comments)
+            image = ''
+            if plan.image_pool and rng.random() < plan.images:
+                image = plan.image_name(rng.randrange(plan.image_pool))
+            posts.append((
+                pk,
+                sentence(rng, words, rng.randint(*POST_WORDS)),
+                db_datetime(pub_date),
+                author_id,
+                group_id,
+                image,
+                count,
+            ))
+            for commenter in authors.choose(rng, count):
+                created = min(plan.end, pub_date + timedelta(
+                    seconds=rng.expovariate(1 / COMMENT_DELAY)
+                ))
+                comments.append((
+                    pk, commenter,
+                    sentence(rng, words, rng.randint(2, 30)),
+                    db_datetime(created),
+                ))
+            # Серия, начатая у конца периода, не выходит за plan.end
+            pub_date = min(plan.end, pub_date + timedelta(
+                seconds=rng.expovariate(1 / SESSION_GAP)
+            ))
+            number += 1
+    return posts, comments
+
+
+def image_content(plan, index):
+    rng = plan.rng('images', index)
+    image = Image.new('RGB', IMAGE_SIZE, tuple(
+        rng.randrange(256) for _ in range(3)
+    ))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(3, 12)):
+        x, y = rng.randrange(IMAGE_SIZE[0]), rng.randrange(IMAGE_SIZE[1])
+        size = rng.randint(40, 300)
+        draw.ellipse(
+            (x, y, x + size, y + size),
+            fill=tuple(rng.randrange(256) for _ in range(3)),
+        )
+    content = BytesIO()
+    image.save(content, 'JPEG', quality=80)
+    return content.getvalue()
+
+
+def insert(model, columns, rows):
+    if not rows:
+        return
+    opts = model._meta
+    quote = connection.ops.quote_name
+    names = ', '.join(
+        quote(opts.get_field(column).column) for column in columns
+    )
+    placeholders = ', '.join(['%s'] * len(columns))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(opts.db_table)} ({names}) '
+            f'VALUES ({placeholders})',
+            rows,
+        )
+
+
+class Generator:
+    def __init__(self, plan, workers=0, report=None):
+        self.plan = plan
+        self.workers = workers
+        self.report = report or (lambda message: None)
+
+    def run(self):
+        """Генерирует данные по плану; возвращает число строк по моделям."""
+        plan = self.plan
+        # Новые строки идут после уже существующих
+        plan.user_base = self.max_pk(User)
+        plan.group_base = self.max_pk(Group)
+        plan.post_base = self.max_pk(Post)
+        self.make_images()
+        if self.workers > 1:
+            # Дочерние процессы не должны наследовать открытые подключения
+            connections.close_all()
+            with ProcessPoolExecutor(self.workers) as executor:
+                counts = self.generate(executor.map)
+        else:
+            counts = self.generate(map)
+        return counts
+
+    @staticmethod
+    def max_pk(model):
+        return model.objects.aggregate(pk=Max('pk'))['pk'] or 0
+
+    def make_images(self):
+        for index in range(self.plan.image_pool):
+            name = self.plan.image_name(index)
+            if not default_storage.exists(name):
+                default_storage.save(
+                    name, ContentFile(image_content(self.plan, index))
+                )
+
+    def generate(self, map_func):
+        plan = self.plan
+        counts = {'users': 0, 'groups': 0, 'follows': 0, 'posts': 0,
+                  'comments': 0}
+        chunks = plan.chunks(plan.users)
+        for rows in map_func(user_rows, [plan] * len(chunks), chunks):
+            with transaction.atomic():
+                insert(User, USER_COLUMNS, rows)
+            counts['users'] += len(rows)
+            self.progress(counts)
+        rows = group_rows(plan)
+        with transaction.atomic():
+            insert(Group, GROUP_COLUMNS, rows)
+        counts['groups'] += len(rows)
+        if plan.users > 1:
+            for rows in map_func(follow_rows, [plan] * len(chunks), chunks):
+                with transaction.atomic():
+                    insert(Follow, FOLLOW_COLUMNS, rows)
+                counts['follows'] += len(rows)
+                self.progress(counts)
+        if plan.users:
+            chunks = plan.chunks(plan.posts)
+            for posts, comments in map_func(
+                post_rows, [plan] * len(chunks), chunks
+            ):
+                with transaction.atomic():
+                    insert(Post, POST_COLUMNS, posts)
+                    insert(Comment, COMMENT_COLUMNS, comments)
+                counts['posts'] += len(posts)
+                counts['comments'] += len(comments)
+                self.progress(counts)
+        return counts
+
+    def progress(self, counts):
+        self.report(', '.join(
+            f'{name}: {count}' for name, count in counts.items() if count
+        ))
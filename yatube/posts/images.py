@@ -0,0 +1,165 @@
+"""Приём загружаемых картинок постов.
+
+Картинка проверяется по заголовку, без декодирования пикселей: слишком
+большие по числу точек (декомпрессионные бомбы) отклоняются сразу.
+Остальные уменьшаются до ``IMAGE_MAX_EDGE`` по длинной стороне,
+поворачиваются по EXIF и сохраняются без метаданных прогрессивным JPEG
+(или WebP, если он задан и поддерживается Pillow).
+
+Исходник декодируется целиком, поэтому память на одну загрузку
+ограничена ``IMAGE_MAX_DECODED_BYTES``: картинки, которые займут в
+памяти больше, отклоняются до декодирования. JPEG декодируется сразу
+уменьшенным в 2-8 раз, так что для него допустимы исходники крупнее, чем
+для PNG и WebP. Поворот делается после уменьшения, на картинке размером
+с результат.
+
+GIF остаётся GIF, чтобы не потерять анимацию: если он больше
+``IMAGE_MAX_EDGE``, кадры уменьшаются по одному, иначе файл сохраняется
+как есть. Поворота по EXIF у GIF не бывает.
+"""
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps, ImageSequence, features
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'GIF': '.gif'}
+# Оценка сверху: Pillow хранит точку распространённых режимов, включая
+# RGB, в четырёх байтах или меньше
+BYTES_PER_PIXEL = 4
+# Длительность кадра GIF, если она не указана, мс
+DEFAULT_FRAME_DURATION = 100
+
+
+def output_format():
+    if settings.IMAGE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP'
+    return 'JPEG'
+
+
+def check_size(image):
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s точек.',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+
+
+def check_decoded_size(width, height, frames=1):
+    """Отклоняет картинку, которая займёт в памяти больше бюджета."""
+    if width * height * frames * BYTES_PER_PIXEL > (
+        settings.IMAGE_MAX_DECODED_BYTES
+    ):
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s точек.',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+
+
+def invalid_image():
+    return ValidationError(
+        'Не удалось прочитать картинку.', code='invalid_image'
+    )
+
+
+def _flatten(image):
+    """Приводит картинку к RGB; прозрачность заливается белым."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def ingest(upload):
+    """Проверяет и нормализует загруженную картинку.
+
+    Возвращает файл для сохранения в поле ``image``: сам ``upload``, если
+    менять в нём нечего, или новый файл в нормализованном виде.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise invalid_image()
+    # Image.open читает только заголовок: размеры известны до декодирования
+    check_size(image)
+    max_edge = settings.IMAGE_MAX_EDGE
+    if image.format == 'GIF':
+        return _ingest_gif(upload, image, max_edge)
+
+    # Для JPEG декодер сразу уменьшает картинку в 2-8 раз
+    image.draft('RGB', (max_edge, max_edge))
+    check_decoded_size(*image.size)
+    try:
+        # Ориентация из EXIF запоминается до уменьшения
+        image.getexif()
+        if image.mode in ('1', 'P'):
+            # Палитру Pillow уменьшает без сглаживания
+            image = image.convert('RGBA')
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        result = _flatten(ImageOps.exif_transpose(image))
+    except (OSError, Image.DecompressionBombError):
+        raise invalid_image()
+    image.close()
+    fmt = output_format()
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    # Параметр exif не передаётся, поэтому метаданные не сохраняются
+    if fmt == 'JPEG':
+        result.save(
+            output, 'JPEG', quality=settings.IMAGE_QUALITY,
+            optimize=True, progressive=True,
+        )
+    else:
+        result.save(output, fmt, quality=settings.IMAGE_QUALITY, method=4)
+    return _named(output, upload, fmt)
+
+
+def _ingest_gif(upload, image, max_edge):
+    """Уменьшает кадры GIF, если он больше ``max_edge``."""
+    if max(image.size) <= max_edge:
+        upload.seek(0)
+        return upload
+    scale = max_edge / max(image.size)
+    size = (
+        max(1, round(image.width * scale)),
+        max(1, round(image.height * scale)),
+    )
+    # В памяти одновременно кадр исходника и все уменьшенные кадры
+    check_decoded_size(*image.size)
+    check_decoded_size(*size, frames=getattr(image, 'n_frames', 1))
+    frames, durations = [], []
+    try:
+        for frame in ImageSequence.Iterator(image):
+            durations.append(frame.info.get(
+                'duration', DEFAULT_FRAME_DURATION
+            ))
+            frames.append(frame.resize(size, Image.LANCZOS))
+    except (OSError, Image.DecompressionBombError):
+        raise invalid_image()
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    # Кадры полные, поэтому каждый заменяет предыдущий целиком
+    frames[0].save(
+        output, 'GIF', save_all=True, append_images=frames[1:],
+        duration=durations, loop=image.info.get('loop', 0), disposal=2,
+    )
+    image.close()
+    return _named(output, upload, 'GIF')
+
+
+def _named(output, upload, fmt):
+    output.seek(0)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(output, name=stem + EXTENSIONS[fmt])
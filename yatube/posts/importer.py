@@ -0,0 +1,437 @@
+"""Потоковая загрузка дампов в формате фикстур ``dumpdata``.
+
+В отличие от ``loaddata`` файл читается по одному объекту, строки
+вставляются пачками многострочным ``INSERT``, а индексы, полнотекстовый
+индекс, счётчики и ленты строятся один раз в конце.
+
+Внешние ключи разрешаются между пачками: строка, ссылающаяся на ещё
+не встреченный объект (в ``dump.json`` комментарии идут раньше постов),
+откладывается до его появления. Ссылки на объекты прежних пачек
+проверяются одним запросом к базе на пачку, а в памяти держатся только
+ключи текущей пачки и отложенные строки, так что память растёт лишь с
+числом опережающих ссылок.
+
+После каждой пачки в файл состояния записывается номер объекта, до
+которого всё уже в базе: повторный запуск продолжает с него.
+Вставка идёт с ``ignore_conflicts``, так что уже загруженные строки
+после этого номера просто пропускаются и в счётчики вставленных не
+попадают.
+"""
+import json
+import os
+import re
+import time
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.core import serializers
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.sql import InsertQuery
+
+from . import feed, search, stats
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 500
+DEFAULT_MODELS = (
+    'auth.user',
+    'posts.group',
+    'posts.post',
+    'posts.comment',
+    'posts.follow',
+)
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class ArrayReader:
+    """JSON-массив из потока, читаемого кусками по ``chunk_size`` символов."""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """Дочитывает кусок файла; False, если файл кончился."""
+        chunk = '' if self.eof else self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Следующий непробельный символ."""
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                raise ValueError('Файл дампа неожиданно закончился.')
+
+    def expect(self, char, message):
+        if self.peek() != char:
+            raise ValueError(message)
+        self.position += 1
+
+    def decode(self):
+        """Следующее значение JSON."""
+        self.peek()
+        while True:
+            try:
+                value, self.position = self.decoder.raw_decode(
+                    self.buffer, self.position
+                )
+            except json.JSONDecodeError:
+                # Значение не уместилось в прочитанное: дочитываем файл
+                if not self.fill():
+                    raise
+            else:
+                return value
+
+
+def iter_objects(stream, chunk_size=CHUNK_SIZE):
+    """Объекты верхнего уровня JSON-массива по одному.
+
+    В памяти одновременно держится не больше одного объекта и одного
+    прочитанного куска файла.
+    """
+    reader = ArrayReader(stream, chunk_size)
+    reader.expect('[', 'Дамп должен быть JSON-массивом объектов.')
+    if reader.peek() == ']':
+        return
+    while True:
+        obj = reader.decode()
+        if not isinstance(obj, dict):
+            raise ValueError('Элементы дампа должны быть объектами.')
+        yield obj
+        if reader.peek() == ']':
+            return
+        reader.expect(',', 'Ожидалась запятая между объектами.')
+
+
+class Pending:
+    """Строка, ждущая появления объектов, на которые она ссылается."""
+
+    def __init__(self, seq, deserialized, missing):
+        self.seq = seq
+        self.deserialized = deserialized
+        self.missing = missing
+
+
+class DumpImporter:
+    def __init__(self, models=DEFAULT_MODELS, batch_size=BATCH_SIZE,
+                 state_path=None, report=None, report_every=5.0):
+        self.labels = {label.lower() for label in models}
+        self.models = [apps.get_model(label) for label in models]
+        self.batch_size = batch_size
+        self.state_path = state_path
+        self.report = report or (lambda message: None)
+        self.report_every = report_every
+
+        self.buffers = defaultdict(list)
+        self.buffered = 0
+        # Ключи объектов текущей пачки: в буферах или найденных в базе.
+        # Очищаются после вставки пачки, чтобы память не росла с дампом
+        self.known = defaultdict(set)
+        self.pending = {}
+        self.waiting = defaultdict(list)
+        # Ключи, которые ещё не искали в базе
+        self.unchecked = set()
+        self.next_seq = 0
+        self.counts = Counter()
+        self.skipped = Counter()
+        self.started = None
+        self.last_report = None
+
+    def read_offset(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return 0
+        with open(self.state_path) as state:
+            return json.load(state)['offset']
+
+    def write_offset(self):
+        if not self.state_path:
+            return
+        offset = next(iter(self.pending), self.next_seq)
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w') as state:
+            json.dump({'offset': offset}, state)
+        os.replace(tmp_path, self.state_path)
+
+    def clear_state(self):
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def run(self, stream, defer_indexes=True):
+        """Загружает дамп; возвращает счётчики вставленных строк."""
+        offset = self.read_offset()
+        if offset:
+            self.report(f'Продолжаем с объекта {offset}')
+        self.started = self.last_report = time.monotonic()
+        if defer_indexes:
+            drop_indexes(self.models)
+        try:
+            self.load(stream, offset)
+        finally:
+            # Даже после сбоя база не должна остаться без индексов лент
+            self.report('Создаём индексы')
+            create_indexes(self.models)
+        rebuild_derived(self.report)
+        self.clear_state()
+        return self.counts
+
+    def load(self, stream, offset):
+        for seq, record in enumerate(iter_objects(stream)):
+            self.next_seq = seq + 1
+            if seq < offset:
+                continue
+            if record.get('model', '').lower() not in self.labels:
+                self.skipped[record.get('model')] += 1
+                continue
+            self.add(seq, record)
+            # Ключи для проверки в базе тоже копятся не дольше пачки
+            if self.buffered + len(self.unchecked) >= self.batch_size:
+                self.flush()
+        self.resolve_dangling()
+        self.flush()
+        self.report_progress(force=True)
+
+    def add(self, seq, record):
+        (deserialized,) = serializers.deserialize(
+            'python', [record], ignorenonexistent=True
+        )
+        missing = set()
+        for field in self.foreign_keys(deserialized.object):
+            key = (field.related_model, getattr(
+                deserialized.object, field.attname
+            ))
+            if key[1] is not None and key[1] not in self.known[key[0]]:
+                missing.add(key)
+        if not missing:
+            self.buffer(deserialized)
+            return
+        entry = Pending(seq, deserialized, missing)
+        self.pending[seq] = entry
+        for key in missing:
+            if key not in self.waiting:
+                self.unchecked.add(key)
+            self.waiting[key].append(entry)
+
+    @staticmethod
+    def foreign_keys(obj):
+        return [
+            field for field in obj._meta.concrete_fields
+            if field.is_relation and (field.many_to_one or field.one_to_one)
+        ]
+
+    def buffer(self, deserialized):
+        obj = deserialized.object
+        self.buffers[type(obj)].append(deserialized)
+        self.buffered += 1
+        self.arrived(type(obj), obj.pk)
+
+    def arrived(self, model, pk):
+        """Отмечает объект известным и отпускает ждавшие его строки."""
+        self.known[model].add(pk)
+        for entry in self.waiting.pop((model, pk), ()):
+            entry.missing.discard((model, pk))
+            if not entry.missing:
+                del self.pending[entry.seq]
+                self.buffer(entry.deserialized)
+
+    def check_database(self):
+        """Ищет в базе объекты, которых ждут отложенные строки."""
+        unchecked = defaultdict(set)
+        for model, pk in self.unchecked:
+            if (model, pk) in self.waiting:
+                unchecked[model].add(pk)
+        self.unchecked.clear()
+        for model, pks in unchecked.items():
+            pks = list(pks)
+            for start in range(0, len(pks), BATCH_SIZE):
+                chunk = pks[start:start + BATCH_SIZE]
+                found = set(
+                    model._default_manager.filter(pk__in=chunk)
+                    .values_list('pk', flat=True)
+                )
+                for pk in found:
+                    self.arrived(model, pk)
+
+    def resolve_dangling(self):
+        """Строки со ссылками на несуществующие объекты.
+
+        Необязательные ссылки обнуляются, строки с обязательными
+        пропускаются.
+        """
+        self.check_database()
+        for entry in list(self.pending.values()):
+            if entry.seq not in self.pending:
+                # Отпущена, когда появился объект из другой такой строки
+                continue
+            del self.pending[entry.seq]
+            obj = entry.deserialized.object
+            fields = {
+                (field.related_model, getattr(obj, field.attname)): field
+                for field in self.foreign_keys(obj)
+            }
+            if all(fields[key].null for key in entry.missing):
+                for key in entry.missing:
+                    setattr(obj, fields[key].attname, None)
+                self.buffer(entry.deserialized)
+            else:
+                self.skipped[obj._meta.label_lower] += 1
+        self.waiting.clear()
+
+    def flush(self):
+        self.check_database()
+        if self.buffered:
+            # Каждая пачка - своя транзакция со строками всех моделей:
+            # внешние ключи проверяются при её фиксации, когда связанные
+            # строки этой пачки уже вставлены, а прежних - зафиксированы
+            with transaction.atomic():
+                for model, items in self.buffers.items():
+                    self.counts[model._meta.label_lower] += self.insert(
+                        model, items
+                    )
+                    self.save_m2m(items)
+            self.buffers.clear()
+            self.buffered = 0
+        self.known.clear()
+        self.write_offset()
+        self.report_progress()
+
+    @staticmethod
+    def insert(model, items):
+        """Вставляет строки пачки; возвращает, сколько из них новых."""
+        objs = [item.object for item in items]
+        # Строки, загруженные до сбоя, ignore_conflicts пропустит
+        pks = [obj.pk for obj in objs if obj.pk is not None]
+        existing = 0
+        for start in range(0, len(pks), BATCH_SIZE):
+            existing += model._default_manager.filter(
+                pk__in=pks[start:start + BATCH_SIZE]
+            ).count()
+        insert_raw(model, objs)
+        return len(objs) - existing
+
+    @staticmethod
+    def save_m2m(items):
+        rows = defaultdict(list)
+        for item in items:
+            for name, values in (item.m2m_data or {}).items():
+                field = item.object._meta.get_field(name)
+                through = field.remote_field.through
+                source = field.m2m_field_name()
+                target = field.m2m_reverse_field_name()
+                for value in values:
+                    rows[through].append(through(**{
+                        f'{source}_id': item.object.pk,
+                        f'{target}_id': value,
+                    }))
+        for through, objs in rows.items():
+            through._default_manager.bulk_create(
+                objs, batch_size=BATCH_SIZE, ignore_conflicts=True
+            )
+
+    def report_progress(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < self.report_every:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        total = sum(self.counts.values())
+        details = ', '.join(
+            f'{label}: {count}' for label, count in sorted(self.counts.items())
+        )
+        self.report(
+            f'Прочитано объектов: {self.next_seq}, вставлено: {total} '
+            f'({total / elapsed:.0f} строк/с), ожидают связей: '
+            f'{len(self.pending)}. {details}'
+        )
+
+
+def insert_raw(model, objs):
+    """Вставляет строки как есть, пропуская конфликтующие по ключу.
+
+    ``bulk_create`` вызывает ``pre_save`` полей, и ``auto_now_add``
+    заменил бы даты из дампа текущим временем. Здесь, как в ``loaddata``,
+    значения берутся без ``pre_save``. Текущее время ставится, только
+    если даты в дампе нет.
+    """
+    with_pk = [obj for obj in objs if obj.pk is not None]
+    without_pk = [obj for obj in objs if obj.pk is None]
+    fields = model._meta.concrete_fields
+    for field in fields:
+        if getattr(field, 'auto_now_add', False) or getattr(
+            field, 'auto_now', False
+        ):
+            for obj in objs:
+                if getattr(obj, field.attname) is None:
+                    field.pre_save(obj, add=True)
+    for group, group_fields in (
+        (with_pk, fields),
+        (without_pk, [field for field in fields if not field.primary_key]),
+    ):
+        if not group:
+            continue
+        batch_size = min(
+            max(connection.ops.bulk_batch_size(group_fields, group), 1),
+            BATCH_SIZE,
+        )
+        for start in range(0, len(group), batch_size):
+            query = InsertQuery(model, ignore_conflicts=True)
+            query.insert_values(
+                group_fields, group[start:start + batch_size], raw=True
+            )
+            query.get_compiler(connection=connection).execute_sql()
+
+
+def existing_indexes(model):
+    with connection.cursor() as cursor:
+        return connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+
+
+def drop_indexes(models):
+    """Удаляет индексы из Meta моделей на время массовой вставки."""
+    for model in models:
+        for index in model._meta.indexes:
+            if index.name in existing_indexes(model):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(index.name)}'
+                    )
+
+
+def create_indexes(models):
+    """Создаёт недостающие индексы из Meta моделей."""
+    # Редактор схемы используется только для генерации SQL: войти
+    # в него внутри транзакции SQLite не даёт
+    editor = connection.schema_editor(collect_sql=True)
+    for model in models:
+        for index in model._meta.indexes:
+            if index.name not in existing_indexes(model):
+                with connection.cursor() as cursor:
+                    cursor.execute(str(index.create_sql(model, editor)))
+
+
+def rebuild_derived(report, feeds=True):
+    """Строит всё, что сигналы не поддерживали во время вставки."""
+    report('Пересчитываем счётчики и ленты')
+    with transaction.atomic():
+        stats.rebuild()
+        stats.reconcile_comment_counts()
+        if feeds:
+            feed.backfill()
+        if search.is_supported():
+            report('Строим полнотекстовый индекс')
+            search.rebuild()
+    # Закешированные страницы не знают о новых данных
+    cache.clear()
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import feed
+from posts.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = 'Заново строит материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='id пользователя, ленту которого нужно перестроить',
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        user_id = options['user']
+        items = FeedItem.objects.all()
+        if user_id is not None:
+            items = items.filter(user_id=user_id)
+        items.delete()
+        processed = feed.backfill(user_id=user_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано подписок: {processed}, '
+            f'записей в лентах: {FeedItem.objects.count()}'
+        ))
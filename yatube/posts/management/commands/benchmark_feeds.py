@@ -0,0 +1,126 @@
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from posts.feed import follow_feed
+from posts.models import Comment, Follow, Group, Post, UserStats
+from posts.paginators import KeysetPaginator
+from posts.views import POSTS_PER_PAGE
+
+INDEXED_MODELS = (Post, Comment, Follow)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время выборки первой и глубокой страницы каждой ленты '
+        'с составными индексами и без них.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторять каждый замер',
+        )
+        parser.add_argument(
+            '--depth', type=float, default=0.9,
+            help='Глубина «глубокой» страницы как доля длины ленты',
+        )
+        parser.add_argument(
+            '--no-compare', action='store_true',
+            help='Не замерять ленты без составных индексов',
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        self.depth = options['depth']
+        scenarios = list(self.scenarios())
+        if not scenarios:
+            self.stderr.write('В базе нет постов для замеров.')
+            return
+        with_indexes = self.measure(scenarios)
+        without_indexes = {}
+        if not options['no_compare']:
+            # Индексы удаляются внутри транзакции, которая затем
+            # откатывается: схема базы после замеров не меняется
+            with transaction.atomic():
+                self.drop_indexes()
+                without_indexes = self.measure(scenarios)
+                transaction.set_rollback(True)
+        self.report(with_indexes, without_indexes)
+
+    def scenarios(self):
+        """Ленты из posts.views для самых наполненных сообществ и авторов."""
+        posts = Post.objects.select_related('author', 'group')
+        if not posts.exists():
+            return
+        yield 'index', posts, 'pub_date'
+        group = Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        if group is not None:
+            yield 'group_posts', posts.filter(group=group), 'pub_date'
+        stats = UserStats.objects.order_by('-posts_count').first()
+        if stats is not None:
+            yield 'profile', posts.filter(
+                author_id=stats.user_id
+            ), 'pub_date'
+        stats = UserStats.objects.order_by('-following_count').first()
+        if stats is not None and stats.following_count:
+            yield 'follow_index', follow_feed(stats.user), 'feed_date'
+        post = Post.objects.annotate(
+            total=Count('comments')
+        ).order_by('-total').first()
+        yield 'post_detail', post.comments.select_related(
+            'author'
+        ).order_by('created'), None
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(index.name)}'
+                    )
+
+    def timed(self, fetch):
+        timings = []
+        for _ in range(self.repeat):
+            start = perf_counter()
+            fetch()
+            timings.append(perf_counter() - start)
+        return median(timings) * 1000
+
+    def measure(self, scenarios):
+        results = {}
+        for name, queryset, date_field in scenarios:
+            if date_field is None:
+                results[name, 'все'] = self.timed(lambda: list(queryset))
+                continue
+            paginator = KeysetPaginator(queryset, POSTS_PER_PAGE, date_field)
+            results[name, 'первая'] = self.timed(paginator.get_page)
+            cursor = self.deep_cursor(paginator)
+            results[name, 'глубокая'] = self.timed(
+                lambda: paginator.get_page(after=cursor)
+            )
+        return results
+
+    def deep_cursor(self, paginator):
+        """Курсор страницы на глубине ``--depth``; ищется вне замера."""
+        length = paginator.object_list.count()
+        target = int(length * self.depth) // POSTS_PER_PAGE
+        page = paginator.get_page(page=max(target, 1))
+        return page.next_cursor or page.previous_cursor
+
+    def report(self, with_indexes, without_indexes):
+        self.stdout.write(
+            f'{"лента":<14}{"страница":<10}{"с индексами":>14}'
+            f'{"без индексов":>15}'
+        )
+        for (name, page), elapsed in with_indexes.items():
+            line = f'{name:<14}{page:<10}{elapsed:>11.2f} мс'
+            if without_indexes:
+                line += f'{without_indexes[name, page]:>12.2f} мс'
+            self.stdout.write(line)
@@ -0,0 +1,65 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.export import EXPORTS, FORMATS
+
+
+def moment(value):
+    """Дата или дата со временем из командной строки."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Не удалось разобрать дату {value}.')
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты, комментарии или подписки в NDJSON '
+        'или CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--since', help='не раньше даты (YYYY-MM-DD[THH:MM])'
+        )
+        parser.add_argument('--until', help='раньше даты')
+        parser.add_argument('--author', help='имя пользователя автора')
+        parser.add_argument('--group', help='slug сообщества')
+        parser.add_argument(
+            '--output', help='файл для выгрузки, по умолчанию stdout'
+        )
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['kind']]
+        try:
+            queryset = export.filter(
+                export.model._default_manager.all(),
+                since=options['since'] and moment(options['since']),
+                until=options['until'] and moment(options['until']),
+                author=options['author'],
+                group=options['group'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        lines = export.lines(queryset, options['format'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stderr.write(f'Записано строк в {options["output"]}: {count}')
@@ -0,0 +1,104 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.generator import Generator, Plan
+from posts.importer import create_indexes, drop_indexes, rebuild_derived
+from posts.models import Comment, Follow, Post
+
+INDEXED_MODELS = (Post, Comment, Follow)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует пользователей, сообщества, посты, комментарии, подписки '
+        'и картинки с перекошенными распределениями. При одном и том же '
+        '--seed данные повторяются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--comments', type=float, default=2.0,
+            help='среднее число комментариев на пост',
+        )
+        parser.add_argument(
+            '--follows', type=float, default=20.0,
+            help='среднее число подписок на пользователя',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='доля постов с картинкой, от 0 до 1',
+        )
+        parser.add_argument(
+            '--image-pool', type=int, default=50,
+            help='число разных картинок, которые делят посты',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='за сколько дней до 2023-01-01 распределены посты',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='число процессов; при 1 всё строится в текущем процессе',
+        )
+        parser.add_argument(
+            '--keep-indexes', action='store_true',
+            help='не удалять индексы на время вставки',
+        )
+        parser.add_argument(
+            '--no-feed', action='store_true',
+            help='не строить ленты подписок (потом: backfill_feed)',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('users', 'groups', 'posts', 'image_pool', 'days'):
+            if options[name] < 0:
+                raise CommandError(f'--{name} не может быть отрицательным.')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images - доля от 0 до 1.')
+        plan = Plan(
+            seed=options['seed'],
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            images=options['images'],
+            image_pool=options['image_pool'],
+            days=options['days'],
+        )
+        started = time.monotonic()
+        self.last_report = started
+        if not options['keep_indexes']:
+            drop_indexes(INDEXED_MODELS)
+        try:
+            counts = Generator(
+                plan, workers=options['workers'], report=self.progress
+            ).run()
+            inserted = time.monotonic() - started
+            self.stdout.write(
+                f'Вставлено строк: {sum(counts.values())} за '
+                f'{inserted:.1f} с '
+                f'({sum(counts.values()) / max(inserted, 1e-9):.0f} строк/с)'
+            )
+        finally:
+            # Даже после сбоя база не должна остаться без индексов лент
+            self.stdout.write('Создаём индексы')
+            create_indexes(INDEXED_MODELS)
+        rebuild_derived(self.stdout.write, feeds=not options['no_feed'])
+        details = ', '.join(
+            f'{name}: {count}' for name, count in counts.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с. {details}'
+        ))
+
+    def progress(self, message):
+        now = time.monotonic()
+        if now - self.last_report >= 5:
+            self.last_report = now
+            self.stdout.write(message)
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import BATCH_SIZE, DEFAULT_MODELS, DumpImporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает дамп в формате dumpdata: пачками, с отложенным '
+        'построением индексов и продолжением после сбоя.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='путь к файлу дампа')
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            default=list(DEFAULT_MODELS),
+            help='загружаемые модели в виде app_label.model',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='число строк в одной транзакции',
+        )
+        parser.add_argument(
+            '--keep-indexes',
+            action='store_true',
+            help='не удалять индексы на время загрузки',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='начать заново, не продолжая прошлую загрузку',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        state_path = f'{path}.import-state'
+        importer = DumpImporter(
+            models=options['models'],
+            batch_size=options['batch_size'],
+            state_path=state_path,
+            report=self.stdout.write,
+        )
+        if options['restart']:
+            importer.clear_state()
+        try:
+            with open(path, encoding='utf-8') as stream:
+                counts = importer.run(
+                    stream, defer_indexes=not options['keep_indexes']
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(
+                f'Загрузка прервана: {error}. Повторный запуск продолжит '
+                f'с места остановки.'
+            )
+        for label, count in sorted(importer.skipped.items()):
+            self.stdout.write(f'Пропущено {label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {sum(counts.values())}'
+        ))
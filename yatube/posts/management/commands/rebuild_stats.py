@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок пользователей.'
+
+    def handle(self, *args, **options):
+        users = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счётчики пользователей: {users}'
+        ))
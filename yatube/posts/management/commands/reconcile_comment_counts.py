@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import caching, stats
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики комментариев постов с таблицей комментариев.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        fixed = stats.reconcile_comment_counts()
+        tags = {caching.FEED_TAG}
+        for row in fixed:
+            tags.add(caching.post_tag(row['pk']))
+            tags.add(caching.author_tag(row['author_id']))
+            if row['group_id']:
+                tags.add(caching.group_tag(row['group_id']))
+        if fixed:
+            caching.invalidate(*tags)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков комментариев: {len(fixed)}'
+        ))
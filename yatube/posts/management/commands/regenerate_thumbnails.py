@@ -0,0 +1,55 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры картинок всех постов в несколько процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='число процессов; при 1 всё строится в текущем процессе',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='перестроить уже существующие миниатюры',
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True).distinct()
+        )
+        force = options['force']
+        total = len(names)
+        built = 0
+        if options['workers'] > 1 and total > 1:
+            # Дочерние процессы не должны наследовать открытые подключения
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as executor:
+                results = executor.map(
+                    thumbnails.generate, names, [force] * total,
+                    chunksize=16,
+                )
+                for done, count in enumerate(results, 1):
+                    built += count
+                    self.report(done, total)
+        else:
+            for done, name in enumerate(names, 1):
+                built += thumbnails.generate(name, force=force)
+                self.report(done, total)
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {total}, построено миниатюр: {built}'
+        ))
+
+    def report(self, done, total):
+        if done % 100 == 0 or done == total:
+            self.stdout.write(f'Обработано картинок: {done} из {total}')
@@ -0,0 +1,75 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def forwards_func(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    db_alias = schema_editor.connection.alias
+    # Посты «звёзд» не раскладываются, а подмешиваются при чтении
+    celebrities = set(
+        Follow.objects.using(db_alias).order_by().values('author_id')
+        .annotate(total=models.Count('pk'))
+        .filter(total__gt=settings.FEED_FANOUT_FOLLOWERS_LIMIT)
+        .values_list('author_id', flat=True)
+    )
+    for follow in Follow.objects.using(db_alias).iterator():
+        if follow.author_id in celebrities:
+            continue
+        posts = Post.objects.using(db_alias).filter(
+            author_id=follow.author_id
+        ).values_list('pk', 'pub_date')
+        FeedItem.objects.using(db_alias).bulk_create(
+            (
+                FeedItem(
+                    user_id=follow.user_id,
+                    post_id=pk,
+                    author_id=follow.author_id,
+                    pub_date=pub_date,
+                )
+                for pk, pub_date in posts.iterator()
+            ),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_auto_20220528_1106'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='автор поста')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='posts.Post', verbose_name='пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='читатель')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-pub_date'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique feed item'),
+        ),
+        migrations.RunPython(
+            code=forwards_func,
+            reverse_code=migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
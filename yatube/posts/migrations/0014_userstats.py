@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def forwards_func(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    db_alias = schema_editor.connection.alias
+    counts = {}
+    aggregates = (
+        ('posts_count', Post, 'author'),
+        ('followers_count', Follow, 'author'),
+        ('following_count', Follow, 'user'),
+    )
+    for field, model, group_by in aggregates:
+        rows = model.objects.using(db_alias).order_by().values(
+            group_by
+        ).annotate(total=models.Count('pk'))
+        for row in rows:
+            counts.setdefault(row[group_by], {})[field] = row['total']
+    UserStats.objects.using(db_alias).bulk_create(
+        [
+            UserStats(user_id=user_id, **fields)
+            for user_id, fields in counts.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0013_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.IntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(
+            code=forwards_func,
+            reverse_code=migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
@@ -29,14 +29,63 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Поддерживается сигналами комментариев, сверяется командой
+    # reconcile_comment_counts
+    comments_count = models.IntegerField(
+        'Комментариев', default=0, editable=False
+    )
+    # Готовые миниатюры картинки в JSON; пишет их posts.thumbnails
+    # после построения, NULL - ещё не построены
+    image_variants = models.TextField(null=True, editable=False)
+
+    # Поля, которые меняются только запросами update(): счётчик
+    # комментариев - выражениями F() в posts.stats, миниатюры - после
+    # построения в фоне
+    DERIVED_FIELDS = ('comments_count', 'image_variants')
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Полное сохранение загруженного раньше поста, как в форме
+        # редактирования или админке, не перезаписывает их старыми
+        # значениями. Копия с pk = None вставляется как обычно, а
+        # отложенные поля не дочитываются ради сохранения
+        if (
+            not self._state.adding
+            and self.pk is not None
+            and kwargs.get('update_fields') is None
+            and not args
+            and not kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DERIVED_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы повторяют порядок выборки лент: (pub_date, id)
+        # по убыванию, отдельно для сообщества и автора
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+        ]
 
 
 class Group(models.Model):
@@ -68,6 +117,13 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -94,3 +150,69 @@ class Follow(models.Model):
                 check=~models.Q(author=models.F('user'))
             ),
         ]
+        # Уникальность (author, user) не помогает выборкам по подписчику
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='follow_user_author_idx'
+            ),
+        ]
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='пост'
+    )
+    # Автор и дата копируются из поста, чтобы отписка и чтение ленты
+    # обходились без соединения с таблицей постов
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='автор поста'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique feed item'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'], name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'], name='feed_user_author_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые обновляются вместе с постами
+    и подписками."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='пользователь'
+    )
+    posts_count = models.IntegerField('Постов', default=0)
+    followers_count = models.IntegerField('Подписчиков', default=0)
+    following_count = models.IntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
@@ -0,0 +1,149 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(value, pk):
+    """Упаковывает ключ (дата, id) в непрозрачный токен для URL."""
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для испорченного токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (BinasciiError, UnicodeDecodeError, ValueError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    Страница выбирается курсорами ``after``/``before`` и стоит одинаково
+    на любой глубине ленты. Общее число страниц заранее неизвестно,
+    поэтому ``number`` и ``num_pages`` описывают только соседей текущей
+    страницы: этого хватает ``Page.has_next``/``has_previous``.
+    Старые ссылки ``?page=N`` обслуживаются одним OFFSET-запросом
+    без подсчёта строк. При ``descending=False`` первая страница
+    содержит самые старые записи.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 descending=True):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field
+        self.descending = descending
+        self._number = 1
+        self._has_next = False
+
+    @property
+    def num_pages(self):
+        return self._number + int(self._has_next)
+
+    def _key(self, row):
+        if isinstance(row, dict):
+            return row[self.date_field], row['id']
+        return getattr(row, self.date_field), row.pk
+
+    # Условие записано как «дата <= X и (дата < X или id < Y)»: внешнее
+    # сравнение задаёт диапазон индекса по дате, а форму с OR на верхнем
+    # уровне SQLite не может превратить в диапазон и сканирует таблицу
+    def _older(self, cursor):
+        value, pk = cursor
+        return Q(**{f'{self.date_field}__lte': value}) & (
+            Q(**{f'{self.date_field}__lt': value}) | Q(id__lt=pk)
+        )
+
+    def _newer(self, cursor):
+        value, pk = cursor
+        return Q(**{f'{self.date_field}__gte': value}) & (
+            Q(**{f'{self.date_field}__gt': value}) | Q(id__gt=pk)
+        )
+
+    def _newest_first(self):
+        return self.object_list.order_by(f'-{self.date_field}', '-id')
+
+    def _oldest_first(self):
+        return self.object_list.order_by(self.date_field, 'id')
+
+    def _forward(self):
+        if self.descending:
+            return self._newest_first()
+        return self._oldest_first()
+
+    def _backward(self):
+        if self.descending:
+            return self._oldest_first()
+        return self._newest_first()
+
+    def _ahead(self, cursor):
+        return self._older(cursor) if self.descending else self._newer(cursor)
+
+    def _behind(self, cursor):
+        return self._newer(cursor) if self.descending else self._older(cursor)
+
+    def _slice(self, queryset, offset=0):
+        rows = list(queryset[offset:offset + self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def get_page(self, after=None, before=None, page=None):
+        """Возвращает страницу по курсору или по старому номеру."""
+        after, before = decode_cursor(after), decode_cursor(before)
+        has_previous = False
+        if before is not None:
+            rows, has_previous = self._slice(
+                self._backward().filter(self._behind(before))
+            )
+            rows.reverse()
+            has_next = True
+        elif after is not None:
+            rows, has_next = self._slice(
+                self._forward().filter(self._ahead(after))
+            )
+            has_previous = True
+        elif page == 'last':
+            rows, has_previous = self._slice(self._backward())
+            rows.reverse()
+            has_next = False
+        else:
+            number = self._page_number(page)
+            rows, has_next = self._slice(
+                self._forward(), (number - 1) * self.per_page
+            )
+            has_previous = number > 1
+        if before is not None and not rows:
+            # Перед курсором ничего нет - показываем начало ленты
+            return self.get_page()
+        return self._make_page(rows, has_previous, has_next)
+
+    def _page_number(self, page):
+        try:
+            number = int(page)
+        except (TypeError, ValueError):
+            return 1
+        return max(number, 1)
+
+    def _make_page(self, rows, has_previous, has_next):
+        self._number = 2 if has_previous else 1
+        self._has_next = has_next
+        page = self._get_page(rows, self._number, self)
+        page.next_cursor = (
+            encode_cursor(*self._key(rows[-1])) if has_next and rows else None
+        )
+        page.previous_cursor = (
+            encode_cursor(*self._key(rows[0]))
+            if has_previous and rows else None
+        )
+        return page
@@ -0,0 +1,114 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Текст поста вместе с автором и сообществом хранится в виртуальной
+таблице ``posts_post_fts`` с rowid, равным id поста. Таблица
+поддерживается сигналами сохранения и удаления ``Post``; для других СУБД
+поиск откатывается к ``icontains``.
+"""
+from django.db import connection, connections, router
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+# Предел выдачи для ранжированного поиска на сайте
+RESULTS_LIMIT = 200
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Превращает пользовательский ввод в безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 в запросе
+    не работают, а слова объединяются через AND.
+    """
+    terms = [
+        '"{}"'.format(term.replace('"', '""')) for term in query.split()
+    ]
+    return ' '.join(terms)
+
+
+def index_post(post):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, author_id, group_id) '
+            f'VALUES (%s, %s, %s, %s)',
+            [post.pk, post.text, post.author_id, post.group_id],
+        )
+
+
+def remove_post(post_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    """Заново заполняет индекс из таблицы постов; возвращает число строк."""
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, author_id, group_id) '
+            f'SELECT id, text, author_id, group_id FROM posts_post'
+        )
+        # Сливаем сегменты индекса после массовой вставки
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"
+        )
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def ranked_ids(query, group_id=None, author_id=None, limit=RESULTS_LIMIT):
+    """id постов, подходящих под запрос, от самых релевантных."""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if not is_supported():
+        posts = Post.objects.filter(text__icontains=query)
+        if group_id is not None:
+            posts = posts.filter(group_id=group_id)
+        if author_id is not None:
+            posts = posts.filter(author_id=author_id)
+        return list(posts.values_list('pk', flat=True)[:limit])
+    sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+    params = [expression]
+    if group_id is not None:
+        sql += ' AND group_id = %s'
+        params.append(group_id)
+    if author_id is not None:
+        sql += ' AND author_id = %s'
+        params.append(author_id)
+    sql += f' ORDER BY bm25({FTS_TABLE}) LIMIT %s'
+    params.append(limit)
+    with connections[router.db_for_read(Post)].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def in_rank_order(queryset, ids):
+    """Посты с заданными id в порядке выдачи поиска."""
+    posts = queryset.in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+def filter_queryset(queryset, query):
+    """Оставляет в выборке постов только подходящие под запрос."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset
+    if not is_supported():
+        return queryset.filter(text__icontains=query)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [expression],
+    ))
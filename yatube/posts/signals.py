@@ -0,0 +1,146 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import caching, feed, search, stats, thumbnails
+from .models import Comment, Follow, Group, Post
+
+
+def post_cache_tags(post):
+    """Теги кеша всех страниц, на которых показан пост."""
+    scopes = {caching.FEED_TAG}
+    loaded_author_id = getattr(post, '_loaded_author_id', post.author_id)
+    loaded_group_id = getattr(post, '_loaded_group_id', post.group_id)
+    for author_id in {post.author_id, loaded_author_id} - {None}:
+        scopes.add(caching.author_tag(author_id))
+    for group_id in {post.group_id, loaded_group_id} - {None}:
+        scopes.add(caching.group_tag(group_id))
+    return {
+        caching.post_tag(post.pk),
+        *scopes,
+        *map(caching.posts_changed_tag, scopes),
+    }
+
+
+@receiver(post_init, sender=Post)
+def post_remember_loaded(sender, instance, **kwargs):
+    # Автор и сообщество на момент загрузки: нужны, чтобы перенести
+    # счётчик постов и сбросить кеш страниц, с которых пост ушёл;
+    # картинка - чтобы строить миниатюры только для новой. Отложенные
+    # поля (only(), defer()) не дочитываются: обращение к ним здесь
+    # загружало бы новый экземпляр с тем же сигналом без конца
+    deferred = instance.get_deferred_fields()
+    if 'author_id' not in deferred:
+        instance._loaded_author_id = instance.author_id
+    if 'group_id' not in deferred:
+        instance._loaded_group_id = instance.group_id
+    if 'image' not in deferred:
+        instance._loaded_image = instance.image.name
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновляет поисковый индекс, счётчики, ленты подписчиков и миниатюры."""
+    search.index_post(instance)
+    caching.invalidate(*post_cache_tags(instance))
+    if raw:
+        return
+    loaded_image = getattr(instance, '_loaded_image', instance.image.name)
+    if created or instance.image.name != loaded_image:
+        # Миниатюры строятся в фоне, а не при первом показе поста
+        thumbnails.queue(instance.image.name)
+    if created:
+        stats.bump(instance.author_id, posts_count=1)
+        feed.fan_out(instance)
+    elif getattr(
+        instance, '_loaded_author_id', instance.author_id
+    ) != instance.author_id:
+        stats.bump(instance._loaded_author_id, posts_count=-1)
+        stats.bump(instance.author_id, posts_count=1)
+    instance._loaded_author_id = instance.author_id
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, posts_count=-1)
+    search.remove_post(instance.pk)
+    caching.invalidate(*post_cache_tags(instance))
+
+
+def comments_count_changed(post_id, delta):
+    """Меняет счётчик комментариев и сбрасывает страницы с постом."""
+    stats.bump_comments(post_id, delta)
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is None:
+        return
+    caching.invalidate(
+        caching.FEED_TAG,
+        caching.author_tag(post['author_id']),
+        post['group_id'] and caching.group_tag(post['group_id']),
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    # Название и описание сообщества видны на его странице
+    caching.invalidate(caching.group_tag(instance.pk))
+
+
+@receiver(post_init, sender=Comment)
+def comment_remember_loaded(sender, instance, **kwargs):
+    instance._loaded_post_id = instance.post_id
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    post_ids = {instance.post_id, instance._loaded_post_id} - {None}
+    caching.invalidate(*map(caching.post_tag, post_ids))
+    if raw:
+        return
+    if created:
+        if instance.post_id:
+            comments_count_changed(instance.post_id, 1)
+    elif instance._loaded_post_id != instance.post_id:
+        # Комментарий перенесли или отвязали от поста
+        if instance._loaded_post_id:
+            comments_count_changed(instance._loaded_post_id, -1)
+        if instance.post_id:
+            comments_count_changed(instance.post_id, 1)
+    instance._loaded_post_id = instance.post_id
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # При удалении поста его комментарии отвязываются UPDATE-запросом
+    # без сигналов: счётчик уходит вместе с постом, править нечего
+    if instance.post_id:
+        caching.invalidate(caching.post_tag(instance.post_id))
+        comments_count_changed(instance.post_id, -1)
+
+
+def follow_changed(follow):
+    # Счётчики подписок обеих сторон видны в профилях
+    caching.invalidate(
+        caching.follow_tag(follow.author_id),
+        caching.follow_tag(follow.user_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.author_id, followers_count=1)
+        stats.bump(instance.user_id, following_count=1)
+        feed.add_author(instance.user_id, instance.author_id)
+        follow_changed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, followers_count=-1)
+    stats.bump(instance.user_id, following_count=-1)
+    feed.remove_author(instance.user_id, instance.author_id)
+    follow_changed(instance)
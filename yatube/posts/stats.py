@@ -0,0 +1,101 @@
+"""Денормализованные счётчики постов, подписок и комментариев."""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserStats
+
+
+def stats_for(user):
+    """Счётчики пользователя; для пользователя без записи - нули."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def bump(user_id, **deltas):
+    """Атомарно изменяет счётчики пользователя на заданные величины."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if UserStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    if all(delta < 0 for delta in deltas.values()):
+        # Записи нет только у пользователя, которого удаляют вместе
+        # с его постами и подписками: уменьшать нечего
+        return
+    try:
+        with transaction.atomic():
+            UserStats.objects.create(user_id=user_id, **deltas)
+    except IntegrityError:
+        # Запись успел создать параллельный запрос
+        UserStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def followers_count(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def rebuild():
+    """Пересчитывает все счётчики по таблицам постов и подписок."""
+    counts = defaultdict(dict)
+    aggregates = (
+        ('posts_count', Post, 'author'),
+        ('followers_count', Follow, 'author'),
+        ('following_count', Follow, 'user'),
+    )
+    for field, model, group_by in aggregates:
+        rows = model.objects.order_by().values(group_by).annotate(
+            total=Count('pk')
+        )
+        for row in rows:
+            counts[row[group_by]][field] = row['total']
+    with transaction.atomic():
+        UserStats.objects.all().delete()
+        UserStats.objects.bulk_create(
+            (
+                UserStats(user_id=user_id, **fields)
+                for user_id, fields in counts.items()
+            ),
+            batch_size=500,
+        )
+    return len(counts)
+
+
+def bump_comments(post_id, delta):
+    """Атомарно изменяет счётчик комментариев поста."""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def comment_counts_subquery():
+    return Coalesce(
+        Subquery(
+            Comment.objects.filter(post=OuterRef('pk')).order_by()
+            .values('post').annotate(total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def reconcile_comment_counts():
+    """Исправляет разошедшиеся счётчики комментариев.
+
+    Возвращает исправленные посты в виде словарей с id поста, автора
+    и сообщества.
+    """
+    mismatched = list(
+        Post.objects.annotate(actual=comment_counts_subquery())
+        .exclude(comments_count=F('actual'))
+        .values('pk', 'author_id', 'group_id')
+    )
+    for start in range(0, len(mismatched), 500):
+        chunk = [row['pk'] for row in mismatched[start:start + 500]]
+        Post.objects.filter(pk__in=chunk).update(
+            comments_count=comment_counts_subquery()
+        )
+    return mismatched
@@ -0,0 +1,152 @@
+"""Ленты RSS и Atom: весь сайт, сообщество и автор.
+
+Готовый XML хранится в кеше под тегами ``posts_changed_tag`` своей
+области и строится заново только после записи поста в ней. Те же теги
+дают ETag и Last-Modified, так что опрашивающие ридеры чаще всего
+получают 304.
+"""
+from functools import wraps
+
+from django.contrib.syndication.views import Feed
+from django.http import HttpResponse
+from django.urls import reverse, reverse_lazy
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from . import caching
+from .conditional import (
+    GROUPS, PROFILES, load_page_object, page_object, page_tags,
+    page_validators
+)
+from .models import Post
+
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def latest_tags(request):
+    return [caching.posts_changed_tag(caching.FEED_TAG)]
+
+
+def group_tags(request, slug):
+    group = load_page_object(request, GROUPS, slug=slug)
+    if group is None:
+        return None
+    return [caching.posts_changed_tag(caching.group_tag(group.pk))]
+
+
+def author_tags(request, username):
+    author = load_page_object(request, PROFILES, username=username)
+    if author is None:
+        return None
+    return [caching.posts_changed_tag(caching.author_tag(author.pk))]
+
+
+def cached_feed(tags_func):
+    """Декоратор ленты: условный GET и готовый XML из кеша."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            tags = page_tags(request, tags_func, *args, **kwargs)
+            if tags is None:
+                return view(request, *args, **kwargs)
+
+            def render():
+                response = view(request, *args, **kwargs)
+                return response.content, response['Content-Type']
+
+            content, content_type = caching.get_or_render(
+                'syndication', tags, [request.get_host(), request.path],
+                FEED_CACHE_TIMEOUT, render,
+            )
+            return HttpResponse(content, content_type=content_type)
+        return page_validators(tags_func, per_user=False)(wrapper)
+    return decorator
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: последние записи'
+    link = reverse_lazy('posts:index')
+    description = 'Новые записи всех авторов Yatube'
+
+    def items(self):
+        return Post.objects.select_related('author', 'group')[:FEED_ITEMS]
+
+    def item_title(self, item):
+        return Truncator(item.text).words(8)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', kwargs={'post_id': item.pk})
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def get_object(self, request, slug):
+        return page_object(request, GROUPS, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: записи сообщества {obj.title}'
+
+    def link(self, obj):
+        return reverse('posts:group_list', kwargs={'slug': obj.slug})
+
+    def description(self, obj):
+        return obj.description
+
+    def items(self, obj):
+        return obj.posts.select_related('author', 'group')[:FEED_ITEMS]
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    def get_object(self, request, username):
+        return page_object(request, PROFILES, username=username)
+
+    def title(self, obj):
+        return f'Yatube: записи {obj.get_full_name() or obj.username}'
+
+    def link(self, obj):
+        return reverse('posts:profile', kwargs={'username': obj.username})
+
+    def description(self, obj):
+        return f'Новые записи пользователя {obj.username}'
+
+    def items(self, obj):
+        return obj.posts.select_related('author', 'group')[:FEED_ITEMS]
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+latest_rss = cached_feed(latest_tags)(LatestPostsFeed())
+latest_atom = cached_feed(latest_tags)(LatestPostsAtomFeed())
+group_rss = cached_feed(group_tags)(GroupPostsFeed())
+group_atom = cached_feed(group_tags)(GroupPostsAtomFeed())
+author_rss = cached_feed(author_tags)(AuthorPostsFeed())
+author_atom = cached_feed(author_tags)(AuthorPostsAtomFeed())
@@ -0,0 +1,56 @@
+from django import template
+
+from posts import caching
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, tags, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.tags = tags
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        if timeout is not None:
+            timeout = int(timeout)
+        return caching.get_or_render(
+            self.fragment_name,
+            self.tags.resolve(context),
+            [var.resolve(context) for var in self.vary_on],
+            timeout,
+            lambda: self.nodelist.render(context),
+        )
+
+
+@register.tag('feedcache')
+def do_feedcache(parser, token):
+    """Кеширует фрагмент до сброса любого из его тегов.
+
+    Использование::
+
+        {% load feed_cache %}
+        {% feedcache [timeout] [fragment_name] [tags] [var1] [var2] .. %}
+            .. some expensive processing ..
+        {% endfeedcache %}
+
+    ``tags`` - список тегов из ``posts.caching``, обычно ``cache_tags``
+    из контекста представления.
+    """
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 4:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 3 arguments."
+        )
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        parser.compile_filter(tokens[3]),
+        [parser.compile_filter(token) for token in tokens[4:]],
+    )
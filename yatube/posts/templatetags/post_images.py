@@ -0,0 +1,39 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'AVIF': 'image/avif'}
+SIZES = f'(max-width: 768px) 100vw, {thumbnails.WIDTH}px'
+
+
+def srcset(built):
+    return ', '.join(f'{url} {width}w' for url, width in built)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """Картинка поста с вариантами разной ширины и формата.
+
+    Варианты строятся в фоне после загрузки картинки (см.
+    ``posts.thumbnails``); пока не готов ни один JPEG, показывается
+    сама картинка.
+    """
+    sources = thumbnails.ready_variants(post)
+    fallback = sources.pop(thumbnails.FALLBACK_FORMAT, None)
+    context = {
+        'width': thumbnails.WIDTH,
+        'height': thumbnails.HEIGHT,
+        'sizes': SIZES,
+        'sources': [
+            {'type': MIME_TYPES.get(fmt), 'srcset': srcset(built)}
+            for fmt, built in sources.items()
+        ],
+    }
+    if fallback:
+        context['src'] = fallback[0][0]
+        context['srcset'] = srcset(fallback)
+    else:
+        context['src'] = post.image.url
+    return context
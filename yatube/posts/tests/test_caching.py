@@ -0,0 +1,175 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class TaggedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='group-slug',
+            description='group-description'
+        )
+        cls.group2 = Group.objects.create(
+            title='test-group2',
+            slug='group-slug2',
+            description='group-description2'
+        )
+        cls.post = Post.objects.create(
+            text='Исходный текст', author=cls.user, group=cls.group
+        )
+        cls.other_post = Post.objects.create(
+            text='Пост другого автора', author=cls.other
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get(self, name, **kwargs):
+        return self.guest_client.get(reverse(name, kwargs=kwargs))
+
+    def silently_rename(self, post, text):
+        # update() не посылает сигналов: изменение видно только
+        # в обход кеша
+        Post.objects.filter(pk=post.pk).update(text=text)
+
+    def test_tag_versions_change_on_invalidate(self):
+        """Сброс тега меняет только его версию."""
+        before = caching.tag_versions(['feed', 'group:1'])
+        caching.invalidate('group:1')
+        after = caching.tag_versions(['feed', 'group:1'])
+        self.assertEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+    def test_edit_purges_affected_pages(self):
+        """Правка поста сбрасывает главную, сообщество и профиль автора."""
+        pages = (
+            ('posts:index', {}),
+            ('posts:group_list', {'slug': 'group-slug'}),
+            ('posts:profile', {'username': 'HasNoName'}),
+        )
+        for name, kwargs in pages:
+            self.get(name, **kwargs)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        for name, kwargs in pages:
+            with self.subTest(page=name):
+                self.assertContains(self.get(name, **kwargs), 'Новый текст')
+
+    def test_unrelated_pages_stay_cached(self):
+        """Запись одного автора не сбрасывает профиль другого."""
+        self.get('posts:profile', username='other')
+        self.silently_rename(self.other_post, 'Незаметная правка')
+        Post.objects.create(text='Ещё пост', author=self.user)
+        response = self.get('posts:profile', username='other')
+        self.assertContains(response, 'Пост другого автора')
+
+    def test_group_change_purges_both_groups(self):
+        """Перенос поста в другое сообщество сбрасывает оба сообщества."""
+        self.get('posts:group_list', slug='group-slug')
+        self.get('posts:group_list', slug='group-slug2')
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.group2
+        post.save()
+        self.assertNotContains(
+            self.get('posts:group_list', slug='group-slug'), 'Исходный текст'
+        )
+        self.assertContains(
+            self.get('posts:group_list', slug='group-slug2'), 'Исходный текст'
+        )
+
+    def test_comment_purges_post_detail(self):
+        """Новый комментарий сразу виден на странице поста."""
+        self.get('posts:post_detail', post_id=self.post.pk)
+        Comment.objects.create(
+            text='Свежий комментарий', author=self.other, post=self.post
+        )
+        self.assertContains(
+            self.get('posts:post_detail', post_id=self.post.pk),
+            'Свежий комментарий'
+        )
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='group-slug',
+            description='group-description'
+        )
+        cls.post = Post.objects.create(
+            text='Исходный текст', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group-slug'}),
+            reverse('posts:profile', kwargs={'username': 'HasNoName'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified_until_write(self):
+        """Страница отвечает 304, пока её не затронет запись."""
+        first = {url: self.guest_client.get(url) for url in self.urls()}
+        for url, response in first.items():
+            with self.subTest(url=url):
+                self.assertIn('Cookie', response['Vary'])
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertEqual(
+                    self.revalidate(self.guest_client, url, response)
+                    .status_code,
+                    304
+                )
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        for url, response in first.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.revalidate(self.guest_client, url, response)
+                    .status_code,
+                    200
+                )
+
+    def test_etag_differs_per_user(self):
+        """Авторизованный пользователь не получает 304 на чужой ETag."""
+        url = reverse('posts:index')
+        anonymous = self.guest_client.get(url)
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = self.revalidate(reader_client, url, anonymous)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profile(self):
+        """Подписка меняет ETag профиля автора."""
+        url = reverse('posts:profile', kwargs={'username': 'HasNoName'})
+        response = self.guest_client.get(url)
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            self.revalidate(self.guest_client, url, response).status_code,
+            200
+        )
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.views import COMMENTS_PER_PAGE
+
+User = get_user_model()
+
+
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {i}', author=cls.user, post=cls.post)
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+        cls.ids = list(
+            Comment.objects.order_by('created', 'id')
+            .values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def fragment(self, **params):
+        return self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            params,
+        )
+
+    def test_first_page_is_bounded(self):
+        """На странице поста только первая порция комментариев."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.pk for comment in comments],
+            self.ids[:COMMENTS_PER_PAGE]
+        )
+        self.assertContains(response, 'Показать ещё')
+
+    def test_load_more_json(self):
+        """JSON-фрагмент отдаёт следующую порцию по курсору."""
+        first = self.fragment(format='json').json()
+        self.assertEqual(
+            [item['id'] for item in first['comments']],
+            self.ids[:COMMENTS_PER_PAGE]
+        )
+        second = self.fragment(
+            format='json', after=first['next_cursor']
+        ).json()
+        self.assertEqual(
+            [item['id'] for item in second['comments']],
+            self.ids[COMMENTS_PER_PAGE:]
+        )
+        self.assertIsNone(second['next_cursor'])
+
+    def test_newest_first_html(self):
+        """HTML-фрагмент в порядке «сначала новые» без обёртки страницы."""
+        response = self.fragment(order='newest')
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            [comment.pk for comment in response.context['comments']],
+            self.ids[::-1][:COMMENTS_PER_PAGE]
+        )
+
+    def test_unknown_post(self):
+        """Для несуществующего поста фрагмент отвечает 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,122 @@
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='group-slug',
+            description='group-description'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author,
+                group=cls.group if i % 2 else None
+            )
+            for i in range(4)
+        ]
+        Post.objects.create(text='Чужой пост', author=cls.reader)
+        # Первые два поста - старые
+        Post.objects.filter(pk__in=[cls.posts[0].pk, cls.posts[1].pk]).update(
+            pub_date=timezone.now() - timedelta(days=30)
+        )
+        Comment.objects.create(
+            text='Комментарий', author=cls.reader, post=cls.posts[1]
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('export_data', *args, stdout=out)
+        return out.getvalue()
+
+    def test_ndjson_filters(self):
+        """Фильтры по автору, сообществу и дате сужают выгрузку."""
+        lines = self.export('posts', '--author', 'author').splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [row['id'] for row in rows], [post.pk for post in self.posts]
+        )
+        self.assertEqual(rows[1]['group'], 'group-slug')
+        self.assertIsNone(rows[0]['group'])
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        rows = [
+            json.loads(line)
+            for line in self.export(
+                'posts', '--group', 'group-slug', '--since', since
+            ).splitlines()
+        ]
+        self.assertEqual([row['id'] for row in rows], [self.posts[3].pk])
+        comments = self.export('comments', '--group', 'group-slug')
+        self.assertEqual(json.loads(comments)['text'], 'Комментарий')
+
+    def test_csv(self):
+        """CSV начинается с заголовка, пустые значения - пустые строки."""
+        rows = list(csv.DictReader(StringIO(self.export(
+            'follows', '--format', 'csv'
+        ))))
+        self.assertEqual(rows, [{
+            'id': str(Follow.objects.get().pk),
+            'user': 'reader',
+            'author': 'author',
+        }])
+        rows = list(csv.DictReader(StringIO(self.export(
+            'posts', '--format', 'csv', '--author', 'author'
+        ))))
+        self.assertEqual(rows[0]['group'], '')
+        self.assertTrue(rows[0]['pub_date'].endswith('Z'))
+
+    def test_unsupported_filter(self):
+        """Подписки нельзя фильтровать по дате."""
+        with self.assertRaises(CommandError):
+            self.export('follows', '--since', '2022-01-01')
+        with self.assertRaises(CommandError):
+            self.export('posts', '--since', 'вчера')
+
+    def test_single_query(self):
+        """Вся выгрузка - один запрос с JOIN, без запроса на строку."""
+        with CaptureQueriesContext(connection) as queries:
+            self.export('posts')
+            self.export('comments')
+        self.assertEqual(len(queries), 2)
+
+    def test_admin_action_streams(self):
+        """Действие админки отдаёт выбранные строки потоком."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'export_ndjson',
+                '_selected_action': [self.posts[0].pk, self.posts[2].pk],
+            },
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn('posts.ndjson', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines],
+            [self.posts[0].pk, self.posts[2].pk]
+        )
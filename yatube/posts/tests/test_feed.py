@@ -0,0 +1,118 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import feed
+from posts.models import Comment, FeedItem, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.old_post = Post.objects.create(
+            text='Старый пост', author=cls.author
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed_posts(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_copies_author_posts(self):
+        """Подписка переносит посты автора в ленту, отписка убирает."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        ))
+        self.assertEqual(self.feed_posts(), [self.old_post])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}
+        ))
+        self.assertEqual(self.feed_posts(), [])
+        self.assertFalse(FeedItem.objects.filter(user=self.reader).exists())
+
+    def test_new_post_fans_out(self):
+        """Новый пост записывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.reader, post=new_post).exists()
+        )
+        self.assertEqual(self.feed_posts(), [new_post, self.old_post])
+
+    @override_settings(FEED_FANOUT_FOLLOWERS_LIMIT=1)
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты «звезды» не раскладываются, но попадают в ленту."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        star_post = Post.objects.create(text='Пост звезды', author=self.star)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=star_post).exists())
+        self.assertEqual(
+            self.feed_posts(), [new_post, star_post, self.old_post]
+        )
+        # Отписка возвращает автора в обычный режим рассылки; посты
+        # раскладываются по лентам в фоне, а не в запросе отписки
+        with mock.patch.object(feed, 'defer') as defer:
+            Follow.objects.filter(user=self.fan, author=self.star).delete()
+        self.assertFalse(FeedItem.objects.filter(post=star_post).exists())
+        func, *args = defer.call_args[0]
+        func(*args)
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.reader, post=star_post).exists()
+        )
+
+    @override_settings(FEED_SYNC_FANOUT_LIMIT=1)
+    def test_large_fan_out_deferred(self):
+        """У автора с многими подписчиками пост раскладывается в фоне."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.fan, author=self.author)
+        with mock.patch.object(feed, 'defer') as defer:
+            new_post = Post.objects.create(text='Новый', author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=new_post).exists())
+        func, *args = defer.call_args[0]
+        func(*args)
+        self.assertEqual(FeedItem.objects.filter(post=new_post).count(), 2)
+
+    def test_merged_feed_pages_full(self):
+        """Повторы в сливаемых выборках не укорачивают страницу."""
+        created = []
+        for index in range(4):
+            post = Post.objects.create(
+                text=f'Пост {index}', author=self.author
+            )
+            for _ in range(2):
+                Comment.objects.create(
+                    post=post, author=self.reader, text='Комментарий'
+                )
+            created.append(post)
+        created.reverse()
+        posts = Post.objects.order_by('-pub_date', '-id')
+        # Соединение с комментариями повторяет каждый пост дважды
+        merged = feed.MergedFeed(
+            posts.filter(comments__isnull=False),
+            posts.filter(author=self.star),
+        ).order_by('-pub_date', '-id')
+        self.assertEqual(merged[:3], created[:3])
+        self.assertEqual(merged[2:10], created[2:])
+
+    def test_backfill_command(self):
+        """Команда backfill_feed восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedItem.objects.all().delete()
+        call_command('backfill_feed', stdout=StringIO())
+        self.assertEqual(self.feed_posts(), [self.old_post])
@@ -0,0 +1,142 @@
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts import stats
+from posts.generator import DEFAULT_END, Generator, Plan
+from posts.importer import existing_indexes
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GeneratorTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, workers=0, **params):
+        plan = Plan(**{
+            'users': 300, 'groups': 5, 'posts': 1000, 'comments': 3,
+            'follows': 10, **params,
+        })
+        return Generator(plan, workers=workers).run()
+
+    def snapshot(self):
+        """Данные без автоматических ключей комментариев и подписок."""
+        return {
+            'users': list(User.objects.order_by('pk').values_list(
+                'pk', 'username', 'first_name', 'date_joined'
+            )),
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+                'comments_count'
+            )),
+            'comments': list(Comment.objects.order_by('pk').values_list(
+                'post_id', 'author_id', 'text', 'created'
+            )),
+            'follows': list(Follow.objects.order_by('pk').values_list(
+                'user_id', 'author_id'
+            )),
+        }
+
+    def generated(self, **params):
+        """Снимок сгенерированных данных; сами данные откатываются."""
+        with transaction.atomic():
+            self.generate(**params)
+            snapshot = self.snapshot()
+            transaction.set_rollback(True)
+        return snapshot
+
+    def test_reproducible(self):
+        """Одно зерно даёт одни данные при любом числе процессов."""
+        first = self.generated(seed=7, images=0.5, image_pool=3)
+        self.assertEqual(
+            self.generated(seed=7, images=0.5, image_pool=3, workers=2),
+            first
+        )
+        self.assertNotEqual(
+            self.generated(seed=8, images=0.5, image_pool=3)['posts'],
+            first['posts']
+        )
+
+    def test_counts_and_consistency(self):
+        """Пост ссылается на существующие строки, счётчики сходятся."""
+        counts = self.generate(images=0.5, image_pool=3)
+        self.assertEqual(counts['posts'], 1000)
+        self.assertEqual(Post.objects.count(), 1000)
+        self.assertEqual(Comment.objects.count(), counts['comments'])
+        self.assertEqual(stats.reconcile_comment_counts(), [])
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')
+        ).exists())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')
+        ).exists())
+
+    def test_skewed_distributions(self):
+        """Подписчики сосредоточены у немногих, посты идут сериями."""
+        self.generate()
+        followers = sorted(
+            Counter(Follow.objects.values_list('author_id', flat=True))
+            .values(),
+            reverse=True,
+        )
+        self.assertGreater(followers[0], 10 * followers[len(followers) // 2])
+        posts = list(Post.objects.order_by('pk').values_list(
+            'author_id', 'pub_date'
+        ))
+        bursts = sum(
+            1 for (author, date), (next_author, next_date)
+            in zip(posts, posts[1:])
+            if author == next_author
+            and abs((next_date - date).total_seconds()) < 3600
+        )
+        self.assertGreater(bursts, len(posts) // 3)
+
+    def test_dates_within_period(self):
+        """Серии и комментарии у конца периода не выходят за него."""
+        self.generate(days=1)
+        end = timezone.make_aware(DEFAULT_END, timezone.utc)
+        self.assertFalse(Post.objects.filter(pub_date__gt=end).exists())
+        self.assertFalse(Comment.objects.filter(created__gt=end).exists())
+
+    def test_command(self):
+        """Команда строит счётчики и ленты после вставки."""
+        out = StringIO()
+        call_command(
+            'generate_data', '--users', '50', '--posts', '300',
+            '--workers', '1', stdout=out
+        )
+        self.assertIn('строк/с', out.getvalue())
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)),
+            300
+        )
+
+    def test_command_failure_restores_indexes(self):
+        """Сбой генерации не оставляет таблицы без индексов лент."""
+        with mock.patch.object(
+            Generator, 'run', side_effect=RuntimeError('сбой')
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    'generate_data', '--users', '5', '--posts', '10',
+                    stdout=StringIO()
+                )
+        self.assertIn('post_pub_date_idx', existing_indexes(Post))
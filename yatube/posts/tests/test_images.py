@@ -0,0 +1,93 @@
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from posts import images
+from posts.forms import PostForm
+
+
+def make_upload(name, size, fmt='JPEG', **save_options):
+    buffer = BytesIO()
+    # Левая половина красная, правая синяя: так видно поворот
+    image = Image.new('RGB', size, (0, 0, 255))
+    image.paste((255, 0, 0), (0, 0, size[0] // 2, size[1]))
+    image.save(buffer, fmt, **save_options)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type=f'image/{fmt.lower()}'
+    )
+
+
+def make_animation(name, size, frames=3):
+    buffer = BytesIO()
+    pictures = [
+        Image.new('RGB', size, (80 * index, 0, 0)) for index in range(frames)
+    ]
+    pictures[0].save(
+        buffer, 'GIF', save_all=True, append_images=pictures[1:], duration=50
+    )
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/gif')
+
+
+@override_settings(IMAGE_MAX_EDGE=100, IMAGE_FORMAT='JPEG')
+class ImageIngestTest(SimpleTestCase):
+    def test_downsized_and_progressive(self):
+        """Большая картинка уменьшается и сохраняется прогрессивным JPEG."""
+        result = images.ingest(make_upload('big.png', (400, 200), 'PNG'))
+        self.assertEqual(result.name, 'big.jpg')
+        image = Image.open(result)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (100, 50))
+        self.assertTrue(image.info.get('progressive'))
+
+    def test_exif_orientation_applied_and_stripped(self):
+        """Поворот из EXIF применяется, сами метаданные удаляются."""
+        exif = Image.Exif()
+        # 6: картинку нужно повернуть на 90° по часовой стрелке
+        exif[0x0112] = 6
+        upload = make_upload('photo.jpg', (200, 100), exif=exif.tobytes())
+        image = Image.open(images.ingest(upload))
+        self.assertEqual(image.size, (50, 100))
+        self.assertNotIn('exif', image.info)
+        red, _, blue = image.convert('RGB').getpixel((25, 10))
+        self.assertGreater(red, blue)
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_bomb_rejected(self):
+        """Картинка больше IMAGE_MAX_PIXELS точек отклоняется."""
+        with self.assertRaises(ValidationError):
+            images.ingest(make_upload('bomb.png', (100, 100), 'PNG'))
+        form = PostForm(
+            data={'text': 'Текст'},
+            files={'image': make_upload('bomb.png', (100, 100), 'PNG')},
+        )
+        self.assertIn('image', form.errors)
+
+    @override_settings(IMAGE_MAX_DECODED_BYTES=100_000)
+    def test_decoded_size_limited(self):
+        """PNG, который не уместится в память, отклоняется; JPEG - нет."""
+        with self.assertRaises(ValidationError):
+            images.ingest(make_upload('big.png', (800, 800), 'PNG'))
+        # JPEG декодируется сразу уменьшенным в восемь раз
+        result = images.ingest(make_upload('big.jpg', (800, 800)))
+        self.assertEqual(Image.open(result).size, (100, 100))
+
+    def test_gif_downsized(self):
+        """Большой GIF уменьшается, но остаётся GIF; маленький - как есть."""
+        small = make_upload('small.gif', (50, 20), 'GIF')
+        self.assertIs(images.ingest(small), small)
+        result = images.ingest(make_upload('big.gif', (400, 200), 'GIF'))
+        self.assertEqual(result.name, 'big.gif')
+        self.assertEqual(Image.open(result).size, (100, 50))
+
+    def test_animated_gif(self):
+        """Анимация остаётся анимацией, большая уменьшается по кадрам."""
+        small = make_animation('small.gif', (50, 20))
+        self.assertIs(images.ingest(small), small)
+        big = make_animation('big.gif', (400, 200))
+        result = Image.open(images.ingest(big))
+        self.assertEqual(result.format, 'GIF')
+        self.assertEqual(result.size, (100, 50))
+        self.assertEqual(result.n_frames, 3)
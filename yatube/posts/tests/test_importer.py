@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import search
+from posts.importer import DumpImporter, existing_indexes, iter_objects
+from posts.models import Comment, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def record(model, pk, **fields):
+    return {'model': model, 'pk': pk, 'fields': fields}
+
+
+DUMP = [
+    record('auth.user', 1, username='author', password='!'),
+    record('auth.user', 2, username='reader', password='!'),
+    # Комментарий раньше своего поста, как в dump.json
+    record(
+        'posts.comment', 1, post=1, author=2, text='Первый!',
+        created='2022-01-01T10:00:00Z'
+    ),
+    record(
+        'posts.post', 1, text='Про кошек', author=1, group=1,
+        pub_date='2022-01-01T09:00:00Z'
+    ),
+    record('posts.group', 1, title='Кошки', slug='cats', description='-'),
+    record(
+        'posts.post', 2, text='Про собак', author=1, group=None,
+        pub_date='2022-01-02T09:00:00Z'
+    ),
+    {'model': 'contenttypes.contenttype', 'pk': 1, 'fields': {}},
+]
+
+
+class BrokenStream(StringIO):
+    """Поток, который обрывается после ``limit`` символов."""
+
+    def __init__(self, value, limit):
+        super().__init__(value)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise OSError('диск отвалился')
+        return super().read(min(size, self.limit - self.tell()))
+
+
+class ImporterTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+
+    def write_dump(self, records):
+        path = os.path.join(self.tmp_dir, 'dump.json')
+        with open(path, 'w', encoding='utf-8') as dump:
+            json.dump(records, dump, ensure_ascii=False)
+        return path
+
+    def test_iter_objects_reads_by_chunks(self):
+        """Объекты разбираются по одному даже на стыках кусков файла."""
+        text = json.dumps(DUMP, ensure_ascii=False, indent=2)
+        self.assertEqual(list(iter_objects(StringIO(text), 7)), DUMP)
+        self.assertEqual(list(iter_objects(StringIO(' [ ] '))), [])
+        for broken in ('{}', '[{"a": 1}', '[1]', '[{"a": 1} {"b": 2}]'):
+            with self.subTest(broken=broken):
+                with self.assertRaises(ValueError):
+                    list(iter_objects(StringIO(broken), 4))
+
+    def test_import_resolves_forward_references(self):
+        """Ссылки на объекты дальше по файлу разрешаются между пачками."""
+        out = StringIO()
+        call_command(
+            'import_dump', self.write_dump(DUMP), '--batch-size', '1',
+            stdout=out
+        )
+        comment = Comment.objects.get(pk=1)
+        self.assertEqual(comment.post.group.slug, 'cats')
+        # auto_now_add не подменяет даты из дампа
+        self.assertEqual(
+            comment.created, datetime(2022, 1, 1, 10, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            comment.post.pub_date, datetime(2022, 1, 1, 9, tzinfo=timezone.utc)
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertIn('Загружено строк: 6', out.getvalue())
+        self.assertIn('Пропущено contenttypes.contenttype: 1', out.getvalue())
+        self.assertIn('строк/с', out.getvalue())
+
+    def test_import_rebuilds_derived_data(self):
+        """После загрузки пересчитаны счётчики и полнотекстовый индекс."""
+        call_command(
+            'import_dump', self.write_dump(DUMP), stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.get(pk=1).comments_count, 1)
+        self.assertEqual(UserStats.objects.get(user_id=1).posts_count, 2)
+        if search.is_supported():
+            self.assertEqual(
+                list(search.filter_queryset(Post.objects.all(), 'кошек')),
+                [Post.objects.get(pk=1)]
+            )
+
+    def test_dangling_references(self):
+        """Необязательная висячая ссылка обнуляется, обязательная - нет."""
+        records = DUMP[:2] + [
+            record(
+                'posts.post', 1, text='Без сообщества', author=1, group=99,
+                pub_date='2022-01-01T09:00:00Z'
+            ),
+            record(
+                'posts.post', 2, text='Без автора', author=99, group=None,
+                pub_date='2022-01-01T09:00:00Z'
+            ),
+        ]
+        importer = DumpImporter()
+        with open(self.write_dump(records), encoding='utf-8') as stream:
+            importer.run(stream)
+        self.assertIsNone(Post.objects.get(pk=1).group)
+        self.assertFalse(Post.objects.filter(pk=2).exists())
+        self.assertEqual(importer.skipped['posts.post'], 1)
+
+    def test_references_to_existing_rows(self):
+        """Ссылки на строки, уже лежащие в базе, не откладываются."""
+        group = Group.objects.create(title='Собаки', slug='dogs')
+        author = User.objects.create_user(username='existing')
+        records = [record(
+            'posts.post', 10, text='Гав', author=author.pk, group=group.pk,
+            pub_date='2022-01-01T09:00:00Z'
+        )]
+        importer = DumpImporter()
+        with open(self.write_dump(records), encoding='utf-8') as stream:
+            importer.run(stream)
+        self.assertEqual(Post.objects.get(pk=10).group, group)
+
+    def test_resume_after_failure(self):
+        """Повторный запуск продолжает с сохранённого места."""
+        text = json.dumps(DUMP, ensure_ascii=False)
+        state_path = os.path.join(self.tmp_dir, 'state')
+        importer = DumpImporter(batch_size=1, state_path=state_path)
+        with self.assertRaises(OSError):
+            importer.run(BrokenStream(text, text.index('"posts.group"')))
+        with open(state_path) as state:
+            offset = json.load(state)['offset']
+        # Комментарий ждёт пост, поэтому продолжать надо с него
+        self.assertEqual(offset, 2)
+        # Индексы лент вернулись и после сбоя
+        self.assertIn('post_pub_date_idx', existing_indexes(Post))
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 0)
+
+        resumed = DumpImporter(batch_size=1, state_path=state_path)
+        counts = resumed.run(StringIO(text))
+        self.assertEqual(counts['auth.user'], 0)
+        self.assertEqual(Comment.objects.get(pk=1).post_id, 1)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertFalse(os.path.exists(state_path))
+
+    def test_repeated_import_counts_new_rows(self):
+        """Строки, уже лежащие в базе, не считаются вставленными."""
+        path = self.write_dump(DUMP)
+        with open(path, encoding='utf-8') as stream:
+            DumpImporter(batch_size=2).run(stream)
+        importer = DumpImporter(batch_size=2)
+        with open(path, encoding='utf-8') as stream:
+            counts = importer.run(stream)
+        self.assertEqual(sum(counts.values()), 0)
+        self.assertEqual(Post.objects.count(), 2)
+        # Ключи объектов не копятся от пачки к пачке
+        self.assertEqual(importer.known, {})
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginators import KeysetPaginator, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        # Посты с одинаковой датой различаются только по id
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.user)
+            for i in range(13)
+        ]
+        Post.objects.update(pub_date=cls.posts[0].pub_date)
+        cls.newest_first = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_cursor_round_trip(self):
+        """Курсор распаковывается в исходный ключ."""
+        post = self.newest_first[0]
+        token = encode_cursor(post.pub_date, post.pk)
+        self.assertEqual(decode_cursor(token), (post.pub_date, post.pk))
+        self.assertIsNone(decode_cursor('испорченный'))
+
+    def test_walk_forward_and_back(self):
+        """Курсоры after/before обходят ленту без пропусков и повторов."""
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        first = paginator.get_page()
+        self.assertFalse(first.has_previous())
+        second = paginator.get_page(after=first.next_cursor)
+        third = paginator.get_page(after=second.next_cursor)
+        self.assertFalse(third.has_next())
+        self.assertEqual(
+            list(first) + list(second) + list(third), self.newest_first
+        )
+        back = paginator.get_page(before=third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertTrue(back.has_next())
+
+    def test_page_costs_one_query(self):
+        """Любая страница выбирается одним запросом без COUNT."""
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        first = paginator.get_page()
+        with self.assertNumQueries(1):
+            paginator.get_page(after=first.next_cursor)
+        with self.assertNumQueries(1):
+            paginator.get_page(page='last')
+
+    def test_legacy_page_links(self):
+        """Старые ссылки ?page=N и ?page=last продолжают работать."""
+        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(
+            list(response.context['page_obj']), self.newest_first[10:]
+        )
+        response = self.guest_client.get(
+            reverse('posts:index') + '?page=last'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), self.newest_first[3:]
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор приводит к первой странице."""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?after=broken'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), self.newest_first[:10]
+        )
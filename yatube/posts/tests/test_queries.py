@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class ViewQueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='group-slug',
+            description='group-description'
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(5)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.authors[0], group=cls.group
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def add_posts(self):
+        # Каждый пост от нового автора: ленивая загрузка автора
+        # дала бы по запросу на пост
+        for author in self.authors:
+            Post.objects.create(
+                text='Ещё пост', author=author, group=self.group
+            )
+
+    def add_comments(self):
+        for author in self.authors:
+            Comment.objects.create(
+                text='Комментарий', author=author, post=self.post
+            )
+
+    def test_list_views(self):
+        """Число запросов списков не зависит от числа постов."""
+        urls = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': 'group-slug'}): 4,
+            reverse('posts:profile', kwargs={'username': 'author0'}): 5,
+            reverse('posts:follow_index'): 4,
+        }
+        self.add_posts()
+        for url, budget in urls.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(
+                    self.client, url, self.add_posts, budget
+                )
+
+    def test_post_detail(self):
+        """Число запросов страницы поста не зависит от числа комментариев."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.add_comments()
+        self.assertQueryBudget(self.client, url, self.add_comments, 4)
+
+    def test_post_comments(self):
+        """Число запросов порции комментариев не зависит от их числа."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        self.add_comments()
+        for params in ('', '?format=json'):
+            with self.subTest(params=params):
+                self.assertQueryBudget(
+                    self.client, url + params, self.add_comments, 2
+                )
+
+    def test_search(self):
+        """Число запросов поиска не зависит от числа найденных постов."""
+        url = reverse('posts:search')
+        urls = {
+            f'{url}?q=пост': 4,
+            # Сообщество и автор загружаются по запросу на каждого
+            f'{url}?q=пост&group=group-slug&author=author0': 6,
+        }
+        self.add_posts()
+        for url, budget in urls.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(
+                    self.client, url, self.add_posts, budget
+                )
@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='group-slug',
+            description='group-description'
+        )
+        cls.best = Post.objects.create(
+            text='Кошки, кошки и ещё раз кошки', author=cls.user
+        )
+        cls.weak = Post.objects.create(
+            text='Про собак и немного про кошки, но в основном про собак',
+            author=cls.other,
+            group=cls.group,
+        )
+        cls.unrelated = Post.objects.create(
+            text='Совсем о другом', author=cls.user
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, **params):
+        response = self.guest_client.get(reverse('posts:search'), params)
+        return list(response.context['page_obj'])
+
+    def test_ranked_results(self):
+        """Поиск возвращает подходящие посты от самых релевантных."""
+        self.assertEqual(self.found(q='кошки'), [self.best, self.weak])
+
+    def test_scoped_results(self):
+        """Поиск ограничивается сообществом или автором."""
+        self.assertEqual(
+            self.found(q='кошки', group='group-slug'), [self.weak]
+        )
+        self.assertEqual(
+            self.found(q='кошки', author='HasNoName'), [self.best]
+        )
+
+    def test_operators_are_escaped(self):
+        """Синтаксис FTS5 в запросе не ломает поиск."""
+        self.assertEqual(self.found(q='"кошки OR NEAR('), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        self.unrelated.text = 'Теперь и здесь про кошки'
+        self.unrelated.save()
+        self.assertIn(self.unrelated, self.found(q='кошки'))
+        self.unrelated.delete()
+        self.assertEqual(
+            search.ranked_ids('кошки', author_id=self.user.pk),
+            [self.best.pk]
+        )
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        self.guest_client.force_login(admin)
+        response = self.guest_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.weak]
+        )
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index индексирует посты без сигналов."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.found(q='кошки'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found(q='кошки'), [self.best, self.weak])
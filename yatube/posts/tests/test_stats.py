@@ -0,0 +1,155 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами и подписками."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.create(text='Пост 2', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(self.author, posts_count=2, followers_count=1)
+        self.assertStats(self.reader, following_count=1)
+        post.delete()
+        Follow.objects.all().delete()
+        self.assertStats(self.author, posts_count=1, followers_count=0)
+        self.assertStats(self.reader, following_count=0)
+
+    def test_rebuild_command(self):
+        """Команда rebuild_stats восстанавливает испорченные счётчики."""
+        Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(
+            posts_count=42, followers_count=42, following_count=42
+        )
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertStats(
+            self.author, posts_count=1, followers_count=1, following_count=0
+        )
+        self.assertStats(self.reader, posts_count=0, following_count=1)
+
+    def test_profile_without_aggregates(self):
+        """Профиль показывает счётчики без агрегирующих запросов."""
+        Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:profile', kwargs={'username': 'author'})
+            )
+        self.assertEqual(response.context['posts_count'], 1)
+        self.assertEqual(response.context['followers_count'], 1)
+        self.assertEqual(response.context['following_count'], 0)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_deferred_post_loads(self):
+        """Пост с отложенными полями загружается и сохраняется."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        loaded = Post.objects.only('text').get(pk=post.pk)
+        loaded.text = 'Изменённый пост'
+        loaded.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).text, 'Изменённый пост')
+        self.assertStats(self.author, posts_count=1)
+
+
+class CommentsCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def comments_count(self):
+        return Post.objects.get(pk=self.post.pk).comments_count
+
+    def test_counter_follows_comments(self):
+        """Счётчик меняется при добавлении, отвязке и удалении."""
+        index = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(index, 'Комментариев: 0')
+        for text in ('Первый', 'Второй'):
+            self.authorized_client.post(
+                reverse(
+                    'posts:add_comment', kwargs={'post_id': self.post.pk}
+                ),
+                data={'text': text},
+            )
+        self.assertEqual(self.comments_count(), 2)
+        index = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(index, 'Комментариев: 2')
+        first, second = Comment.objects.order_by('pk')
+        first.post = None
+        first.save()
+        self.assertEqual(self.comments_count(), 1)
+        second.delete()
+        self.assertEqual(self.comments_count(), 0)
+
+    def test_post_edit_keeps_counter(self):
+        """Сохранение загруженного раньше поста не сбрасывает счётчик."""
+        post = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(text='Текст', author=self.author, post=post)
+        post.text = 'Изменённый пост'
+        post.save()
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Ещё раз'},
+        )
+        self.assertEqual(self.comments_count(), 1)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).text, 'Ещё раз'
+        )
+
+    def test_copy_and_deferred_save(self):
+        """Копия через pk = None вставляется, а сохранение поста с
+        отложенными полями их не дочитывает."""
+        copy = Post.objects.get(pk=self.post.pk)
+        copy.pk = None
+        copy.save()
+        self.assertEqual(Post.objects.count(), 2)
+
+        post = Post.objects.defer('pub_date').get(pk=self.post.pk)
+        post.text = 'Только текст'
+        post.save()
+        self.assertNotIn('pub_date', post.__dict__)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).text, 'Только текст'
+        )
+
+    def test_reconcile_command(self):
+        """Команда reconcile_comment_counts исправляет разошедшийся счётчик."""
+        Comment.objects.create(
+            text='Текст', author=self.author, post=self.post
+        )
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        out = StringIO()
+        call_command('reconcile_comment_counts', stdout=out)
+        self.assertIn('Исправлено счётчиков комментариев: 1', out.getvalue())
+        self.assertEqual(self.comments_count(), 1)
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class SyndicationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='group-slug',
+            description='group-description'
+        )
+        cls.post = Post.objects.create(
+            text='Текст для ленты', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def urls(self):
+        return {
+            reverse('posts:feed_latest'): 'application/rss+xml',
+            reverse('posts:feed_latest_atom'): 'application/atom+xml',
+            reverse('posts:feed_group', kwargs={'slug': 'group-slug'}):
+                'application/rss+xml',
+            reverse('posts:feed_author', kwargs={'username': 'HasNoName'}):
+                'application/rss+xml',
+        }
+
+    def test_feeds_list_posts(self):
+        """Ленты отдают посты своей области в нужном формате."""
+        for url, content_type in self.urls().items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(
+                    response['Content-Type'].startswith(content_type)
+                )
+                self.assertContains(response, 'Текст для ленты')
+                self.assertNotIn('Vary', response)
+        response = self.guest_client.get(
+            reverse('posts:feed_group', kwargs={'slug': 'missing'})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_until_new_post(self):
+        """XML берётся из кеша, пока в области не появится пост."""
+        url = reverse('posts:feed_latest')
+        first = self.guest_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(
+            self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=first['ETag']
+            ).status_code,
+            304
+        )
+        # Комментарий не меняет ленту
+        Comment.objects.create(
+            text='Комментарий', author=self.user, post=self.post
+        )
+        self.assertEqual(
+            self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=first['ETag']
+            ).status_code,
+            304
+        )
+        Post.objects.create(text='Свежий пост', author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Свежий пост')
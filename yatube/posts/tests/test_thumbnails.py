@@ -0,0 +1,184 @@
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+from sorl.thumbnail import delete
+
+from posts import thumbnails
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def thumbnail_files(self):
+        found = []
+        for _, _, files in os.walk(os.path.join(TEMP_MEDIA_ROOT, 'cache')):
+            found.extend(files)
+        return found
+
+    def test_generate_builds_every_size(self):
+        """generate строит все варианты картинки."""
+        built = thumbnails.generate(self.post.image.name, force=True)
+        self.assertEqual(built, len(thumbnails.variants()))
+        self.assertEqual(
+            len(self.thumbnail_files()), len(thumbnails.variants())
+        )
+
+    def test_upload_queues_generation(self):
+        """Загрузка картинки ставит миниатюры в очередь, правка текста нет."""
+        with mock.patch.object(thumbnails, 'queue') as queue:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': 'Новый пост',
+                    'image': SimpleUploadedFile(
+                        name='new.gif',
+                        content=SMALL_GIF,
+                        content_type='image/gif',
+                    ),
+                },
+            )
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+                data={'text': 'Только текст'},
+            )
+        queue.assert_called_once_with('posts/new.gif')
+
+    def test_regenerate_command(self):
+        """Команда regenerate_thumbnails строит миниатюры всех постов."""
+        out = StringIO()
+        call_command(
+            'regenerate_thumbnails', workers=1, force=True, stdout=out
+        )
+        self.assertIn(
+            f'Картинок: 1, построено миниатюр: {len(thumbnails.variants())}',
+            out.getvalue()
+        )
+        self.assertTrue(self.thumbnail_files())
+
+    def test_picture_uses_ready_variants_only(self):
+        """Тег картинки берёт варианты из поста и ничего не строит."""
+        template = Template('{% load post_images %}{% post_picture post %}')
+        delete(self.post.image.name, delete_file=False)
+        post = Post.objects.get(pk=self.post.pk)
+        with mock.patch.object(thumbnails, 'queue') as queue:
+            html = template.render(Context({'post': post}))
+        queue.assert_not_called()
+        self.assertIn(f'src="{self.post.image.url}"', html)
+        self.assertEqual(self.thumbnail_files(), [])
+
+        thumbnails.generate(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        with self.assertNumQueries(0):
+            html = template.render(Context({'post': post}))
+        for width in thumbnails.WIDTHS:
+            self.assertIn(f' {width}w', html)
+        self.assertIn('width="660" height="239"', html)
+
+    def test_generate_resets_cached_pages(self):
+        """Построенные варианты попадают на закешированные страницы."""
+        url = reverse('posts:index')
+        self.assertNotContains(self.authorized_client.get(url), ' 660w')
+        thumbnails.generate(self.post.image.name)
+        self.assertContains(self.authorized_client.get(url), ' 660w')
+
+    def test_variants_of_replaced_image_ignored(self):
+        """Варианты прежней картинки не показываются с новой."""
+        thumbnails.generate(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = 'posts/other.gif'
+        self.assertEqual(thumbnails.ready_variants(post), {})
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTest(TransactionTestCase):
+    """Очередь после настоящей фиксации транзакции."""
+
+    def setUp(self):
+        user = User.objects.create_user(username='queue')
+        with mock.patch.object(thumbnails, 'queue'):
+            self.post = Post.objects.create(
+                text='Пост с картинкой',
+                author=user,
+                image=SimpleUploadedFile(
+                    name='queued.gif', content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            )
+        self.addCleanup(
+            shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True
+        )
+        self.threads = []
+        generate = thumbnails.generate
+
+        def tracked(*args, **kwargs):
+            self.threads.append(threading.current_thread().name)
+            return generate(*args, **kwargs)
+
+        patcher = mock.patch.object(thumbnails, 'generate', tracked)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_without_workers_builds_on_commit(self):
+        """Без пула миниатюры готовы сразу после фиксации."""
+        thumbnails.queue(self.post.image.name)
+        self.assertEqual(self.threads, [threading.current_thread().name])
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_pool_builds_in_background(self):
+        """Пул строит миниатюры в своём потоке, wait дожидается их."""
+        thumbnails.queue(self.post.image.name)
+        thumbnails.wait(timeout=30)
+        self.assertEqual(len(self.threads), 1)
+        self.assertTrue(self.threads[0].startswith('thumbnails'))
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn(
+            thumbnails.FALLBACK_FORMAT, thumbnails.ready_variants(post)
+        )
@@ -205,22 +205,29 @@ class PostPagesTests(TestCase):
 
     def test_index_cache(self):
         """Тесты, которые проверяют работу кеша index."""
-        # Запрос главной страницы до добавления поста
+        # Запрос главной страницы до изменения поста
         response1 = self.guest_client.get(reverse('posts:index'))
-        Post.objects.create(
-            text='Тест заголовок2',
-            author=self.user,
-        )
-        # Запрос главной страницы после добавления поста
+        # update() не посылает сигналов и не сбрасывает кеш
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
         response2 = self.guest_client.get(reverse('posts:index'))
         # Проверка кеша
         self.assertEqual(response1.content, response2.content)
         # Сбросили кеш
         cache.clear()
-        # Проверяем что теперь новый пост появился на странице
         response3 = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(response1.content, response3.content)
 
+    def test_index_cache_invalidated_by_new_post(self):
+        """Новый пост сразу появляется на закешированной главной."""
+        response1 = self.guest_client.get(reverse('posts:index'))
+        Post.objects.create(
+            text='Тест заголовок2',
+            author=self.user,
+        )
+        response2 = self.guest_client.get(reverse('posts:index'))
+        self.assertNotEqual(response1.content, response2.content)
+        self.assertContains(response2, 'Тест заголовок2')
+
     def test_user_follows(self):
         """Авторизованный пользователь может подписываться
         на других пользователей и удалять их из подписок."""
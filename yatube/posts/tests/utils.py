@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверки числа SQL-запросов для тестов представлений."""
+
+    def count_queries(self, client, url):
+        # Кеш фрагментов скрыл бы запросы к базе
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertQueryBudget(self, client, url, grow, budget):
+        """Число запросов не больше ``budget`` и не растёт после ``grow()``.
+
+        ``grow`` добавляет на страницу новые объекты: посты, комментарии.
+        """
+        before = self.count_queries(client, url)
+        grow()
+        after = self.count_queries(client, url)
+        self.assertEqual(
+            before, after,
+            f'{url}: число запросов выросло с {before} до {after}'
+        )
+        self.assertLessEqual(
+            after, budget,
+            f'{url}: {after} запросов при бюджете {budget}'
+        )
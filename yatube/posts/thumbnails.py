@@ -0,0 +1,178 @@
+"""Подготовка миниатюр картинок постов заранее, вне запроса.
+
+Без этого sorl-thumbnail строит миниатюру при первом показе поста, и
+декодирование с масштабированием оплачивает первый зритель. Здесь
+все варианты картинки (несколько ширин в каждом из форматов) ставятся
+в пул потоков сразу после сохранения картинки. Построенные варианты
+записываются в поле ``image_variants`` постов с этой картинкой, а их
+страницы сбрасываются из кеша; при показе варианты берутся из поста
+без обращений к хранилищу sorl.
+"""
+import json
+
+import logging
+import threading
+from concurrent import futures
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import Image
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Картинка поста вписывается в рамку 660x239; варианты отличаются
+# только шириной
+WIDTH, HEIGHT = 660, 239
+WIDTHS = (330, 660, 990)
+OPTIONS = {'crop': 'center', 'upscale': True}
+FALLBACK_FORMAT = 'JPEG'
+
+_executor = None
+# Картинки в очереди пула и их задачи
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def variant_formats():
+    """Форматы вариантов по предпочтению; резервный JPEG всегда последний.
+
+    Из ``IMAGE_VARIANT_FORMATS`` берутся только форматы, которые умеют
+    записывать и Pillow, и sorl-thumbnail.
+    """
+    Image.init()
+    formats = [
+        fmt for fmt in settings.IMAGE_VARIANT_FORMATS
+        if fmt != FALLBACK_FORMAT and fmt in EXTENSIONS and fmt in Image.SAVE
+    ]
+    return [*formats, FALLBACK_FORMAT]
+
+
+def variant_height(width):
+    return int(width * HEIGHT / WIDTH + 0.5)
+
+
+def variants():
+    """Пары (геометрия, параметры) всех вариантов картинки поста."""
+    return [
+        (f'{width}x{variant_height(width)}', {**OPTIONS, 'format': fmt})
+        for fmt in variant_formats()
+        for width in WIDTHS
+    ]
+
+
+def ready_variants(post):
+    """Готовые варианты картинки поста: {формат: [(адрес, ширина)]}.
+
+    Ничего не строит и не читает хранилище sorl: варианты, записанные
+    для прежней картинки поста, не подходят.
+    """
+    if not post.image or not post.image_variants:
+        return {}
+    try:
+        manifest = json.loads(post.image_variants)
+        if manifest['image'] != post.image.name:
+            return {}
+        return {
+            fmt: [(default.storage.url(name), width) for name, width in built]
+            for fmt, built in manifest['sources'].items()
+        }
+    except (ValueError, KeyError, TypeError):
+        # Поле записано не нами: показываем саму картинку
+        return {}
+
+
+def publish(image_name, sources):
+    """Записывает варианты в посты с картинкой и сбрасывает их страницы."""
+    posts = Post.objects.filter(image=image_name)
+    tags = {caching.FEED_TAG}
+    for pk, author_id, group_id in posts.values_list(
+        'pk', 'author_id', 'group_id'
+    ):
+        tags.add(caching.post_tag(pk))
+        tags.add(caching.author_tag(author_id))
+        if group_id is not None:
+            tags.add(caching.group_tag(group_id))
+    posts.update(image_variants=json.dumps(
+        {'image': image_name, 'sources': sources}
+    ))
+    # Фрагменты, закешированные с исходной картинкой, больше не нужны
+    caching.invalidate(*tags)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = futures.ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate(image_name, force=False):
+    """Строит все миниатюры картинки; возвращает число построенных."""
+    if force:
+        # Удаляем только миниатюры, исходная картинка остаётся
+        delete(image_name, delete_file=False)
+    sources = {}
+    for geometry, options in variants():
+        try:
+            thumbnail = get_thumbnail(image_name, geometry, **options)
+        except Exception:
+            logger.exception(
+                'Не удалось построить миниатюру %s для %s',
+                geometry, image_name,
+            )
+        else:
+            # Если исходник не читается, sorl вместо ошибки отдаёт
+            # миниатюру без размера и файла
+            if not thumbnail.size:
+                continue
+            sources.setdefault(options['format'], []).append(
+                (thumbnail.name, thumbnail.width)
+            )
+    if sources:
+        publish(image_name, sources)
+    return sum(len(built) for built in sources.values())
+
+
+def _generate_in_worker(image_name):
+    try:
+        generate(image_name)
+    finally:
+        with _pending_lock:
+            _pending.pop(image_name, None)
+        # Поток пула держит своё подключение к базе для хранилища sorl
+        close_old_connections()
+
+
+def _submit(image_name):
+    with _pending_lock:
+        # Картинку, уже стоящую в очереди, повторно не ставим
+        if image_name in _pending:
+            return
+        _pending[image_name] = get_executor().submit(
+            _generate_in_worker, image_name
+        )
+
+
+def queue(image_name):
+    """Ставит построение миниатюр в пул после фиксации транзакции."""
+    if not image_name:
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate(image_name))
+        return
+    transaction.on_commit(lambda: _submit(image_name))
+
+
+def wait(timeout=None):
+    """Ждёт, пока пул построит миниатюры всех картинок из очереди."""
+    with _pending_lock:
+        pending = list(_pending.values())
+    futures.wait(pending, timeout)
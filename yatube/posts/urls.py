@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import syndication, views
 
 # app_name - это namespace для путей приложения
 app_name = 'posts'
@@ -14,6 +14,13 @@ urlpatterns = [
 
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
 
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('search/', views.search_posts, name='search'),
+
     path('create/', views.post_create, name='post_create'),
 
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
@@ -21,6 +28,30 @@ urlpatterns = [
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
+    path('feeds/latest/', syndication.latest_rss, name='feed_latest'),
+    path(
+        'feeds/latest/atom/',
+        syndication.latest_atom,
+        name='feed_latest_atom'
+    ),
+    path(
+        'feeds/group/<slug:slug>/', syndication.group_rss, name='feed_group'
+    ),
+    path(
+        'feeds/group/<slug:slug>/atom/',
+        syndication.group_atom,
+        name='feed_group_atom'
+    ),
+    path(
+        'feeds/author/<str:username>/',
+        syndication.author_rss,
+        name='feed_author'
+    ),
+    path(
+        'feeds/author/<str:username>/atom/',
+        syndication.author_atom,
+        name='feed_author_atom'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
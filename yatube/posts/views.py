@@ -1,58 +1,106 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.replicas import read_replica
+
+from . import caching, search
+from .conditional import (
+    GROUPS, POSTS, PROFILES, group_tags, index_tags, page_object,
+    page_validators, post_tags, primary_if_changed, profile_tags
+)
+from .feed import follow_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import Comment, Follow, Group, Post
+from .paginators import KeysetPaginator
+from .stats import stats_for
 
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+COMMENT_ORDERS = ('oldest', 'newest')
 
-def paginator_func(queryset, request):
 
-    paginator = Paginator(queryset, 10)
-    # Из URL извлекаем номер запрошенной страницы - значение page
+def paginator_func(queryset, request, date_field='pub_date'):
+    # Страницы выбираются по курсору (pub_date, id): глубина ленты
+    # не влияет на стоимость запроса, COUNT(*) не выполняется
+    paginator = KeysetPaginator(queryset, POSTS_PER_PAGE, date_field)
+    # Номер страницы из старых ссылок вида ?page=N
     page_number = request.GET.get('page')
-    # Получаем набор записей для страницы с запрошенным номером
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page=page_number,
+    )
     return {
         'paginator': paginator,
         'page_number': page_number,
         'page_obj': page_obj,
+        # Ключ страницы для кеша фрагментов шаблона
+        'page_key': '|'.join(
+            request.GET.get(name, '') for name in ('after', 'before', 'page')
+        ),
     }
 
 
+def comments_page(comments, request):
+    """Страница комментариев по курсору и выбранный порядок."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERS:
+        order = COMMENT_ORDERS[0]
+    paginator = KeysetPaginator(
+        comments.select_related('author').order_by('created', 'id'),
+        COMMENTS_PER_PAGE,
+        'created',
+        descending=order == 'newest',
+    )
+    page_obj = paginator.get_page(after=request.GET.get('after'))
+    return page_obj, order
+
+
+@read_replica(primary_if=primary_if_changed(index_tags))
+@page_validators(index_tags)
 def index(request):
     title = 'Последние обновления на сайте'
-    posts = Post.objects.all()
+    posts = Post.objects.select_related('author', 'group')
     # В словаре context отправляем информацию в шаблон
     context = {
         'posts': posts,
         'title': title,
+        'cache_tags': [caching.FEED_TAG],
     }
     context.update(paginator_func(posts, request))
     return render(request, 'posts/index.html', context)
 
 
 # Страница с постами группы
+@read_replica(primary_if=primary_if_changed(group_tags))
+@page_validators(group_tags)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = page_object(request, GROUPS, slug=slug)
 
     title = f'Записи сообщества {group}'
-    posts = group.posts.all()
+    posts = group.posts.select_related('author', 'group')
     context = {
         'group': group,
         'posts': posts,
         'title': title,
+        'cache_tags': [caching.group_tag(group.pk)],
     }
     context.update(paginator_func(posts, request))
     return render(request, 'posts/group_list.html', context)
 
 
+@read_replica(primary_if=primary_if_changed(profile_tags))
+@page_validators(profile_tags)
 def profile(request, username):
 
-    author = get_object_or_404(User, username=username)
+    author = page_object(request, PROFILES, username=username)
+    author_stats = stats_for(author)
     title = f'Профайл пользователя {author}'
-    posts = Post.objects.filter(author=author)
+    posts = author.posts.select_related('author', 'group')
     template = 'posts/profile.html'
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -65,37 +113,115 @@ def profile(request, username):
         'username': username,
         'posts': posts,
         'title': title,
-        'posts_count': author.posts.count(),
+        'posts_count': author_stats.posts_count,
+        'followers_count': author_stats.followers_count,
+        'following_count': author_stats.following_count,
         'following': following,
+        'cache_tags': [caching.author_tag(author.pk)],
     }
     context.update(paginator_func(posts, request))
 
     return render(request, template, context)
 
 
+@read_replica(primary_if=primary_if_changed(post_tags))
+@page_validators(post_tags)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = page_object(request, POSTS, pk=post_id)
     author = post.author
     title = f'Пост {post}'
 
     form = CommentForm()
 
-    # комментарии достаем через релейтед нейм "comments"
-    comments = post.comments.all()
+    # Первая страница комментариев стоит одинаково при любом их числе,
+    # следующие подгружаются через post_comments
+    comments_obj, comments_order = comments_page(post.comments, request)
 
     context = {
         'post': post,
         'author': author,
         'title': title,
-        'posts_count': author.posts.count(),
+        'posts_count': stats_for(author).posts_count,
         'form': form,
-        'comments': comments,
+        'comments': comments_obj,
+        'comments_order': comments_order,
+        'comments_key': request.GET.get('after', ''),
+        'cache_tags': [caching.post_tag(post.pk)],
+    }
+    return render(request, template, context)
+
+
+@read_replica
+def post_comments(request, post_id):
+    """Очередная порция комментариев поста для «Показать ещё».
+
+    Отдаёт фрагмент HTML или JSON при ``?format=json``.
+    """
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('Пост не найден')
+    comments_obj, comments_order = comments_page(
+        Comment.objects.filter(post_id=post_id), request
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments_obj
+            ],
+            'next_cursor': comments_obj.next_cursor,
+        })
+    context = {
+        'post_id': post_id,
+        'comments': comments_obj,
+        'comments_order': comments_order,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@read_replica
+def search_posts(request):
+    """Полнотекстовый поиск по постам с ранжированием."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    group = author = None
+    if request.GET.get('group'):
+        group = get_object_or_404(Group, slug=request.GET['group'])
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    ids = search.ranked_ids(
+        query,
+        group_id=group.pk if group else None,
+        author_id=author.pk if author else None,
+    )
+    # Сначала делим на страницы id, посты загружаем только для текущей
+    paginator = Paginator(ids, POSTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = search.in_rank_order(
+        Post.objects.select_related('author', 'group'), page_obj.object_list
+    )
+    # Параметры поиска для ссылок на соседние страницы
+    params = request.GET.copy()
+    params.pop('page', None)
+    context = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'group': group,
+        'author': author,
+        'search_params': params.urlencode(),
+        'paginator': paginator,
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     template = 'posts/create_post.html'
     title = 'Добавить запись'
@@ -159,21 +285,23 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_replica
 @login_required
 def follow_index(request):
     title = 'Посты авторов, на которых вы подписаны'
-    user = request.user
-    posts = Post.objects.filter(author__following__user=user)
+    # Лента читается из материализованной таблицы, см. posts/feed.py
+    posts = follow_feed(request.user)
 
     context = {
         'posts': posts,
         'title': title,
     }
-    context.update(paginator_func(posts, request))
+    context.update(paginator_func(posts, request, date_field='feed_date'))
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Подписаться на автора"""
 
@@ -191,6 +319,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Отписка от автора"""
     author = get_object_or_404(User, username=username)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +26,9 @@ SECRET_KEY = '%p=e!4e*u16jv*fw)#zqgm2#$&&ik^6b6wv6ff3^6r@y+v(q1e'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Запуск тестов: manage.py test или pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 # Имя view-функции, обрабатывающей ошибку 403
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
@@ -43,6 +47,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',  # Добавленная запись
     'core.apps.CoreConfig',  # Добавленная запись
     'about.apps.AboutConfig',  # Добавленная запись
+    'api.apps.ApiConfig',
     'sorl.thumbnail',  # Добавленная запись
     'django.contrib.admin',
     'django.contrib.auth',  # Прил. для регистр. и авториз. польз.
@@ -54,8 +59,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы время ответа включало остальные middleware
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -73,7 +81,9 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Шаблонизатор Django с замером времени рендеринга для метрик
+        'BACKEND': 'core.metrics.DjangoTemplates',
+        'NAME': 'django',
         # Добавлено: Искать шаблоны на уровне проекта
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
@@ -103,6 +113,24 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения - копии базы SQLite, пути через os.pathsep.
+# Копии обновляет команда sync_replicas. Реплики другой СУБД добавляются
+# в DATABASES под именами replica<N> вручную
+for number, path in enumerate(
+    filter(None, os.environ.get('DATABASE_REPLICAS', '').split(os.pathsep)),
+    start=1,
+):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы;
+# должно превышать отставание реплик
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -157,13 +185,108 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Подключение кеширования
+# Кеш по умолчанию - локальная память процесса перед общим кешем всех
+# процессов (см. core.cache). Общий кеш хранится в файлах SHARED_CACHE_DIR
+# (по умолчанию - BASE_DIR/cache): сброс тегов в одном процессе, включая
+# команды manage.py, виден веб-воркерам. Тесты держат его в памяти
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'LOCAL': 'local',
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 5,
+            # Версии тегов меняются на месте и в локальный кеш не попадают
+            'SHARED_ONLY_PREFIXES': ['cache-tag:'],
+            # Значения кодируются один раз, оба уровня хранят сжатые байты;
+            # замеры - команда benchmark_codecs
+            'CODEC': {'compression': 'zlib', 'level': 1, 'threshold': 1024},
+        },
+    },
+    # Оба уровня в памяти ограничены бюджетом в байтах, а не числом
+    # записей; статистика по префиксам ключей - на странице
+    # /admin/cache-stats/
+    'local': {
+        'BACKEND': 'core.cache.MemoryCache',
+        'LOCATION': 'local',
+        'OPTIONS': {'MAX_BYTES': 32 * 1024 * 1024, 'POLICY': 'lru'},
+    },
+    # FileBasedCache.add не атомарен (проверка и запись - разные шаги):
+    # два процесса изредка берут одну блокировку core.singleflight и
+    # пересчитывают значение дважды, а отсутствующая версия тега
+    # (posts.caching.tag_versions) может создаться дважды - тогда
+    # фрагмент под первой версией просто не будет прочитан. Для нескольких
+    # серверов нужен общий сетевой кеш (Memcached, Redis) с атомарным add
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'SHARED_CACHE_DIR', os.path.join(BASE_DIR, 'cache')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
+if TESTING:
+    # LFU: фрагменты под устаревшими версиями тегов вытесняются раньше
+    # горячих
+    CACHES['shared'] = {
+        'BACKEND': 'core.cache.MemoryCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'MAX_BYTES': 128 * 1024 * 1024, 'POLICY': 'lfu'},
+    }
+
+# Одновременные промахи по ключу пересчитывает один запрос (см.
+# core.singleflight): остальные ждут его до SINGLE_FLIGHT_WAIT секунд или
+# получают прежнее значение, которое хранится SINGLE_FLIGHT_GRACE секунд
+# после срока. SINGLE_FLIGHT_BETA > 1 обновляет горячие ключи раньше
+SINGLE_FLIGHT_WAIT = 2.0
+SINGLE_FLIGHT_LOCK_TIMEOUT = 30
+SINGLE_FLIGHT_GRACE = 60
+SINGLE_FLIGHT_BETA = 1.0
 
 # IP адреса, при обращении с которых будет доступен DjDT
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Посты авторов, у которых подписчиков больше этого числа, не раскладываются
+# по лентам при публикации, а подмешиваются в ленту подписок при чтении
+FEED_FANOUT_FOLLOWERS_LIMIT = 10000
+# До стольких подписчиков пост раскладывается прямо в запросе публикации;
+# у авторов с большим числом - в FEED_WORKERS потоках после фиксации
+# транзакции (при 0 потоков - сразу после фиксации)
+FEED_SYNC_FANOUT_LIMIT = 100
+FEED_WORKERS = 1
+
+# Загружаемые картинки уменьшаются до этого размера по длинной стороне
+# и перекодируются в IMAGE_FORMAT ('JPEG' или 'WEBP');
+# картинки больше IMAGE_MAX_PIXELS точек отклоняются, как и те, что при
+# декодировании заняли бы больше IMAGE_MAX_DECODED_BYTES (PNG и WebP
+# примерно до 16 млн точек; JPEG декодируется уменьшенным)
+IMAGE_MAX_EDGE = 2048
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_DECODED_BYTES = 64 * 1024 * 1024
+IMAGE_FORMAT = 'JPEG'
+IMAGE_QUALITY = 85
+# Форматы вариантов картинки поста по предпочтению; неподдерживаемые
+# установленным Pillow пропускаются, JPEG строится всегда
+IMAGE_VARIANT_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+
+# Число потоков, строящих миниатюры картинок после загрузки;
+# при 0 миниатюры строятся сразу после фиксации транзакции
+THUMBNAIL_WORKERS = 2
+
+# Каталог, куда каждый процесс раз в METRICS_FLUSH_INTERVAL секунд пишет
+# свои метрики; страница /metrics/ складывает файлы всех процессов.
+# Без него видны метрики только процесса, ответившего на запрос
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+# Сборщик метрик передаёт заголовок Authorization: Bearer <METRICS_TOKEN>;
+# без токена страница /metrics/ доступна только персоналу
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Запросы дольше SLOW_QUERY_THRESHOLD секунд пишутся с планом выполнения
+# в журнал SLOW_QUERY_LOG с ротацией по размеру; None - не писать
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.log')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
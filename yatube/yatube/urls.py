@@ -19,7 +19,11 @@ from django.contrib import admin
 # Функция include позволит использовать path() из других файлов
 from django.urls import include, path
 
+from core import views as core_views
+
 urlpatterns = [
+    path('admin/cache-stats/', core_views.cache_stats, name='cache_stats'),
+
     path('admin/', admin.site.urls),
 
     path('auth/', include('users.urls')),
@@ -29,6 +33,10 @@ urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
 
     path('about/', include('about.urls', namespace='about')),
+
+    path('api/v1/', include('api.urls', namespace='api')),
+
+    path('metrics/', core_views.metrics, name='metrics'),
 ]
 
 handler404 = 'core.views.page_not_found'